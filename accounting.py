@@ -0,0 +1,101 @@
+import heapq
+import logging
+import threading
+import time
+
+import metrics
+from settings import env
+
+logger = logging.getLogger(__name__)
+
+USAGE_REPORT_INTERVAL = env('USAGE_REPORT_INTERVAL', 3600, int)
+USAGE_TOP = env('USAGE_TOP', 10, int)
+RESOURCES = ('calls', 'bytes', 'cpu_seconds', 'messages', 'errors')
+_INDEX = {resource: index for index, resource in enumerate(RESOURCES)}
+
+
+class TenantUsage:
+    """Потребление ресурсов тенантами за окно отчёта.
+
+    На тенанта хранится один список счётчиков в порядке RESOURCES. Раз в
+    interval секунд top самых затратных тенантов по каждому ресурсу
+    уходит в лог и в метрики tenant_usage, после чего окно начинается
+    заново, так что память занимают только активные за окно тенанты.
+    """
+
+    def __init__(self, interval=USAGE_REPORT_INTERVAL, top=USAGE_TOP,
+                 clock=time.monotonic):
+        self.interval = interval
+        self.top_n = top
+        self.clock = clock
+        self._usage = {}
+        self._started = clock()
+        self._lock = threading.Lock()
+
+    def record(self, tenant, **amounts):
+        """Прибавляет расход ресурсов тенанта, например calls=1."""
+        with self._lock:
+            usage = self._usage.get(tenant)
+            if usage is None:
+                usage = self._usage[tenant] = [0] * len(RESOURCES)
+            for resource, amount in amounts.items():
+                usage[_INDEX[resource]] += amount
+
+    def top(self, resource, count=None):
+        """Возвращает самых затратных за окно тенантов как (тенант, расход)."""
+        index = _INDEX[resource]
+        with self._lock:
+            items = [(usage[index], tenant)
+                     for tenant, usage in self._usage.items() if usage[index]]
+        return [(tenant, value) for value, tenant in heapq.nlargest(
+            count or self.top_n, items
+        )]
+
+    def report(self):
+        """Закрывает окно и возвращает строки отчёта по ресурсам.
+
+        Метрики tenant_usage заменяются top тенантами закрытого окна с
+        их долей в общем расходе.
+        """
+        with self._lock:
+            usage, self._usage = self._usage, {}
+            self._started = self.clock()
+        metrics.drop_gauges('tenant_usage')
+        lines = []
+        for index, resource in enumerate(RESOURCES):
+            total = sum(counters[index] for counters in usage.values())
+            if not total:
+                continue
+            top = heapq.nlargest(self.top_n, (
+                (counters[index], tenant)
+                for tenant, counters in usage.items() if counters[index]
+            ))
+            for value, tenant in top:
+                metrics.set_gauge(
+                    f'tenant_usage{{tenant="{tenant}",resource="{resource}"}}',
+                    round(value, 3)
+                )
+                metrics.set_gauge(
+                    f'tenant_usage_share{{tenant="{tenant}",'
+                    f'resource="{resource}"}}', round(value / total, 3)
+                )
+            lines.append(f'{resource} ({total:g}): ' + ', '.join(
+                f'{tenant} {value:g} ({value / total:.0%})'
+                for value, tenant in top
+            ))
+        return lines
+
+    def maybe_report(self, now=None):
+        """Пишет отчёт в лог, если окно длится interval секунд."""
+        if now is None:
+            now = self.clock()
+        if now - self._started < self.interval:
+            return False
+        lines = self.report()
+        if lines:
+            logger.info('Самые затратные тенанты за окно:\n'
+                        + '\n'.join(lines))
+        return True
+
+
+USAGE = TenantUsage()
@@ -0,0 +1,115 @@
+import threading
+import time
+
+import metrics
+from settings import env
+
+CONCURRENCY_INITIAL = env('CONCURRENCY_INITIAL', 8, int)
+CONCURRENCY_MIN = env('CONCURRENCY_MIN', 1, int)
+CONCURRENCY_MAX = env('CONCURRENCY_MAX', 16, int)
+LATENCY_TOLERANCE = env('LATENCY_TOLERANCE', 2.0, float)
+LATENCY_SLACK = env('LATENCY_SLACK', 0.05, float)
+CONCURRENCY_BACKOFF = env('CONCURRENCY_BACKOFF', 0.7, float)
+LATENCY_SMOOTHING = 0.2
+BASELINE_DRIFT = 0.01
+
+
+class AdaptiveLimiter:
+    """Адаптивный по AIMD предел одновременных запросов к API.
+
+    Пока сглаженная задержка держится около базовой, предел растёт на
+    единицу за каждые limit успешных запросов при полной загрузке. Когда
+    задержка превышает базовую в tolerance раз (плюс slack секунд) или
+    запрос падает от перегрузки, предел умножается на backoff, не чаще
+    раза за текущую задержку. Базовая задержка - минимум наблюдений,
+    медленно подтягивающийся к текущей, чтобы пережить смену сети.
+    """
+
+    def __init__(self, name, initial=CONCURRENCY_INITIAL,
+                 minimum=CONCURRENCY_MIN, maximum=CONCURRENCY_MAX,
+                 tolerance=LATENCY_TOLERANCE, slack=LATENCY_SLACK,
+                 backoff=CONCURRENCY_BACKOFF, clock=time.monotonic):
+        self.name = name
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.tolerance = tolerance
+        self.slack = slack
+        self.backoff = backoff
+        self.clock = clock
+        self.in_flight = 0
+        self.latency = None
+        self.baseline = None
+        self._last_cut = None
+        self._condition = threading.Condition()
+
+    @property
+    def current(self):
+        """Текущий предел одновременных запросов."""
+        return int(self.limit)
+
+    def call(self, func, *args, overloaded=None):
+        """Вызывает func в пределах лимита и учитывает задержку.
+
+        Исключение func или истинный overloaded(result) считаются
+        признаком перегрузки API.
+        """
+        with self._condition:
+            while self.in_flight >= self.current:
+                self._condition.wait()
+            self.in_flight += 1
+        started = self.clock()
+        try:
+            result = func(*args)
+        except Exception:
+            self._release(self.clock() - started, True)
+            raise
+        self._release(self.clock() - started,
+                      overloaded is not None and overloaded(result))
+        return result
+
+    def _release(self, seconds, failed):
+        with self._condition:
+            saturated = self.in_flight >= self.current
+            self.in_flight -= 1
+            if not failed:
+                self._observe(seconds)
+            if failed or self._congested():
+                self._decrease()
+            elif saturated:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._export()
+            self._condition.notify_all()
+
+    def _observe(self, seconds):
+        if self.latency is None:
+            self.latency = self.baseline = seconds
+            return
+        self.latency += (seconds - self.latency) * LATENCY_SMOOTHING
+        if seconds < self.baseline:
+            self.baseline = seconds
+        else:
+            self.baseline += (seconds - self.baseline) * BASELINE_DRIFT
+
+    def _congested(self):
+        return (self.latency is not None and self.latency
+                > self.baseline * self.tolerance + self.slack)
+
+    def _decrease(self):
+        now = self.clock()
+        if (self._last_cut is not None
+                and now - self._last_cut < (self.latency or 0)):
+            return
+        self._last_cut = now
+        self.limit = max(self.minimum, self.limit * self.backoff)
+        metrics.inc(f'{self.name}_concurrency_decreases_total')
+
+    def _export(self):
+        metrics.set_gauge(f'{self.name}_concurrency_limit',
+                          round(self.limit, 2))
+        metrics.set_gauge(f'{self.name}_in_flight', self.in_flight)
+        if self.latency is not None:
+            metrics.set_gauge(f'{self.name}_latency_seconds',
+                              round(self.latency, 4))
+            metrics.set_gauge(f'{self.name}_latency_baseline_seconds',
+                              round(self.baseline, 4))
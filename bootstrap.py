@@ -0,0 +1,181 @@
+import logging
+import queue
+import threading
+
+import homework
+import metrics
+import poller
+import practicum
+from adaptive import AdaptiveLimiter
+from cursor import Cursor
+from events import homework_event
+from sender import RateLimiter
+from settings import env
+from state import PRIORITY_INFO
+
+logger = logging.getLogger(__name__)
+
+BOOTSTRAP_RATE = env('BOOTSTRAP_RATE', 2, float)
+BOOTSTRAP_WORKERS = env('BOOTSTRAP_WORKERS', 2, int)
+BOOTSTRAP_ANNOUNCE = env('BOOTSTRAP_ANNOUNCE', False,
+                         lambda value: value.lower() in ('1', 'true', 'yes'))
+PENDING = 2 ** 53
+
+
+def pending_state():
+    """Создаёт состояние тенанта, который ждёт загрузки истории.
+
+    Срок опроса PENDING не наступает, поэтому планировщик не трогает
+    тенанта, пока история не загружена.
+    """
+    state = poller.new_state()
+    state.update(next_poll=PENDING, bootstrap=True)
+    return state
+
+
+def latest_changes(homeworks):
+    """Возвращает последнее изменение каждой домашки."""
+    latest = {}
+    for item in homeworks:
+        name = item.get('homework_name')
+        updated = metrics.homework_updated(item) or 0
+        if name not in latest or updated > latest[name][0]:
+            latest[name] = (updated, item)
+    return [item for _, item in latest.values()]
+
+
+class Bootstrapper:
+    """Фоновая загрузка полной истории новых тенантов.
+
+    История запрашивается с from_date=0 в отдельных потоках через свою
+    сессию, свой лимит запросов и свой адаптивный предел одновременных
+    запросов, поэтому подключение тысяч тенантов не задерживает опрос
+    уже работающих, а медленные ответы с полной историей не снижают
+    practicum.LIMITER. Готовые истории переносятся в
+    состояния из потока планировщика без уведомлений, кроме необязательного
+    анонса последнего изменения каждой домашки.
+    """
+
+    def __init__(self, rate=BOOTSTRAP_RATE, workers=BOOTSTRAP_WORKERS,
+                 announce=BOOTSTRAP_ANNOUNCE, session=None):
+        self.limiter = RateLimiter(rate=rate, chat_interval=0)
+        self.concurrency = AdaptiveLimiter('bootstrap', initial=workers,
+                                           maximum=workers)
+        self.workers = workers
+        self.announce = announce
+        self.session = session
+        self._submitted = set()
+        self._active = set()
+        self._tasks = queue.Queue()
+        self._results = queue.Queue()
+        self._threads = []
+
+    def start(self):
+        """Запускает потоки загрузки."""
+        if self.session is None:
+            import requests
+
+            self.session = requests.Session()
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._run,
+                                      name=f'bootstrap-{index}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def schedule(self, tenants, states):
+        """Ставит в загрузку новых и недогруженных тенантов.
+
+        Задачи тенантов, которых больше нет в конфигурации, снимаются.
+        """
+        self._active = {tenant.name for tenant in tenants}
+        self._submitted &= self._active
+        for tenant in tenants:
+            if tenant.name not in states:
+                states[tenant.name] = pending_state()
+            if (tenant.name not in self._submitted
+                    and poller.next_poll(states, tenant.name) == PENDING):
+                self._submitted.add(tenant.name)
+                self._tasks.put(tenant)
+        metrics.set_gauge('bootstrap_queue', self._tasks.qsize())
+
+    def fetch(self, tenant):
+        """Загружает полную историю тенанта и кладёт её в результаты.
+
+        Ответ без целого current_date считается сбоем: курсор из него не
+        построить, и тенант уходит в загрузку повторно.
+        """
+        if tenant.name not in self._submitted:
+            return
+        self.limiter.wait(None)
+        try:
+            response = practicum.tenant_client(
+                tenant, self.session, self.concurrency
+            ).homework_statuses(0)
+            homework.check_response(response)
+            if not isinstance(response['current_date'], int):
+                raise TypeError('current_date не целое число.')
+        except Exception as error:
+            logger.error(f'Не удалось загрузить историю {tenant.name}: '
+                         f'{error}')
+            metrics.inc('bootstrap_errors_total')
+            self._submitted.discard(tenant.name)
+            return
+        self._results.put((tenant, response))
+
+    def _run(self):
+        while True:
+            self.fetch(self._tasks.get())
+
+    def apply(self, states, outbox, config=None, events=None):
+        """Переносит загруженные истории в состояния тенантов.
+
+        Курсор ставится на current_date ответа, вся история помечается
+        отправленной и попадает в events. Истории тенантов, удалённых из
+        конфигурации за время загрузки, отбрасываются. Тенант в карантине
+        встаёт в опрос только после выхода из карантина. Возвращает
+        словарь обновлённых состояний для сохранения.
+        """
+        verdicts = (homework.HOMEWORK_VERDICTS if config is None
+                    else config.verdicts)
+        done = {}
+        while True:
+            try:
+                tenant, response = self._results.get_nowait()
+            except queue.Empty:
+                return done
+            self._submitted.discard(tenant.name)
+            if tenant.name not in self._active or tenant.name not in states:
+                logger.info(f'История {tenant.name} отброшена: тенант '
+                            f'удалён.')
+                continue
+            done[tenant.name] = self._restore(states, outbox, tenant,
+                                              response, verdicts, events)
+            metrics.inc('bootstrapped_tenants_total')
+
+    def _restore(self, states, outbox, tenant, response, verdicts, events):
+        homeworks = [item for item in response['homeworks']
+                     if 'homework_name' in item and 'status' in item]
+        position = Cursor(response['current_date'])
+        position.advance(response['current_date'], homeworks)
+        state = states[tenant.name]
+        position.dump(state)
+        state['prev_err'] = ''
+        state.pop('bootstrap', None)
+        if 'quarantine' not in state:
+            state['next_poll'] = 0
+        if events is not None:
+            events.extend(
+                homework_event(tenant.name, item,
+                               metrics.homework_updated(item)
+                               or response['current_date'])
+                for item in homeworks
+            )
+        if self.announce:
+            for item in latest_changes(homeworks):
+                if item['status'] in verdicts:
+                    outbox.put(tenant.chat_id,
+                               homework.render_status(item, verdicts),
+                               priority=PRIORITY_INFO)
+        logger.info(f'История {tenant.name} загружена: '
+                    f'{len(homeworks)} изменений.')
+        return state
@@ -0,0 +1,108 @@
+import logging
+import socket
+import threading
+import time
+from urllib.parse import urlsplit
+
+import metrics
+from settings import env
+
+logger = logging.getLogger(__name__)
+
+DNS_TTL = env('DNS_TTL', 300, int)
+DNS_STALE_TTL = env('DNS_STALE_TTL', 3600, int)
+POOL_SIZE = env('POOL_SIZE', 16, int)
+PREWARM_LEAD = env('PREWARM_LEAD', 5, int)
+TELEGRAM_API = 'https://api.telegram.org/'
+
+_session = None
+_session_lock = threading.Lock()
+_original_getaddrinfo = socket.getaddrinfo
+
+
+class DNSCache:
+    """Кэш getaddrinfo с TTL и отдачей устаревшего ответа при сбое DNS."""
+
+    def __init__(self, resolve=_original_getaddrinfo, ttl=DNS_TTL,
+                 stale_ttl=DNS_STALE_TTL):
+        self.resolve = resolve
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def getaddrinfo(self, *args, **kwargs):
+        """Разрешает имя с учётом кэша, сигнатура как у socket."""
+        key = (args, tuple(sorted(kwargs.items())))
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(key)
+        if cached and now - cached[0] < self.ttl:
+            metrics.inc('dns_cache_hits_total')
+            return cached[1]
+        try:
+            result = self.resolve(*args, **kwargs)
+        except socket.gaierror:
+            if cached and now - cached[0] < self.stale_ttl:
+                logger.warning(f'DNS недоступен, используется кэш для '
+                               f'{args[0]}.')
+                return cached[1]
+            raise
+        metrics.inc('dns_cache_misses_total')
+        with self._lock:
+            self._cache[key] = (now, result)
+        return result
+
+
+def install_dns_cache(ttl=DNS_TTL):
+    """Подключает кэш DNS для всех соединений процесса."""
+    cache = DNSCache(ttl=ttl)
+    socket.getaddrinfo = cache.getaddrinfo
+    return cache
+
+
+def get_session():
+    """Возвращает общую для процесса сессию с пулом соединений."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+            _session.mount('https://', adapter)
+        return _session
+
+
+def _connection_pool(session, url):
+    adapter = session.get_adapter(url)
+    get_connection = getattr(adapter, 'get_connection', None)
+    if get_connection is not None:
+        return get_connection(url)
+    return adapter.poolmanager.connection_from_url(url)
+
+
+def prewarm(session, url, count=1):
+    """Заранее открывает до count соединений с TLS-рукопожатием.
+
+    Соединения возвращаются в пул сессии, и ближайшие запросы к хосту
+    не тратят время на DNS, TCP и TLS. Возвращает число новых соединений.
+    """
+    pool = _connection_pool(session, url)
+    connections, opened = [], 0
+    try:
+        for _ in range(min(count, pool.pool.maxsize if pool.pool else 1)):
+            connection = pool._get_conn()
+            connections.append(connection)
+            if connection.sock is None:
+                connection.connect()
+                opened += 1
+    except Exception as error:
+        logger.warning(f'Не удалось прогреть соединение с '
+                       f'{urlsplit(url).hostname}: {error}')
+    finally:
+        for connection in connections:
+            pool._put_conn(connection)
+    metrics.inc('prewarmed_connections_total', opened)
+    return opened
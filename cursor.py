@@ -0,0 +1,98 @@
+import hashlib
+import time
+
+import metrics
+from settings import env
+
+CURSOR_OVERLAP = env('CURSOR_OVERLAP', 300, int)
+SEEN_LIMIT = env('SEEN_LIMIT', 256, int)
+
+
+def change_key(homework):
+    """Возвращает компактный ключ изменения (id, status, date_updated)."""
+    raw = '|'.join(str(homework.get(key)) for key in (
+        'id', 'homework_name', 'status', 'date_updated'
+    ))
+    return hashlib.blake2b(raw.encode(), digest_size=8).hexdigest()
+
+
+class Cursor:
+    """Курсор опроса с перекрывающимися окнами и отсевом повторов.
+
+    Запрос уходит с from_date на overlap секунд раньше курсора, поэтому
+    изменение, записанное на сервере во время прошлого запроса, не
+    проваливается между окнами. Уже отправленные изменения отсеиваются по
+    ключам, которые хранятся, пока их дата попадает в окно, и не больше
+    limit штук. Окно не начинается раньше floor.
+    """
+
+    def __init__(self, timestamp, seen=None, overlap=CURSOR_OVERLAP,
+                 limit=SEEN_LIMIT, floor=0):
+        self.timestamp = timestamp
+        self.seen = dict(seen or {})
+        self.overlap = overlap
+        self.limit = limit
+        self.floor = floor
+
+    @classmethod
+    def load(cls, state):
+        """Восстанавливает курсор из состояния тенанта."""
+        return cls(state['timestamp'], state.get('seen'))
+
+    def dump(self, state):
+        """Записывает курсор в состояние тенанта."""
+        state['timestamp'] = self.timestamp
+        state['seen'] = self.seen
+
+    @property
+    def from_date(self):
+        """Начало окна запроса с учётом перекрытия."""
+        return max(self.floor, int(self.timestamp) - self.overlap)
+
+    def fresh(self, homeworks):
+        """Возвращает изменения, которые ещё не были отправлены."""
+        return [homework for homework in homeworks or ()
+                if change_key(homework) not in self.seen]
+
+    def advance(self, current_date, homeworks):
+        """Запоминает изменения ответа и сдвигает курсор.
+
+        Курсором становится current_date сервера, а не локальное время,
+        поэтому расхождение часов не сдвигает окно.
+        """
+        if isinstance(current_date, (int, float)):
+            self.timestamp = current_date
+        for homework in homeworks or ():
+            updated = metrics.homework_updated(homework)
+            self.seen[change_key(homework)] = int(
+                self.timestamp if updated is None else updated
+            )
+        horizon = self.from_date
+        recent = sorted(
+            (item for item in self.seen.items() if item[1] >= horizon),
+            key=lambda item: item[1]
+        )
+        self.seen = dict(recent[-self.limit:])
+
+
+class ClockSkew:
+    """Расхождение локальных часов с часами API по current_date."""
+
+    def __init__(self):
+        self.offset = 0.0
+
+    def observe(self, server_time, local_time=None):
+        """Учитывает время сервера из ответа API."""
+        if not isinstance(server_time, (int, float)):
+            return
+        if local_time is None:
+            local_time = time.time()
+        self.offset = server_time - local_time
+        metrics.set_gauge('clock_skew_seconds', round(self.offset, 3))
+
+    def now(self):
+        """Возвращает текущее время по часам сервера."""
+        return time.time() + self.offset
+
+
+SKEW = ClockSkew()
@@ -0,0 +1,242 @@
+import threading
+
+import metrics
+from settings import env
+from state import connect, transaction
+
+EVENTS_DB = env('EVENTS_DB', 'events.sqlite3')
+HOMEWORK_CACHE_SIZE = 10000
+
+
+def duration_bucket(column):
+    """Возвращает SQL-выражение корзины гистограммы длительностей.
+
+    Длительности до 100 с хранятся точно, дальше округляются вниз до двух
+    значащих цифр: ошибка не больше 10%, а корзин на статус - сотни.
+    """
+    steps = ' '.join(
+        f'WHEN {column} < {10 ** (power + 1)} '
+        f'THEN {column} / {10 ** (power - 1)} * {10 ** (power - 1)}'
+        for power in range(2, 8)
+    )
+    return (f'CASE WHEN {column} < 100 THEN {column} {steps} '
+            f'ELSE {column} / {10 ** 7} * {10 ** 7} END')
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS statuses (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS homeworks (
+    id INTEGER PRIMARY KEY,
+    tenant TEXT NOT NULL,
+    name TEXT NOT NULL,
+    project TEXT NOT NULL,
+    UNIQUE (tenant, name)
+);
+CREATE TABLE IF NOT EXISTS events (
+    homework_id INTEGER NOT NULL,
+    at INTEGER NOT NULL,
+    status INTEGER NOT NULL,
+    PRIMARY KEY (homework_id, at, status)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS events_time ON events (at);
+CREATE TABLE IF NOT EXISTS spans (
+    status INTEGER NOT NULL,
+    seconds INTEGER NOT NULL,
+    homework_id INTEGER NOT NULL,
+    started INTEGER NOT NULL,
+    PRIMARY KEY (status, seconds, homework_id, started)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS spans_homework ON spans (homework_id, status);
+CREATE TABLE IF NOT EXISTS status_counts (
+    tenant TEXT NOT NULL,
+    project TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (status, project, tenant)
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS events_spans AFTER INSERT ON events BEGIN
+    INSERT OR IGNORE INTO spans (status, seconds, homework_id, started)
+    SELECT status, NEW.at - at, homework_id, at FROM events
+    WHERE homework_id = NEW.homework_id AND at < NEW.at
+    ORDER BY at DESC LIMIT 1;
+    INSERT INTO status_counts (tenant, project, status, count)
+    SELECT tenant, project, NEW.status, 1 FROM homeworks
+    WHERE id = NEW.homework_id
+    ON CONFLICT (status, project, tenant) DO UPDATE SET count = count + 1;
+END;
+CREATE TABLE IF NOT EXISTS span_histogram (
+    status INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (status, bucket)
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS spans_histogram AFTER INSERT ON spans BEGIN
+    INSERT INTO span_histogram (status, bucket, count)
+    VALUES (NEW.status, """ + duration_bucket('NEW.seconds') + """, 1)
+    ON CONFLICT (status, bucket) DO UPDATE SET count = count + 1;
+END;
+"""
+
+
+def homework_event(tenant, homework, at):
+    """Собирает событие журнала из домашки ответа API.
+
+    Проектом считается lesson_name, а без него - имя работы.
+    """
+    name = homework['homework_name']
+    return (tenant, name, homework.get('lesson_name') or name,
+            homework['status'], int(at))
+
+
+class EventLog:
+    """Журнал переходов статусов домашек, только на добавление.
+
+    События хранятся компактно: имена домашек и статусов вынесены в
+    справочники, а сами события - тройки целых чисел. Длительности
+    статусов и счётчики по проектам пересчитываются триггерами при
+    вставке, поэтому запросы читают готовые индексы, а не весь журнал.
+    Длительности верны, если события одной домашки приходят по времени.
+    """
+
+    def __init__(self, path=EVENTS_DB):
+        self.connection = connect(path)
+        self.connection.executescript(SCHEMA)
+        self._fill_histogram()
+        self._statuses = dict(self.connection.execute(
+            'SELECT name, id FROM statuses'
+        ))
+        self._homeworks = {}
+        self._lock = threading.Lock()
+
+    def _fill_histogram(self):
+        with transaction(self.connection):
+            if self.connection.execute(
+                'SELECT 1 FROM span_histogram LIMIT 1'
+            ).fetchone():
+                return
+            self.connection.execute(
+                'INSERT INTO span_histogram (status, bucket, count) '
+                f'SELECT status, {duration_bucket("seconds")} AS bucket, '
+                'COUNT(*) FROM spans GROUP BY status, bucket'
+            )
+
+    def _status_id(self, name):
+        if name not in self._statuses:
+            self.connection.execute(
+                'INSERT OR IGNORE INTO statuses (name) VALUES (?)', (name,)
+            )
+            self._statuses[name] = self.connection.execute(
+                'SELECT id FROM statuses WHERE name = ?', (name,)
+            ).fetchone()[0]
+        return self._statuses[name]
+
+    def _homework_id(self, tenant, name, project):
+        key = (tenant, name)
+        if key in self._homeworks:
+            return self._homeworks[key]
+        if len(self._homeworks) >= HOMEWORK_CACHE_SIZE:
+            self._homeworks.clear()
+        self._homeworks[key] = self._lookup_homework(tenant, name, project)
+        return self._homeworks[key]
+
+    def _lookup_homework(self, tenant, name, project):
+        self.connection.execute(
+            'INSERT OR IGNORE INTO homeworks (tenant, name, project) '
+            'VALUES (?, ?, ?)', (tenant, name, project)
+        )
+        return self.connection.execute(
+            'SELECT id FROM homeworks WHERE tenant = ? AND name = ?',
+            (tenant, name)
+        ).fetchone()[0]
+
+    def append(self, events):
+        """Добавляет события (tenant, homework, project, status, at).
+
+        Повтор уже записанного события игнорируется, поэтому повторная
+        доставка ответа API не искажает статистику. Возвращает число
+        новых событий.
+        """
+        with self._lock:
+            try:
+                added = self._insert(events)
+            except BaseException:
+                self._statuses.clear()
+                self._homeworks.clear()
+                raise
+        metrics.inc('events_appended_total', added)
+        return added
+
+    def _insert(self, events):
+        added = 0
+        with transaction(self.connection):
+            for tenant, name, project, status, at in sorted(
+                    events, key=lambda event: event[4]):
+                added += self.connection.execute(
+                    'INSERT OR IGNORE INTO events VALUES (?, ?, ?)',
+                    (self._homework_id(tenant, name, project), at,
+                     self._status_id(status))
+                ).rowcount
+        return added
+
+    def history(self, tenant, homework):
+        """Возвращает переходы домашки в виде (status, at) по времени."""
+        return self.connection.execute(
+            'SELECT statuses.name, events.at FROM events '
+            'JOIN homeworks ON homeworks.id = events.homework_id '
+            'JOIN statuses ON statuses.id = events.status '
+            'WHERE homeworks.tenant = ? AND homeworks.name = ? '
+            'ORDER BY events.at', (tenant, homework)
+        ).fetchall()
+
+    def time_in_status(self, tenant, homework, status='reviewing'):
+        """Возвращает, сколько секунд домашка провела в статусе."""
+        return self.connection.execute(
+            'SELECT COALESCE(SUM(spans.seconds), 0) FROM spans '
+            'JOIN homeworks ON homeworks.id = spans.homework_id '
+            'WHERE homeworks.tenant = ? AND homeworks.name = ? '
+            'AND spans.status = (SELECT id FROM statuses WHERE name = ?)',
+            (tenant, homework, status)
+        ).fetchone()[0]
+
+    def percentiles(self, status='reviewing', quantiles=metrics.QUANTILES):
+        """Возвращает перцентили длительности статуса по всем домашкам.
+
+        Для reviewing это время ответа ревьюера. Перцентили берутся по
+        методу ближайшего ранга за один проход по гистограмме, которую
+        ведёт триггер, поэтому запрос не зависит от размера журнала.
+        Значение - нижняя граница корзины duration_bucket.
+        """
+        histogram = self.connection.execute(
+            'SELECT bucket, count FROM span_histogram WHERE status = '
+            '(SELECT id FROM statuses WHERE name = ?) ORDER BY bucket',
+            (status,)
+        ).fetchall()
+        total = sum(count for _, count in histogram)
+        result = dict.fromkeys(quantiles, 0)
+        if not total:
+            return result
+        ranks = sorted((max(0, -(-total * quantile // 100) - 1), quantile)
+                       for quantile in quantiles)
+        seen = 0
+        buckets = iter(histogram)
+        for rank, quantile in ranks:
+            while seen <= rank:
+                bucket, count = next(buckets)
+                seen += count
+            result[quantile] = bucket
+        return result
+
+    def counts_by_project(self, status='rejected', tenant=None):
+        """Возвращает число переходов в статус по проектам."""
+        query = ('SELECT project, SUM(count) FROM status_counts '
+                 'WHERE status = (SELECT id FROM statuses WHERE name = ?)')
+        params = [status]
+        if tenant is not None:
+            query += ' AND tenant = ?'
+            params.append(tenant)
+        return dict(self.connection.execute(
+            query + ' GROUP BY project', params
+        ))
@@ -1,2 +1,15 @@
 class ApiAccessError(Exception):
     """Класс исключений отсутствие доступа к API."""
+
+
+class FencedError(Exception):
+    """Класс исключений потери лидерства процессом."""
+
+
+class TelegramApiError(Exception):
+    """Класс исключений отказа Telegram Bot API."""
+
+    def __init__(self, message, retry_after=None, error_code=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.error_code = error_code
@@ -0,0 +1,205 @@
+import logging
+import os
+import socket
+import time
+
+import bootstrap
+import connections
+import events
+import heartbeat
+import homework
+import live_config
+import log_config
+import metrics
+import poller
+import preflight
+import push
+import sender
+import shutdown
+import tracing
+import transport
+from exceptions import FencedError
+from settings import env
+from state import PRIORITY_INFO, StateStore, TieredStates, transaction
+
+logger = logging.getLogger(__name__)
+
+LEADER_TTL = env('LEADER_TTL', 15, int)
+FAILOVER_TICK = env('FAILOVER_TICK', 3, int)
+OUTBOX_OWNER = 'leader'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS leader (
+    name TEXT PRIMARY KEY,
+    holder TEXT NOT NULL,
+    epoch INTEGER NOT NULL,
+    expires REAL NOT NULL
+);
+"""
+
+
+class Leadership:
+    """Аренда роли ведущего с номером эпохи в качестве fencing-токена.
+
+    Каждая смена ведущего увеличивает эпоху, и запись состояния или
+    отправка разрешены только процессу с текущей эпохой.
+    """
+
+    def __init__(self, connection, holder, ttl=LEADER_TTL, name='poller'):
+        self.connection = connection
+        self.holder = holder
+        self.ttl = ttl
+        self.name = name
+        self.epoch = None
+        self.connection.executescript(SCHEMA)
+
+    def _current(self):
+        return self.connection.execute(
+            'SELECT holder, epoch, expires FROM leader WHERE name = ?',
+            (self.name,)
+        ).fetchone()
+
+    def acquire(self, now=None):
+        """Захватывает или продлевает лидерство, возвращает успех."""
+        if now is None:
+            now = time.time()
+        with transaction(self.connection):
+            row = self._current()
+            if row is None:
+                epoch = 1
+            elif row[0] == self.holder and row[1] == self.epoch:
+                epoch = self.epoch
+            elif row[2] < now:
+                epoch = row[1] + 1
+            else:
+                self.epoch = None
+                return False
+            self.connection.execute(
+                'INSERT OR REPLACE INTO leader VALUES (?, ?, ?, ?)',
+                (self.name, self.holder, epoch, now + self.ttl)
+            )
+        if epoch != self.epoch:
+            logger.warning(f'{self.holder} стал ведущим, эпоха {epoch}.')
+        self.epoch = epoch
+        return True
+
+    def check(self, now=None):
+        """Выбрасывает FencedError, если процесс больше не ведущий."""
+        if now is None:
+            now = time.time()
+        row = self._current()
+        if (row is None or self.epoch is None
+                or (row[0], row[1]) != (self.holder, self.epoch)
+                or row[2] < now):
+            self.epoch = None
+            raise FencedError(f'{self.holder} больше не ведущий.')
+
+    def renew(self, now=None):
+        """Продлевает текущую аренду, не перехватывая чужую.
+
+        Проверка и продление - один UPDATE, поэтому renew годится как
+        fence и внутри чужой транзакции. Выбрасывает FencedError, если
+        аренда истекла или перешла к другому процессу.
+        """
+        if now is None:
+            now = time.time()
+        if self.epoch is not None and self.connection.execute(
+            'UPDATE leader SET expires = ? WHERE name = ? AND holder = ? '
+            'AND epoch = ? AND expires >= ?',
+            (now + self.ttl, self.name, self.holder, self.epoch, now)
+        ).rowcount:
+            return
+        self.epoch = None
+        raise FencedError(f'{self.holder} больше не ведущий.')
+
+    def release(self):
+        """Отдаёт лидерство досрочно, чтобы резерв не ждал истечения."""
+        if self.epoch is None:
+            return
+        self.connection.execute(
+            'DELETE FROM leader WHERE name = ? AND holder = ? AND epoch = ?',
+            (self.name, self.holder, self.epoch)
+        )
+        self.epoch = None
+
+
+def announce(store, holder):
+    """Ставит в очередь сообщение о старте ведущего с низким приоритетом.
+
+    При переполнении очереди оно сбрасывается первым и не задерживает
+    статусы домашек.
+    """
+    if homework.TELEGRAM_CHAT_ID:
+        store.put(homework.TELEGRAM_CHAT_ID,
+                  f'Бот запущен, ведущий {holder}.', priority=PRIORITY_INFO)
+
+
+def run(holder=None):
+    """Работает ведущим или горячим резервом в зависимости от аренды.
+
+    Резерв каждые FAILOVER_TICK секунд перечитывает состояние ведущего и
+    перехватывает работу, как только аренда ведущего истекает. Шаг
+    резерва - спан standby, иначе сторож принял бы его за зависший
+    цикл и перезапускал процесс каждые LOOP_TIMEOUT. Приём push открыт
+    только у ведущего. По SIGTERM ведущий досылает очередь, сохраняет
+    состояние и отдаёт лидерство.
+    """
+    if holder is None:
+        holder = f'{socket.gethostname()}-{os.getpid()}'
+    store = StateStore(owner=OUTBOX_OWNER)
+    leadership = Leadership(store.connection, holder)
+    bot = transport.TelegramTransport(homework.TELEGRAM_TOKEN)
+    reloader = live_config.ConfigReloader()
+    reloader.install()
+    shutdown.SHUTDOWN.install()
+    tracing.install_profiler()
+    states = TieredStates(store, fence=leadership.renew)
+    event_log = events.EventLog()
+    bootstrapper = bootstrap.Bootstrapper()
+    bootstrapper.start()
+    checks = preflight.Preflight(bot)
+    checks.start()
+    ingest = None
+    connections.install_dns_cache()
+    heartbeat.start_watchdog()
+    session = connections.get_session()
+    try:
+        while not shutdown.SHUTDOWN.requested:
+            config = reloader.refresh(states)
+            epoch = leadership.epoch
+            leader = leadership.acquire()
+            ingest = push.follow_leader(ingest, leader, config.tenants)
+            if leader:
+                if leadership.epoch != epoch:
+                    states.reload()
+                    announce(store, leadership.holder)
+                try:
+                    poller.run_tick(bot, store, config.tenants, states,
+                                    leadership.renew, session=session,
+                                    config=config, limiter=sender.LIMITER,
+                                    event_log=event_log,
+                                    bootstrap=bootstrapper,
+                                    preflight=checks, ingest=ingest)
+                    poller.prewarm_upcoming(
+                        config.tenants, states, FAILOVER_TICK, session=session,
+                        bot_session=bot.session
+                    )
+                except FencedError as error:
+                    logger.warning(f'Переход в резерв: {error}')
+            else:
+                with tracing.span('standby'):
+                    states.reload()
+            heartbeat.WATCHDOG.set_ready()
+            metrics.export()
+            tracing.export()
+            shutdown.SHUTDOWN.wait(FAILOVER_TICK)
+        if leadership.epoch is not None:
+            poller.drain(bot, store, states, leadership.renew)
+    finally:
+        push.follow_leader(ingest, False)
+        leadership.release()
+
+
+if __name__ == '__main__':
+    log_config.setup_logging()
+    run()
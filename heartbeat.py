@@ -0,0 +1,181 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from http import HTTPStatus
+
+import metrics
+import tracing
+from settings import env
+
+logger = logging.getLogger(__name__)
+
+STAGE_TIMEOUT = env('STAGE_TIMEOUT', 90, int)
+RESTART_TIMEOUT = env('RESTART_TIMEOUT', 300, int)
+LOOP_TIMEOUT = env('LOOP_TIMEOUT', 1800, int)
+WATCHDOG_INTERVAL = env('WATCHDOG_INTERVAL', 5, int)
+HEALTH_HOST = env('HEALTH_HOST', '127.0.0.1')
+HEALTH_PORT = env('HEALTH_PORT', None, int)
+
+
+def restart_process():
+    """Перезапускает процесс с теми же аргументами."""
+    import log_config
+
+    log_config.stop_logging()
+    os.execv(sys.executable, [sys.executable] + sys.argv)
+
+
+def exit_process():
+    """Завершает процесс, чтобы его перезапустил родитель."""
+    import log_config
+
+    log_config.stop_logging()
+    os._exit(1)
+
+
+class Watchdog:
+    """Следит за этапами цикла опроса по спанам трассировки.
+
+    Этап дольше STAGE_TIMEOUT даёт предупреждение с дампом стека потока,
+    дольше RESTART_TIMEOUT - перезапуск процесса. Цикл без единого спана
+    дольше LOOP_TIMEOUT тоже считается зависшим.
+    """
+
+    def __init__(self, stage_timeout=STAGE_TIMEOUT,
+                 restart_timeout=RESTART_TIMEOUT, loop_timeout=LOOP_TIMEOUT,
+                 restart=restart_process):
+        self.stage_timeout = stage_timeout
+        self.restart_timeout = restart_timeout
+        self.loop_timeout = loop_timeout
+        self.restart = restart
+        self.ready = False
+        self.last_activity = time.monotonic()
+        self.status = {'live': True, 'ready': False, 'stuck': []}
+        self._stages = {}
+        self._warned = set()
+        self._lock = threading.Lock()
+
+    def on_span(self, event, name):
+        """Отмечает начало и конец этапа в текущем потоке."""
+        thread_id = threading.get_ident()
+        now = time.monotonic()
+        with self._lock:
+            self.last_activity = now
+            stack = self._stages.setdefault(thread_id, [])
+            if event == 'start':
+                stack.append((name, now))
+            elif stack:
+                stack.pop()
+                if not stack:
+                    del self._stages[thread_id]
+
+    def set_ready(self, ready=True):
+        """Отмечает готовность процесса обслуживать опросы."""
+        self.ready = ready
+
+    def _dump_stack(self, thread_id):
+        frame = sys._current_frames().get(thread_id)
+        if frame is None:
+            return ''
+        return ''.join(traceback.format_stack(frame))
+
+    def check(self, now=None):
+        """Проверяет этапы, эскалирует зависания и обновляет статус."""
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            current = {thread_id: stack[-1]
+                       for thread_id, stack in self._stages.items()}
+            idle = now - self.last_activity
+        stuck = []
+        for thread_id, (stage, started) in current.items():
+            age = now - started
+            if age < self.stage_timeout:
+                continue
+            stuck.append({'stage': stage, 'seconds': round(age)})
+            key = (thread_id, stage, started)
+            if key not in self._warned:
+                self._warned.add(key)
+                metrics.inc('watchdog_stuck_stages_total')
+                logger.warning(f'Этап {stage} выполняется {age:.0f} с:\n'
+                               f'{self._dump_stack(thread_id)}')
+        live = (idle < self.loop_timeout
+                and all(item['seconds'] < self.restart_timeout
+                        for item in stuck))
+        self.status = {'live': live, 'ready': self.ready and live,
+                       'stuck': stuck}
+        metrics.set_gauge('watchdog_live', int(live))
+        if not live:
+            logger.critical(f'Цикл опроса завис: {self.status}, '
+                            f'перезапуск процесса.')
+            self.restart()
+        return self.status
+
+    def run(self, interval=WATCHDOG_INTERVAL):
+        """Периодически проверяет состояние цикла."""
+        while True:
+            time.sleep(interval)
+            try:
+                self.check()
+            except Exception as error:
+                logger.error(f'Сбой сторожевого потока: {error}')
+
+
+WATCHDOG = Watchdog()
+
+
+def start_watchdog(watchdog=WATCHDOG, port=HEALTH_PORT, host=HEALTH_HOST):
+    """Запускает сторожевой поток и, если задан порт, HTTP-проверку.
+
+    Если порт занят, например вторым процессом на том же хосте, сторож
+    работает без HTTP-проверки.
+    """
+    tracing.add_listener(watchdog.on_span)
+    threading.Thread(target=watchdog.run, name='watchdog',
+                     daemon=True).start()
+    if port is None:
+        return None
+    try:
+        return serve_health(watchdog, host, port)
+    except OSError as error:
+        logger.error(f'Не удалось запустить проверку здоровья: {error}')
+        return None
+
+
+def serve_health(watchdog, host=HEALTH_HOST, port=HEALTH_PORT):
+    """Запускает HTTP-проверку здоровья с закэшированным статусом.
+
+    http.server импортируется здесь, чтобы не замедлять старт бота.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class HealthHandler(BaseHTTPRequestHandler):
+        """Отдаёт liveness и readiness сторожа."""
+
+        def do_GET(self):
+            """Отвечает на /live и /ready."""
+            status = watchdog.status
+            checks = {'/live': status['live'], '/ready': status['ready']}
+            if self.path not in checks:
+                self.send_error(HTTPStatus.NOT_FOUND)
+                return
+            body = json.dumps(status).encode()
+            self.send_response(HTTPStatus.OK if checks[self.path]
+                               else HTTPStatus.SERVICE_UNAVAILABLE)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            """Не пишет каждую проверку здоровья в лог."""
+
+    server = ThreadingHTTPServer((host, port), HealthHandler)
+    threading.Thread(target=server.serve_forever, name='health',
+                     daemon=True).start()
+    logger.info(f'Проверка здоровья на http://{host}:{port}/live')
+    return server
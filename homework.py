@@ -1,24 +1,23 @@
 import logging
-import os
 import sys
 import time
-from http import HTTPStatus
 
-import requests
-from dotenv import load_dotenv
-from telebot import TeleBot
-
-from exceptions import ApiAccessError
-
-load_dotenv()
+import cursor
+import heartbeat
+import metrics
+import shutdown
+import tracing
+from settings import env, get_settings
 
 logger = logging.getLogger(__name__)
 
-PRACTICUM_TOKEN = os.getenv('PRACTICUM_TOKEN')
-TELEGRAM_TOKEN = os.getenv('TELEGRAM_TOKEN')
-TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
+SETTINGS = get_settings()
+PRACTICUM_TOKEN = SETTINGS.practicum_token
+TELEGRAM_TOKEN = SETTINGS.telegram_token
+TELEGRAM_CHAT_ID = SETTINGS.telegram_chat_id
 
 RETRY_PERIOD = 600
+REQUEST_TIMEOUT = env('REQUEST_TIMEOUT', 30, int)
 ENDPOINT = 'https://practicum.yandex.ru/api/user_api/homework_statuses/'
 HEADERS = {'Authorization': f'OAuth {PRACTICUM_TOKEN}'}
 
@@ -35,27 +34,32 @@ def check_tokens():
     return all([PRACTICUM_TOKEN, TELEGRAM_TOKEN, TELEGRAM_CHAT_ID])
 
 
-def send_message(bot, message):
-    """Отправляет сообщение пользователю в Телеграмм."""
+def send_to_chat(bot, chat_id, message):
+    """Отправляет сообщение в указанный чат Телеграмма."""
     try:
-        bot.send_message(TELEGRAM_CHAT_ID, message)
+        bot.send_message(chat_id, message)
         logger.debug(f'Сообщение "{message}" успешно отправлено.')
+        return True
     except Exception as exc:
         logger.error(f'Ошибка с отправкой сообщения: {exc}')
+        return False
 
 
+@tracing.traced
+def send_message(bot, message):
+    """Отправляет сообщение пользователю в Телеграмм."""
+    send_to_chat(bot, TELEGRAM_CHAT_ID, message)
+
+
+@tracing.traced
 def get_api_answer(timestamp):
     """Делает запрос к эндпоинту API-сервиса Практикум Домашка."""
-    try:
-        response = requests.get(url=ENDPOINT, headers=HEADERS,
-                                params={'from_date': timestamp})
-    except requests.exceptions.RequestException as err:
-        raise ApiAccessError(f'Эндпойнт недоступен: {err}')
-    if response.status_code != HTTPStatus.OK:
-        raise response.raise_for_status()
-    return response.json()
+    from practicum import PracticumClient
 
+    return PracticumClient(PRACTICUM_TOKEN).homework_statuses(timestamp)
 
+
+@tracing.traced
 def check_response(response):
     """Проверяет ответ API на валидность."""
     if not isinstance(response, dict):
@@ -73,39 +77,53 @@ def check_response(response):
     return homeworks
 
 
-def parse_status(homework):
-    """Извлекает информацию о конкретной домашке."""
+def render_status(homework, verdicts):
+    """Формирует сообщение о статусе домашки по текстам вердиктов."""
     for key in ['homework_name', 'status']:
         if key not in homework:
             raise KeyError(f'В ответе API нет ключа: {key}')
-    if homework['status'] not in HOMEWORK_VERDICTS:
+    if homework['status'] not in verdicts:
         raise ValueError('Неожиданный статус домашки в ответе API.')
-    verdict = HOMEWORK_VERDICTS[homework['status']]
+    verdict = verdicts[homework['status']]
     homework = homework['homework_name']
     return (f'Изменился статус проверки работы "{homework}".'
             f'{verdict}')
 
 
+@tracing.traced
+def parse_status(homework):
+    """Извлекает информацию о конкретной домашке."""
+    return render_status(homework, HOMEWORK_VERDICTS)
+
+
 def main():
     """Основная логика работы бота."""
     if not check_tokens():
         logger.critical('Отсутствует переменная окружения.')
         sys.exit()
 
+    from telebot import TeleBot
+
     bot = TeleBot(token=TELEGRAM_TOKEN)
     send_message(bot, 'Бот запущен.')
-    timestamp = int(time.time())
+    heartbeat.WATCHDOG.set_ready()
+    metrics.set_gauge('poll_interval_seconds', RETRY_PERIOD)
+    started = int(time.time())
+    position = cursor.Cursor(started, floor=started)
     prev_err = ''
 
     while True:
         try:
-            response = get_api_answer(timestamp)
-            homework = check_response(response)
+            response = get_api_answer(position.from_date)
+            homework = position.fresh(check_response(response))
             if homework:
                 status_homework = parse_status(homework[0])
                 send_message(bot, status_homework)
                 logger.debug('Сообщение с новым статусом отправлено')
-            timestamp = response['current_date']
+                alert = metrics.NOTIFY_LATENCY.observe_homework(homework[0])
+                if alert:
+                    send_message(bot, alert)
+            position.advance(response['current_date'], homework)
             logger.debug('В статусе домашки нет изменений.')
         except Exception as error:
             message = f'Сбой в работе программы: {error}'
@@ -114,23 +132,18 @@ def main():
                 send_message(bot, message)
                 prev_err = error
         finally:
-            time.sleep(RETRY_PERIOD)
+            metrics.export()
+            tracing.export()
+            with shutdown.SHUTDOWN.idle():
+                time.sleep(RETRY_PERIOD)
 
 
 if __name__ == '__main__':
-    logging.basicConfig(
-        datefmt='%H:%M:%S',
-        filename='main.log',
-        encoding='UTF-8',
-        filemode='a',
-        level=logging.INFO,
-        format='%(asctime)s [%(levelname)s] %(funcName)s - %(message)s'
-    )
+    import log_config
+
+    log_config.setup_logging()
     logger.setLevel(logging.DEBUG)
-    handler = logging.StreamHandler(stream=sys.stdout)
-    formatter = logging.Formatter(
-        "%(asctime)s [%(levelname)s] %(message)s (%(funcName)s | %(lineno)d)"
-    )
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
+    tracing.install_profiler()
+    heartbeat.start_watchdog()
+    shutdown.SHUTDOWN.install()
     main()
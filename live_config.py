@@ -0,0 +1,130 @@
+import json
+import logging
+import os
+import signal
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+import homework
+import metrics
+from settings import env
+from tenants import TENANTS_FILE, load_tenants
+
+logger = logging.getLogger(__name__)
+
+CONFIG_FILE = env('CONFIG_FILE')
+CONFIG_WATCH_INTERVAL = env('CONFIG_WATCH_INTERVAL', 5, float)
+
+Config = namedtuple('Config', ('tenants', 'retry_period', 'verdicts'))
+
+
+def load_config(path=CONFIG_FILE, tenants_path=TENANTS_FILE):
+    """Читает тенантов, период опроса и тексты вердиктов.
+
+    Файл конфигурации необязателен: без него действуют RETRY_PERIOD и
+    HOMEWORK_VERDICTS из homework, а тексты из файла их дополняют.
+    """
+    data = {}
+    if path:
+        with open(path, encoding='UTF-8') as file:
+            data = json.load(file)
+    retry_period = int(data.get('retry_period', homework.RETRY_PERIOD))
+    if retry_period <= 0:
+        raise ValueError(f'Период опроса должен быть больше нуля, '
+                         f'получено {retry_period}.')
+    verdicts = dict(homework.HOMEWORK_VERDICTS)
+    verdicts.update(data.get('verdicts', {}))
+    return Config(tuple(load_tenants(tenants_path)), retry_period,
+                  MappingProxyType(verdicts))
+
+
+def diff_tenants(old, new):
+    """Возвращает имена добавленных, удалённых и изменённых тенантов."""
+    old = {tenant.name: tenant for tenant in old}
+    new = {tenant.name: tenant for tenant in new}
+    changed = {name for name in old.keys() & new.keys()
+               if old[name] != new[name]}
+    return (sorted(new.keys() - old.keys()), sorted(old.keys() - new.keys()),
+            sorted(changed))
+
+
+class ConfigReloader:
+    """Держит текущую конфигурацию и перечитывает её без перезапуска.
+
+    Перечитывание запускается сигналом SIGHUP или изменением файлов.
+    Новая конфигурация подменяет старую одним присваиванием, поэтому шаг
+    опроса, уже взявший конфигурацию, доработает со старой.
+    """
+
+    def __init__(self, loader=load_config, paths=(CONFIG_FILE, TENANTS_FILE),
+                 interval=CONFIG_WATCH_INTERVAL):
+        self.loader = loader
+        self.paths = [path for path in paths if path]
+        self.interval = interval
+        self.current = loader()
+        self._mtimes = self._stat()
+        self._checked = time.monotonic()
+        self._requested = threading.Event()
+
+    def _stat(self):
+        mtimes = {}
+        for path in self.paths:
+            try:
+                stat = os.stat(path)
+                mtimes[path] = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                mtimes[path] = None
+        return mtimes
+
+    def request(self):
+        """Просит перечитать конфигурацию, безопасно из обработчика сигнала."""
+        self._requested.set()
+
+    def install(self, signum=getattr(signal, 'SIGHUP', None)):
+        """Включает перечитывание конфигурации по сигналу."""
+        if signum is None:
+            logger.warning('Сигнал для перечитывания конфигурации '
+                           'недоступен, остаётся слежение за файлами.')
+            return
+        signal.signal(signum, lambda signum, frame: self.request())
+
+    def _files_changed(self, now):
+        if now - self._checked < self.interval:
+            return False
+        self._checked = now
+        return self._stat() != self._mtimes
+
+    def refresh(self, states=None, now=None):
+        """Перечитывает конфигурацию, если нужно, и возвращает текущую.
+
+        Состояния удалённых тенантов вытесняются из кэша, но остаются
+        в хранилище: вернувшийся тенант продолжит со своего курсора.
+        При ошибке в файлах продолжает работать старая конфигурация.
+        """
+        if now is None:
+            now = time.monotonic()
+        if not (self._requested.is_set() or self._files_changed(now)):
+            return self.current
+        self._requested.clear()
+        self._mtimes = self._stat()
+        try:
+            config = self.loader()
+        except (OSError, ValueError, KeyError, TypeError) as error:
+            logger.error(f'Конфигурация не перечитана, остаётся '
+                         f'прежняя: {error}')
+            metrics.inc('config_reload_errors_total')
+            return self.current
+        added, removed, changed = diff_tenants(self.current.tenants,
+                                               config.tenants)
+        if states is not None:
+            for name in removed:
+                states.discard(name)
+        self.current = config
+        metrics.inc('config_reloads_total')
+        metrics.set_gauge('poll_interval_seconds', config.retry_period)
+        logger.warning(f'Конфигурация перечитана: добавлено {len(added)}, '
+                       f'удалено {len(removed)}, изменено {len(changed)} '
+                       f'тенантов, период опроса {config.retry_period} с.')
+        return config
@@ -0,0 +1,190 @@
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import sys
+import time
+from contextlib import contextmanager
+from logging.handlers import (QueueHandler, QueueListener,
+                              TimedRotatingFileHandler)
+
+import metrics
+from settings import env
+
+LOG_FILE = env('LOG_FILE', 'main.log')
+LOG_FORMAT = env('LOG_FORMAT', 'text')
+LOG_MAX_BYTES = env('LOG_MAX_BYTES', 10 * 1024 * 1024, int)
+LOG_ROTATE_WHEN = env('LOG_ROTATE_WHEN', 'midnight')
+LOG_BACKUP_COUNT = env('LOG_BACKUP_COUNT', 7, int)
+LOG_QUEUE_SIZE = env('LOG_QUEUE_SIZE', 10000, int)
+LOG_SAMPLE_INTERVAL = env('LOG_SAMPLE_INTERVAL', 60, float)
+LOG_SAMPLE_BURST = env('LOG_SAMPLE_BURST', 1, int)
+
+FILE_FORMAT = '%(asctime)s [%(levelname)s] %(funcName)s - %(message)s'
+STREAM_FORMAT = (
+    '%(asctime)s [%(levelname)s] %(message)s (%(funcName)s | %(lineno)d)'
+)
+FILE_DATE_FORMAT = '%H:%M:%S'
+
+_tenant = contextvars.ContextVar('tenant', default=None)
+_listeners = []
+
+
+@contextmanager
+def tenant_context(tenant):
+    """Добавляет имя тенанта ко всем записям лога внутри блока."""
+    token = _tenant.set(tenant)
+    try:
+        yield
+    finally:
+        _tenant.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """Переносит контекст тенанта в запись лога."""
+
+    def filter(self, record):
+        """Дополняет запись именем тенанта."""
+        record.tenant = _tenant.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Ограничивает частоту повторяющихся отладочных записей.
+
+    Одинаковая запись пропускается не чаще burst раз за interval секунд,
+    число отброшенных повторов дописывается к следующей пропущенной.
+    """
+
+    MAX_KEYS = 10000
+
+    def __init__(self, interval=LOG_SAMPLE_INTERVAL, burst=LOG_SAMPLE_BURST,
+                 level=logging.DEBUG):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self.level = level
+        self._windows = {}
+
+    def filter(self, record):
+        """Решает, пропустить ли запись."""
+        if record.levelno > self.level:
+            return True
+        key = (record.name, record.levelno, record.getMessage())
+        now = time.monotonic()
+        started, passed, dropped = self._windows.get(key, (now, 0, 0))
+        if now - started >= self.interval:
+            started, passed = now, 0
+        if passed >= self.burst:
+            self._windows[key] = (started, passed, dropped + 1)
+            metrics.inc('log_records_sampled_total')
+            return False
+        if len(self._windows) >= self.MAX_KEYS:
+            self._windows.clear()
+        self._windows[key] = (started, passed + 1, 0)
+        if dropped:
+            record.msg = f'{record.getMessage()} (повторов: {dropped})'
+            record.args = None
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Передаёт записи в очередь и отбрасывает их при переполнении."""
+
+    def enqueue(self, record):
+        """Кладёт запись в очередь без ожидания."""
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.inc('log_records_dropped_total')
+
+
+class JsonFormatter(logging.Formatter):
+    """Форматирует запись лога в одну строку JSON."""
+
+    def format(self, record):
+        """Возвращает запись в виде JSON."""
+        data = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'func': record.funcName,
+            'line': record.lineno,
+            'message': record.getMessage(),
+        }
+        tenant = getattr(record, 'tenant', None)
+        if tenant is not None:
+            data['tenant'] = tenant
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+class SizedTimedRotatingFileHandler(TimedRotatingFileHandler):
+    """Ротирует файл лога по времени и по размеру."""
+
+    def __init__(self, filename, max_bytes=LOG_MAX_BYTES, **kwargs):
+        super().__init__(filename, **kwargs)
+        self.max_bytes = max_bytes
+
+    def shouldRollover(self, record):
+        """Проверяет, пора ли ротировать файл."""
+        if super().shouldRollover(record):
+            return True
+        if not self.max_bytes or self.stream is None:
+            return False
+        message = f'{self.format(record)}\n'
+        return self.stream.tell() + len(message) >= self.max_bytes
+
+    def rotation_filename(self, default_name):
+        """Не даёт ротации по размеру затереть архив за тот же период."""
+        name = super().rotation_filename(default_name)
+        candidate, index = name, 1
+        while os.path.exists(candidate):
+            candidate = f'{name}.{index}'
+            index += 1
+        return candidate
+
+
+def setup_logging(level=logging.INFO, log_file=LOG_FILE,
+                  log_format=LOG_FORMAT, stream=None):
+    """Настраивает асинхронное логирование в файл и stdout.
+
+    stream заменяет stdout для консольного вывода. Возвращает запущенный
+    QueueListener, он останавливается при выходе.
+    """
+    file_handler = SizedTimedRotatingFileHandler(
+        log_file, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUP_COUNT,
+        encoding='UTF-8'
+    )
+    stream_handler = logging.StreamHandler(stream=stream or sys.stdout)
+    if log_format == 'json':
+        file_handler.setFormatter(JsonFormatter())
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        file_handler.setFormatter(
+            logging.Formatter(FILE_FORMAT, datefmt=FILE_DATE_FORMAT)
+        )
+        stream_handler.setFormatter(logging.Formatter(STREAM_FORMAT))
+
+    queue_handler = NonBlockingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    queue_handler.setFormatter(logging.Formatter('%(message)s'))
+    queue_handler.addFilter(ContextFilter())
+    queue_handler.addFilter(SamplingFilter())
+    listener = QueueListener(
+        queue_handler.queue, file_handler, stream_handler,
+        respect_handler_level=True
+    )
+    logging.basicConfig(level=level, handlers=[queue_handler], force=True)
+    listener.start()
+    _listeners.append(listener)
+    atexit.register(stop_logging)
+    return listener
+
+
+def stop_logging():
+    """Дописывает очередь записей и останавливает фоновые потоки лога."""
+    while _listeners:
+        _listeners.pop().stop()
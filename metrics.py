@@ -0,0 +1,138 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from settings import env
+
+logger = logging.getLogger(__name__)
+
+METRICS_FILE = env('METRICS_FILE')
+NOTIFY_SLO = env('NOTIFY_SLO', 900, int)
+LATENCY_WINDOW = env('LATENCY_WINDOW', 1000, int)
+
+DATE_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+QUANTILES = (50, 95, 99)
+SLO_QUANTILE = 95
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+
+
+def inc(name, value=1):
+    """Увеличивает счётчик метрики."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def set_gauge(name, value):
+    """Устанавливает текущее значение метрики."""
+    with _lock:
+        _gauges[name] = value
+
+
+def drop_gauges(prefix):
+    """Удаляет значения метрик, имена которых начинаются с prefix."""
+    with _lock:
+        for name in [name for name in _gauges if name.startswith(prefix)]:
+            del _gauges[name]
+
+
+def render():
+    """Возвращает метрики в текстовом формате Prometheus."""
+    with _lock:
+        samples = {**_counters, **_gauges}
+    return ''.join(f'{name} {value}\n'
+                   for name, value in sorted(samples.items()))
+
+
+def export(path=METRICS_FILE):
+    """Атомарно записывает метрики в файл, если он задан."""
+    if not path:
+        return
+    tmp_path = f'{path}.tmp'
+    try:
+        with open(tmp_path, 'w', encoding='UTF-8') as file:
+            file.write(render())
+        os.replace(tmp_path, path)
+    except OSError as err:
+        logger.error(f'Не удалось выгрузить метрики в {path}: {err}')
+
+
+def parse_date(value):
+    """Переводит дату из ответа API в timestamp."""
+    return datetime.strptime(value, DATE_FORMAT).replace(
+        tzinfo=timezone.utc
+    ).timestamp()
+
+
+def homework_updated(homework):
+    """Возвращает timestamp изменения домашки или None."""
+    date_updated = homework.get('date_updated')
+    if not date_updated:
+        return None
+    try:
+        return parse_date(date_updated)
+    except (TypeError, ValueError):
+        logger.error(f'Неверный формат date_updated: {date_updated}')
+        return None
+
+
+class LatencyTracker:
+    """Скользящее окно задержек доставки уведомлений и контроль SLO."""
+
+    def __init__(self, name, slo=NOTIFY_SLO, window=LATENCY_WINDOW):
+        self.name = name
+        self.slo = slo
+        self.samples = deque(maxlen=window)
+        self.breached = False
+        self._lock = threading.Lock()
+
+    def percentile(self, quantile):
+        """Возвращает перцентиль задержки по методу ближайшего ранга."""
+        with self._lock:
+            ordered = sorted(self.samples)
+        if not ordered:
+            return 0.0
+        rank = max(0, -(-len(ordered) * quantile // 100) - 1)
+        return ordered[int(rank)]
+
+    def observe(self, seconds):
+        """Учитывает задержку и возвращает текст оповещения о нарушении SLO.
+
+        Оповещение возвращается только при переходе в состояние нарушения,
+        чтобы не повторять его на каждом уведомлении.
+        """
+        with self._lock:
+            self.samples.append(max(0.0, seconds))
+        inc(f'{self.name}_count')
+        for quantile in QUANTILES:
+            set_gauge(f'{self.name}_seconds{{quantile="0.{quantile}"}}',
+                      round(self.percentile(quantile), 3))
+        slo_value = self.percentile(SLO_QUANTILE)
+        breached = slo_value > self.slo
+        alert = None
+        if breached and not self.breached:
+            inc(f'{self.name}_slo_breaches_total')
+            alert = (f'Нарушен SLO доставки уведомлений: '
+                     f'p{SLO_QUANTILE} = {slo_value:.0f} с '
+                     f'при норме {self.slo} с.')
+            logger.warning(alert)
+        self.breached = breached
+        set_gauge(f'{self.name}_slo_breached', int(breached))
+        return alert
+
+    def observe_homework(self, homework, now=None):
+        """Учитывает задержку между date_updated домашки и отправкой."""
+        updated = homework_updated(homework)
+        if updated is None:
+            return None
+        if now is None:
+            now = time.time()
+        return self.observe(now - updated)
+
+
+NOTIFY_LATENCY = LatencyTracker('notify_latency')
@@ -0,0 +1,285 @@
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import accounting
+import connections
+import cursor
+import homework
+import log_config
+import metrics
+import practicum
+import sender
+import shutdown
+import tracing
+from events import homework_event
+from exceptions import FencedError
+from settings import env
+from state import PRIORITY_ALERT, PRIORITY_STATUS
+from subscriptions import recipients
+
+logger = logging.getLogger(__name__)
+
+POLL_CONCURRENCY = env('POLL_CONCURRENCY', practicum.LIMITER.maximum, int)
+
+
+class MessageBuffer:
+    """Собирает сообщения из потоков опроса до записи в outbox."""
+
+    def __init__(self):
+        self.messages = []
+
+    def put(self, chat_id, text, updated=None, priority=PRIORITY_STATUS):
+        """Запоминает сообщение."""
+        self.messages.append((chat_id, text, updated, priority))
+
+    def put_many(self, messages, fence=None):
+        """Запоминает пачку сообщений."""
+        self.messages.extend(messages)
+
+    def drain_to(self, outbox, fence=None):
+        """Перекладывает накопленные сообщения в outbox одной пачкой.
+
+        fence передаётся в put_many и проверяется в транзакции записи.
+        """
+        if self.messages:
+            outbox.put_many(self.messages, fence)
+        self.messages = []
+
+
+def new_state(now=None):
+    """Создаёт состояние опроса нового тенанта.
+
+    Без явного now курсор ставится по часам API, а не по локальным.
+    """
+    if now is None:
+        now = cursor.SKEW.now()
+    return {'timestamp': int(now), 'next_poll': 0, 'prev_err': '',
+            'seen': {}}
+
+
+def next_poll(states, name):
+    """Возвращает срок опроса тенанта, не подгружая состояние с диска."""
+    if hasattr(states, 'next_poll'):
+        return states.next_poll(name)
+    return states[name]['next_poll']
+
+
+def due_tenants(tenants, states, now=None, slack=0):
+    """Возвращает тенантов, которых пора опросить.
+
+    slack позволяет захватить тенантов, срок которых наступит вот-вот.
+    Для TieredStates срок проверяется без подгрузки состояний с диска.
+    """
+    started = now
+    if now is None:
+        now = time.time()
+    due = []
+    for tenant in tenants:
+        if tenant.name not in states:
+            states[tenant.name] = new_state(started)
+        if next_poll(states, tenant.name) <= now + slack:
+            due.append(tenant)
+    return due
+
+
+def notify(outbox, tenant, fresh, current_date, verdicts, events=None):
+    """Ставит в очередь новые статусы домашек тенанта.
+
+    Статус рендерится один раз и ставится в очередь владельцу и
+    подходящим подписчикам. Возвращает число поставленных сообщений.
+    """
+    queued = 0
+    for item in fresh:
+        text = homework.render_status(item, verdicts)
+        updated = metrics.homework_updated(item)
+        if events is not None:
+            events.append(homework_event(tenant.name, item,
+                                         updated or current_date))
+        chats = recipients(tenant, item)
+        for chat_id in chats:
+            outbox.put(chat_id, text, updated)
+        queued += len(chats)
+    return queued
+
+
+def poll_tenant(outbox, tenant, state, now=None, session=None, config=None,
+                events=None):
+    """Опрашивает API для одного тенанта и ставит новые статусы в очередь.
+
+    config задаёт тексты вердиктов и период опроса, без него действуют
+    значения из homework. Новые статусы уходят через notify, ошибки
+    получает только владелец.
+    В список events, если он передан, добавляются события для журнала.
+    Запросы, байты ответа, время CPU, сообщения и ошибки тенанта
+    учитываются в accounting.USAGE.
+    """
+    if now is None:
+        now = time.time()
+    verdicts, retry_period = homework.HOMEWORK_VERDICTS, homework.RETRY_PERIOD
+    if config is not None:
+        verdicts, retry_period = config.verdicts, config.retry_period
+    client = practicum.tenant_client(tenant, session)
+    usage = {'calls': 1, 'messages': 0}
+    started = time.thread_time()
+    with log_config.tenant_context(tenant.name):
+        try:
+            position = cursor.Cursor.load(state)
+            response = client.homework_statuses(position.from_date)
+            homeworks = homework.check_response(response)
+            cursor.SKEW.observe(response['current_date'])
+            fresh = position.fresh(homeworks)
+            usage['messages'] += notify(outbox, tenant, fresh,
+                                        response['current_date'], verdicts,
+                                        events)
+            if not fresh:
+                logger.debug('В статусе домашки нет изменений.')
+            position.advance(response['current_date'], homeworks)
+            position.dump(state)
+            state['prev_err'] = ''
+        except Exception as error:
+            message = f'Сбой в работе программы: {error}'
+            logger.error(message)
+            metrics.inc('poll_errors_total')
+            usage['errors'] = 1
+            if state['prev_err'] != message:
+                outbox.put(tenant.chat_id, message, priority=PRIORITY_ALERT)
+                usage['messages'] += 1
+                state['prev_err'] = message
+        finally:
+            state['next_poll'] = now + retry_period
+            accounting.USAGE.record(
+                tenant.name, bytes=client.received,
+                cpu_seconds=time.thread_time() - started, **usage
+            )
+
+
+def _poll_unless_stopping(outbox, tenant, state, now, session, config,
+                          events):
+    if shutdown.SHUTDOWN.requested:
+        return
+    poll_tenant(outbox, tenant, state, now, session, config, events)
+
+
+def poll_due(outbox, tenants, states, now=None, slack=0,
+             workers=POLL_CONCURRENCY, session=None, config=None,
+             events=None):
+    """Параллельно опрашивает всех тенантов, у которых подошёл срок.
+
+    Возвращает словарь опрошенных состояний по именам тенантов: объекты
+    берутся до опроса, поэтому вытеснение из кэша их не теряет. После
+    запроса остановки новые опросы не начинаются, начатые доработают.
+    Потоков workers, а одновременных запросов к API не больше текущего
+    адаптивного предела practicum.LIMITER.
+    """
+    due = due_tenants(tenants, states, now, slack)
+    batch = {tenant.name: states[tenant.name] for tenant in due}
+    buffer = MessageBuffer()
+    if len(due) < 2 or workers < 2:
+        for tenant in due:
+            _poll_unless_stopping(buffer, tenant, batch[tenant.name], now,
+                                  session, config, events)
+        buffer.drain_to(outbox)
+        return batch
+    with ThreadPoolExecutor(min(workers, len(due))) as executor:
+        for tenant in due:
+            executor.submit(_poll_unless_stopping, buffer, tenant,
+                            batch[tenant.name], now, session, config,
+                            events)
+    buffer.drain_to(outbox)
+    return batch
+
+
+def prewarm_upcoming(tenants, states, interval, now=None,
+                     session=None, bot_session=None):
+    """Прогревает соединения, если до следующего пакета меньше шага.
+
+    Вызывается в конце шага планировщика: соединения открываются не
+    раньше чем за interval + PREWARM_LEAD секунд до опроса и не успевают
+    закрыться сервером по простою.
+    """
+    if now is None:
+        now = time.time()
+    horizon = now + interval + connections.PREWARM_LEAD
+    upcoming = sum(
+        1 for tenant in tenants
+        if tenant.name in states
+        and now < next_poll(states, tenant.name) <= horizon
+    )
+    if not upcoming:
+        return 0
+    count = min(upcoming, practicum.LIMITER.current)
+    opened = 0
+    if session is not None:
+        opened += connections.prewarm(session, homework.ENDPOINT, count)
+    if bot_session is not None:
+        opened += connections.prewarm(bot_session, connections.TELEGRAM_API)
+    return opened
+
+
+def _append_events(event_log, events):
+    try:
+        event_log.append(events)
+    except sqlite3.Error as error:
+        logger.error(f'Не удалось записать события в журнал: {error}')
+
+
+def run_tick(bot, store, tenants, states, fence=None, now=None, slack=0,
+             session=None, config=None, limiter=None, event_log=None,
+             bootstrap=None, preflight=None, ingest=None):
+    """Один шаг планировщика: опрос, сохранение состояния и отправка.
+
+    fence проверяет и продлевает право записи перед опросом, в
+    транзакции сохранения и перед каждой пачкой отправки. Сообщения шага
+    ставятся в outbox в одной транзакции с курсорами, поэтому процесс,
+    потерявший право записи, не оставляет новому ведущему ни сообщений,
+    ни повторного окна опроса.
+    События пишутся в event_log до сохранения курсоров: при сбое они
+    придут снова, а повторы журнал отбрасывает. С bootstrap новые тенанты
+    сначала загружают историю в фоне и только потом встают в опрос.
+    Результаты preflight применяются до опроса, поэтому тенанты в
+    карантине в него уже не попадают. События из ingest отправляются
+    до опроса, а опрошенные push-тенанты переносятся на срок сверки.
+    """
+    with tracing.span('tick'):
+        events = [] if event_log is not None else None
+        buffer = MessageBuffer()
+        if bootstrap is not None:
+            bootstrap.schedule(tenants, states)
+        checked = {}
+        if preflight is not None:
+            preflight.schedule(tenants)
+            checked = preflight.apply(states, buffer)
+        if ingest is not None:
+            ingest.update(tenants)
+            checked.update(ingest.apply(states, buffer, config, events))
+        if fence is not None:
+            fence()
+        polled = poll_due(buffer, tenants, states, now, slack,
+                          session=session, config=config, events=events)
+        if ingest is not None:
+            ingest.reschedule(polled, now)
+        polled.update(checked)
+        if bootstrap is not None:
+            polled.update(bootstrap.apply(states, buffer, config, events))
+        if events:
+            _append_events(event_log, events)
+        if polled or buffer.messages:
+            store.save(polled, fence, buffer.messages)
+        sender.flush_backlog(bot, store, fence, limiter=limiter)
+        accounting.USAGE.maybe_report()
+    return list(polled)
+
+
+def drain(bot, store, states, fence=None, deadline=None):
+    """Досылает очередь и сохраняет состояния перед остановкой."""
+    if deadline is None:
+        deadline = shutdown.SHUTDOWN.deadline or time.monotonic()
+    try:
+        sender.drain_outbox(bot, store, deadline, fence)
+        states.flush(fence)
+    except FencedError as error:
+        logger.warning(f'Остановка без досылки: {error}')
+        return
+    logger.info('Очередь дослана, состояние сохранено.')
@@ -0,0 +1,258 @@
+import json
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+import homework
+import metrics
+import tracing
+from adaptive import AdaptiveLimiter
+from exceptions import ApiAccessError
+from settings import env
+
+FETCH_CONCURRENCY = env('FETCH_CONCURRENCY', 8, int)
+
+Request = namedtuple('Request', ('url', 'headers', 'params', 'timeout'))
+
+
+def decode(response):
+    """Проверяет код ответа API и возвращает разобранное тело."""
+    if response.status_code != HTTPStatus.OK:
+        response.raise_for_status()
+        raise ApiAccessError(
+            f'Эндпойнт вернул код {response.status_code}.'
+        )
+    with tracing.span('json_decode'):
+        return response.json()
+
+
+class SyncBackend:
+    """Блокирующие запросы через requests.get или переданную сессию.
+
+    Без сессии requests.get берётся в момент запроса, поэтому его можно
+    подменить. Сбой сети превращается в ApiAccessError.
+    """
+
+    def __init__(self, session=None):
+        self.session = session
+
+    def send(self, request):
+        """Выполняет запрос и возвращает ответ."""
+        import requests
+
+        get = requests.get if self.session is None else self.session.get
+        try:
+            with tracing.span('http'):
+                return get(url=request.url, headers=request.headers,
+                           params=request.params, timeout=request.timeout)
+        except requests.exceptions.RequestException as err:
+            raise ApiAccessError(f'Эндпойнт недоступен: {err}')
+
+    def send_all(self, requests, send=None):
+        """Выполняет запросы по очереди.
+
+        send заменяет self.send, например обёрткой лимита. Возвращает
+        ответы или исключения в порядке запросов.
+        """
+        return [_attempt(send or self.send, request) for request in requests]
+
+
+class ConcurrentBackend(SyncBackend):
+    """Параллельные запросы через общий пул соединений процесса."""
+
+    def __init__(self, session=None, workers=FETCH_CONCURRENCY):
+        if session is None:
+            import connections
+
+            session = connections.get_session()
+        super().__init__(session)
+        self.workers = workers
+
+    def send_all(self, requests, send=None):
+        """Выполняет запросы параллельно в workers потоков.
+
+        send заменяет self.send, например обёрткой лимита. Возвращает
+        ответы или исключения в порядке запросов.
+        """
+        requests = list(requests)
+        if len(requests) < 2 or self.workers < 2:
+            return super().send_all(requests, send)
+        with ThreadPoolExecutor(min(self.workers, len(requests))) as pool:
+            return list(pool.map(
+                lambda request: _attempt(send or self.send, request),
+                requests
+            ))
+
+
+class MemoryResponse:
+    """Ответ стенда MemoryBackend."""
+
+    def __init__(self, status_code, data):
+        self.status_code = status_code
+        self.data = data
+
+    def json(self):
+        """Возвращает тело ответа."""
+        return self.data
+
+    @property
+    def content(self):
+        """Тело ответа в байтах, как его отдал бы API."""
+        return json.dumps(self.data, ensure_ascii=False).encode()
+
+    def raise_for_status(self):
+        """Выбрасывает HTTPError для кодов ошибок, как requests."""
+        if self.status_code >= HTTPStatus.BAD_REQUEST:
+            import requests
+
+            raise requests.HTTPError(f'{self.status_code} Error',
+                                     response=self)
+
+
+class MemoryBackend:
+    """API Практикума в памяти процесса, без ввода-вывода.
+
+    Отвечает по зарегистрированным токенам изменениями не старше
+    from_date, на неизвестный токен - 401. fail задаёт код ошибки для
+    токена.
+    """
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.homeworks = {}
+        self.errors = {}
+        self.calls = 0
+
+    def register(self, token, *homeworks):
+        """Регистрирует токен и добавляет его изменения."""
+        self.homeworks.setdefault(token, []).extend(homeworks)
+
+    def fail(self, token, status_code=None):
+        """Задаёт код ошибки для токена, None снимает ошибку."""
+        if status_code is None:
+            self.errors.pop(token, None)
+        else:
+            self.errors[token] = status_code
+
+    def send(self, request):
+        """Отвечает на запрос из памяти."""
+        self.calls += 1
+        token = request.headers['Authorization'].partition(' ')[2]
+        if token in self.errors or token not in self.homeworks:
+            return MemoryResponse(self.errors.get(
+                token, HTTPStatus.UNAUTHORIZED
+            ), {'code': 'not_authenticated'})
+        from_date = int(request.params['from_date'])
+        changes = [item for item in self.homeworks[token]
+                   if (metrics.homework_updated(item) or from_date)
+                   >= from_date]
+        return MemoryResponse(HTTPStatus.OK, {
+            'homeworks': changes, 'current_date': int(self.clock())
+        })
+
+    def send_all(self, requests, send=None):
+        """Отвечает на запросы по очереди."""
+        return [_attempt(send or self.send, request) for request in requests]
+
+
+def _attempt(send, request):
+    try:
+        return send(request)
+    except Exception as error:
+        return error
+
+
+def overloaded(response):
+    """Проверяет, говорит ли ответ о перегрузке API."""
+    return (response.status_code == HTTPStatus.TOO_MANY_REQUESTS
+            or response.status_code >= HTTPStatus.INTERNAL_SERVER_ERROR)
+
+
+BACKEND = SyncBackend()
+LIMITER = AdaptiveLimiter('practicum')
+
+
+def backend_for(session):
+    """Возвращает backend поверх сессии requests.
+
+    Готовый backend, например MemoryBackend, возвращается как есть, а
+    без сессии остаётся BACKEND модуля.
+    """
+    if session is None or hasattr(session, 'send_all'):
+        return session
+    return SyncBackend(session)
+
+
+class PracticumClient:
+    """Клиент API Практикум Домашка.
+
+    Владеет токеном, адресом, таймаутом и разбором ответа, а запросы
+    выполняет backend: SyncBackend, ConcurrentBackend или MemoryBackend.
+    Без backend берётся BACKEND модуля на момент запроса, поэтому его
+    можно подменить для всего процесса. Все запросы проходят через
+    адаптивный лимит одновременных запросов, по умолчанию общий LIMITER.
+    """
+
+    def __init__(self, token, backend=None, endpoint=homework.ENDPOINT,
+                 timeout=homework.REQUEST_TIMEOUT, limiter=None):
+        self.token = token
+        self._backend = backend
+        self._limiter = limiter
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self.received = 0
+
+    @property
+    def backend(self):
+        """Backend клиента или BACKEND модуля."""
+        return self._backend or BACKEND
+
+    @property
+    def limiter(self):
+        """Лимит клиента или LIMITER модуля."""
+        return self._limiter or LIMITER
+
+    def _send(self, request):
+        return self.limiter.call(self.backend.send, request,
+                                 overloaded=overloaded)
+
+    def request(self, from_date, token=None):
+        """Собирает запрос статусов с from_date."""
+        return Request(
+            self.endpoint,
+            {'Authorization': f'OAuth {token or self.token}'},
+            {'from_date': from_date}, self.timeout
+        )
+
+    def homework_statuses(self, from_date):
+        """Возвращает ответ API со статусами домашек начиная с from_date.
+
+        Размер тела ответа прибавляется к received.
+        """
+        metrics.inc('practicum_requests_total')
+        response = self._send(self.request(from_date))
+        self.received += len(getattr(response, 'content', None) or b'')
+        return decode(response)
+
+    def homework_statuses_many(self, queries):
+        """Запрашивает статусы по парам (token, from_date) одним вызовом.
+
+        ConcurrentBackend выполняет запросы параллельно. Возвращает
+        ответы или исключения в порядке запросов.
+        """
+        requests = [self.request(from_date, token)
+                    for token, from_date in queries]
+        metrics.inc('practicum_requests_total', len(requests))
+        return [result if isinstance(result, Exception)
+                else _attempt(decode, result)
+                for result in self.backend.send_all(requests, self._send)]
+
+
+def tenant_client(tenant, session=None, limiter=None):
+    """Возвращает клиент API для токена тенанта поверх session.
+
+    limiter отделяет фоновые запросы от общего LIMITER опроса.
+    """
+    return PracticumClient(tenant.token, backend_for(session),
+                           limiter=limiter)
@@ -0,0 +1,174 @@
+import logging
+import queue
+import threading
+import time
+
+import bootstrap
+import homework
+import metrics
+import practicum
+from adaptive import AdaptiveLimiter
+from settings import env
+from state import PRIORITY_ALERT
+
+logger = logging.getLogger(__name__)
+
+PREFLIGHT_INTERVAL = env('PREFLIGHT_INTERVAL', 3600, int)
+PREFLIGHT_WORKERS = env('PREFLIGHT_WORKERS', 8, int)
+QUARANTINE_PERIOD = env('QUARANTINE_PERIOD', 6 * 3600, int)
+QUARANTINE_MAX = env('QUARANTINE_MAX', 7 * 24 * 3600, int)
+QUARANTINED = 2 ** 52
+PRACTICUM_FATAL = (401, 403)
+TELEGRAM_FATAL = (400, 403)
+
+
+def error_code(error):
+    """Возвращает HTTP-код ошибки requests или Telegram, если он есть."""
+    code = getattr(error, 'error_code', None)
+    if code is None:
+        code = getattr(getattr(error, 'response', None), 'status_code', None)
+    return code
+
+
+def quarantine_period(strikes, base=QUARANTINE_PERIOD, limit=QUARANTINE_MAX):
+    """Возвращает срок карантина, удваивая его с каждой неудачей."""
+    return min(base * 2 ** max(0, strikes - 1), limit)
+
+
+class Preflight:
+    """Фоновая проверка токенов Практикума и чатов всех тенантов.
+
+    Проверки идут в отдельных потоках, результат кэшируется на interval
+    секунд. Тенант, чей токен отклонён (401/403) или чат недоступен
+    (чат не найден, бот заблокирован), уходит в карантин: планировщик его
+    не опрашивает, а повторная проверка откладывается с удвоением срока.
+    Временные сбои сети карантином не считаются. Отказ Telegram с кодом
+    401 означает неверный токен самого бота и тоже не наказывает тенантов.
+    Пробные запросы идут через свой адаптивный предел, а не через
+    practicum.LIMITER.
+    """
+
+    def __init__(self, bot, session=None, interval=PREFLIGHT_INTERVAL,
+                 workers=PREFLIGHT_WORKERS, clock=time.time):
+        self.bot = bot
+        self.session = session
+        self.interval = interval
+        self.workers = workers
+        self.clock = clock
+        self.concurrency = AdaptiveLimiter('preflight', initial=workers,
+                                           maximum=workers)
+        self.checked = {}
+        self._submitted = set()
+        self._tasks = queue.Queue()
+        self._results = queue.Queue()
+        self._threads = []
+
+    def start(self):
+        """Запускает потоки проверки."""
+        if self.session is None:
+            import requests
+
+            self.session = requests.Session()
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._run,
+                                      name=f'preflight-{index}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _expires(self, name):
+        checked_at, problem, strikes = self.checked[name]
+        if problem is None:
+            return checked_at + self.interval
+        return checked_at + quarantine_period(strikes)
+
+    def schedule(self, tenants, now=None):
+        """Ставит в проверку новых тенантов и тех, чей результат устарел."""
+        if now is None:
+            now = self.clock()
+        if len(self.checked) > len(tenants):
+            names = {tenant.name for tenant in tenants}
+            self.checked = {name: result for name, result
+                            in self.checked.items() if name in names}
+        for tenant in tenants:
+            if tenant.name in self._submitted:
+                continue
+            if tenant.name in self.checked and self._expires(
+                    tenant.name) > now:
+                continue
+            self._submitted.add(tenant.name)
+            self._tasks.put(tenant)
+        metrics.set_gauge('preflight_queue', self._tasks.qsize())
+
+    def check(self, tenant):
+        """Проверяет тенанта и возвращает неустранимую проблему или None."""
+        try:
+            practicum.tenant_client(
+                tenant, self.session, self.concurrency
+            ).homework_statuses(int(self.clock()))
+        except Exception as error:
+            if error_code(error) in PRACTICUM_FATAL:
+                return f'токен Практикума отклонён ({error_code(error)})'
+            logger.warning(f'Проверка {tenant.name} отложена: {error}')
+            return None
+        try:
+            self.bot.get_chat(tenant.chat_id)
+        except Exception as error:
+            if error_code(error) in TELEGRAM_FATAL:
+                return f'чат {tenant.chat_id} недоступен: {error}'
+            logger.warning(f'Проверка {tenant.name} отложена: {error}')
+        return None
+
+    def check_tenant(self, tenant):
+        """Проверяет тенанта и кладёт результат в очередь результатов."""
+        self._results.put((tenant, self.check(tenant), self.clock()))
+        metrics.inc('preflight_checks_total')
+
+    def _run(self):
+        while True:
+            self.check_tenant(self._tasks.get())
+
+    def apply(self, states, outbox):
+        """Переносит результаты проверок в состояния тенантов.
+
+        Тенант в карантине получает срок опроса QUARANTINED, вышедший из
+        карантина сразу встаёт в опрос. Администратору уходит
+        предупреждение о каждом новом карантине. Возвращает словарь
+        изменённых состояний для сохранения.
+        """
+        changed = {}
+        while True:
+            try:
+                tenant, problem, checked_at = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self._submitted.discard(tenant.name)
+            strikes = self.checked.get(tenant.name, (0, None, 0))[2]
+            strikes = strikes + 1 if problem is not None else 0
+            self.checked[tenant.name] = (checked_at, problem, strikes)
+            if tenant.name in states and self._settle(
+                    states[tenant.name], tenant, problem, outbox):
+                changed[tenant.name] = states[tenant.name]
+        metrics.set_gauge('quarantined_tenants', sum(
+            1 for _, problem, _ in self.checked.values() if problem
+        ))
+        return changed
+
+    def _settle(self, state, tenant, problem, outbox):
+        if problem is None:
+            if 'quarantine' not in state:
+                return False
+            del state['quarantine']
+            state['next_poll'] = (bootstrap.PENDING if state.get('bootstrap')
+                                  else 0)
+            logger.info(f'Тенант {tenant.name} вышел из карантина.')
+            return True
+        if state.get('quarantine') != problem:
+            logger.warning(f'Тенант {tenant.name} в карантине: {problem}')
+            metrics.inc('quarantined_total')
+            if homework.TELEGRAM_CHAT_ID:
+                outbox.put(homework.TELEGRAM_CHAT_ID,
+                           f'Тенант {tenant.name} в карантине: {problem}',
+                           priority=PRIORITY_ALERT)
+        state['quarantine'] = problem
+        state['next_poll'] = QUARANTINED
+        return True
@@ -0,0 +1,231 @@
+import hmac
+import json
+import logging
+import queue
+import threading
+import time
+from http import HTTPStatus
+
+import accounting
+import cursor
+import homework
+import log_config
+import metrics
+import poller
+from settings import env
+
+logger = logging.getLogger(__name__)
+
+PUSH_HOST = env('PUSH_HOST', '127.0.0.1')
+PUSH_PORT = env('PUSH_PORT', None, int)
+PUSH_TOKEN = env('PUSH_TOKEN', None)
+PUSH_RECONCILE_PERIOD = env('PUSH_RECONCILE_PERIOD', 3600, int)
+PUSH_QUEUE_SIZE = env('PUSH_QUEUE_SIZE', 1000, int)
+PUSH_MAX_BYTES = env('PUSH_MAX_BYTES', 65536, int)
+
+
+def validate(payload, now=None):
+    """Проверяет присланные события и возвращает (homeworks, current_date).
+
+    Принимается ответ API целиком, список домашек или одна домашка в
+    формате элементов homeworks. Без current_date берётся время приёма.
+    Домашка без корректного date_updated отклоняется: ключ повтора без
+    даты не совпал бы с ключом той же домашки из ответа сверки.
+    """
+    if isinstance(payload, dict) and 'homeworks' not in payload:
+        payload = [payload]
+    if isinstance(payload, list):
+        payload = {'homeworks': payload}
+    if isinstance(payload, dict) and 'current_date' not in payload:
+        payload = dict(payload, current_date=int(
+            time.time() if now is None else now
+        ))
+    homeworks = homework.check_response(payload)
+    if not isinstance(payload['current_date'], (int, float)):
+        raise TypeError('current_date не число.')
+    for item in homeworks:
+        if not isinstance(item, dict):
+            raise TypeError('Домашка не в формате словаря.')
+        homework.parse_status(item)
+        if metrics.homework_updated(item) is None:
+            raise ValueError('Нет корректного date_updated.')
+    return homeworks, payload['current_date']
+
+
+class Ingest:
+    """Приём статусов домашек, которые присылает внешний ретранслятор.
+
+    HTTP-поток проверяет события и кладёт их в ограниченную очередь, а
+    планировщик в начале шага пропускает их через тот же отсев повторов
+    курсора и ту же отправку, что и опрос. Тенанты с push опрашиваются
+    раз в reconcile секунд: сверка подбирает пропущенные события.
+    """
+
+    def __init__(self, token=PUSH_TOKEN, reconcile=PUSH_RECONCILE_PERIOD,
+                 size=PUSH_QUEUE_SIZE):
+        self.token = token
+        self.reconcile = reconcile
+        self.tenants = {}
+        self.server = None
+        self._events = queue.Queue(size)
+
+    def update(self, tenants):
+        """Запоминает тенантов, для которых включён приём push."""
+        self.tenants = {tenant.name: tenant for tenant in tenants
+                        if tenant.push}
+
+    def authorized(self, header):
+        """Проверяет заголовок Authorization, если задан токен."""
+        if self.token is None:
+            return True
+        return hmac.compare_digest(header or '', f'Bearer {self.token}')
+
+    def submit(self, name, payload):
+        """Проверяет события тенанта и ставит их в очередь.
+
+        Возвращает HTTP-статус ответа ретранслятору.
+        """
+        if name not in self.tenants:
+            return HTTPStatus.NOT_FOUND
+        try:
+            homeworks, current_date = validate(payload)
+        except (KeyError, TypeError, ValueError) as error:
+            logger.warning(f'Отклонены события тенанта {name}: {error}')
+            return HTTPStatus.BAD_REQUEST
+        try:
+            self._events.put_nowait((name, homeworks, current_date))
+        except queue.Full:
+            return HTTPStatus.SERVICE_UNAVAILABLE
+        metrics.set_gauge('push_queue', self._events.qsize())
+        return HTTPStatus.ACCEPTED
+
+    def apply(self, states, outbox, config=None, events=None):
+        """Отправляет новые статусы из очереди и отмечает их в курсорах.
+
+        Курсор запоминает ключи изменений, но не сдвигается: окно сверки
+        по-прежнему покрывает время с последнего опроса. События тенантов
+        без готового состояния (загрузка истории, карантин) отбрасываются.
+        Возвращает словарь изменённых состояний для сохранения.
+        """
+        verdicts = (homework.HOMEWORK_VERDICTS if config is None
+                    else config.verdicts)
+        changed = {}
+        while True:
+            try:
+                name, homeworks, current_date = self._events.get_nowait()
+            except queue.Empty:
+                break
+            tenant = self.tenants.get(name)
+            if tenant is None or name not in states:
+                continue
+            state = states[name]
+            if state.get('bootstrap') or state.get('quarantine'):
+                continue
+            with log_config.tenant_context(name):
+                position = cursor.Cursor.load(state)
+                fresh = position.fresh(homeworks)
+                queued = poller.notify(outbox, tenant, fresh, current_date,
+                                       verdicts, events)
+                position.advance(None, fresh)
+                position.dump(state)
+            metrics.inc('push_events_total', len(fresh))
+            accounting.USAGE.record(name, messages=queued)
+            changed[name] = state
+        metrics.set_gauge('push_queue', self._events.qsize())
+        return changed
+
+    def close(self):
+        """Останавливает HTTP-приём и освобождает порт."""
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def reschedule(self, polled, now=None):
+        """Переносит следующий опрос push-тенантов на срок сверки."""
+        if now is None:
+            now = time.time()
+        for name, state in polled.items():
+            if name in self.tenants:
+                state['next_poll'] = now + self.reconcile
+
+
+def serve_push(ingest, host=PUSH_HOST, port=PUSH_PORT,
+               max_bytes=PUSH_MAX_BYTES):
+    """Запускает HTTP-приём событий POST /push/<тенант>.
+
+    http.server импортируется здесь, чтобы не замедлять старт бота.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class PushHandler(BaseHTTPRequestHandler):
+        """Принимает события домашек от ретранслятора."""
+
+        def do_POST(self):
+            """Проверяет запрос и отдаёт его события в Ingest."""
+            status = self.handle_push()
+            metrics.inc(f'push_requests_total{{code="{status.value}"}}')
+            self.send_response(status)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def handle_push(self):
+            """Возвращает HTTP-статус для запроса."""
+            prefix, _, name = self.path.partition('/push/')
+            if prefix or not name:
+                return HTTPStatus.NOT_FOUND
+            if not ingest.authorized(self.headers.get('Authorization')):
+                return HTTPStatus.UNAUTHORIZED
+            try:
+                length = int(self.headers.get('Content-Length') or 0)
+                if length > max_bytes:
+                    return HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+                payload = json.loads(self.rfile.read(length))
+            except ValueError:
+                return HTTPStatus.BAD_REQUEST
+            return ingest.submit(name, payload)
+
+        def log_message(self, format, *args):
+            """Не пишет каждый запрос в лог."""
+
+    server = ThreadingHTTPServer((host, port), PushHandler)
+    threading.Thread(target=server.serve_forever, name='push',
+                     daemon=True).start()
+    logger.info(f'Приём push-событий на http://{host}:{port}/push/')
+    return server
+
+
+def start_push(tenants=(), port=PUSH_PORT, host=PUSH_HOST):
+    """Запускает приём push, если задан порт, и возвращает Ingest.
+
+    tenants - тенанты текущей конфигурации: события принимаются сразу,
+    не дожидаясь первого шага планировщика. Если порт занят, бот
+    продолжает работать только на опросе.
+    """
+    if port is None:
+        return None
+    ingest = Ingest()
+    ingest.update(tenants)
+    try:
+        ingest.server = serve_push(ingest, host, port)
+    except OSError as error:
+        logger.error(f'Не удалось запустить приём push: {error}')
+        return None
+    return ingest
+
+
+def follow_leader(ingest, leader, tenants=(), port=PUSH_PORT,
+                  host=PUSH_HOST):
+    """Держит приём push открытым только у ведущего и возвращает Ingest.
+
+    Резерв не применяет события, поэтому не должен отвечать на них 202.
+    Ведущий, которому не удалось занять порт, пробует снова на следующем
+    шаге: порт может ещё держать бывший ведущий на том же хосте.
+    """
+    if leader and ingest is None:
+        return start_push(tenants, port, host)
+    if not leader and ingest is not None:
+        ingest.close()
+        logger.info('Приём push остановлен: процесс больше не ведущий.')
+        return None
+    return ingest
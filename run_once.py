@@ -0,0 +1,66 @@
+import logging
+import sys
+import time
+
+from settings import env
+
+logger = logging.getLogger(__name__)
+
+STARTUP_BUDGET = env('STARTUP_BUDGET', 2, float)
+ONCE_SLACK = env('ONCE_SLACK', 60, int)
+
+
+def run_once(started=None):
+    """Опрашивает всех тенантов с подошедшим сроком и завершается.
+
+    Состояние загружается из StateStore и сохраняется обратно, поэтому
+    запуски по cron продолжают с того же курсора, что и постоянный воркер.
+    Тяжёлые модули импортируются внутри, чтобы время старта учитывалось.
+    """
+    if started is None:
+        started = time.monotonic()
+    import connections
+    import events
+    import homework
+    import live_config
+    import metrics
+    import poller
+    import sender
+    import shutdown
+    import transport
+    from state import StateStore, TieredStates
+
+    if not homework.check_tokens():
+        logger.critical('Отсутствует переменная окружения.')
+        sys.exit(1)
+    store = StateStore()
+    config = live_config.load_config()
+    states = TieredStates(store)
+    bot = transport.TelegramTransport(homework.TELEGRAM_TOKEN)
+    startup = time.monotonic() - started
+    metrics.set_gauge('startup_seconds', round(startup, 3))
+    if startup > STARTUP_BUDGET:
+        logger.warning(f'Старт занял {startup:.2f} с при бюджете '
+                       f'{STARTUP_BUDGET} с.')
+    polled = poller.run_tick(bot, store, config.tenants, states,
+                             slack=ONCE_SLACK,
+                             session=connections.get_session(),
+                             config=config, limiter=sender.LIMITER,
+                             event_log=events.EventLog())
+    deadline = (shutdown.SHUTDOWN.deadline
+                or time.monotonic() + shutdown.DRAIN_DEADLINE)
+    sender.drain_outbox(bot, store, deadline)
+    logger.info(f'Опрошено тенантов: {len(polled)}.')
+    metrics.export()
+    return polled
+
+
+if __name__ == '__main__':
+    started = time.monotonic()
+    import log_config
+
+    log_config.setup_logging()
+    import shutdown
+
+    shutdown.SHUTDOWN.install()
+    run_once(started)
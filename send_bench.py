@@ -0,0 +1,153 @@
+import argparse
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from settings import env
+
+SEND_BENCH_MESSAGES = env('SEND_BENCH_MESSAGES', 2000, int)
+SEND_BENCH_LATENCY_MS = env('SEND_BENCH_LATENCY_MS', 20, float)
+
+
+class StubTelegram(ThreadingHTTPServer):
+    """Заглушка Telegram Bot API с заданной задержкой ответа.
+
+    Отвечает на sendMessage как настоящий API и держит соединения
+    открытыми, чтобы сравнение учитывало пул соединений клиента.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, latency=SEND_BENCH_LATENCY_MS / 1000,
+                 address=('127.0.0.1', 0)):
+        self.latency = latency
+        self.received = []
+        self.connections = 0
+        self._lock = threading.Lock()
+        super().__init__(address, StubHandler)
+
+    @property
+    def base_url(self):
+        """Адрес API заглушки для клиентов."""
+        return f'http://127.0.0.1:{self.server_port}/'
+
+    def start(self):
+        """Запускает заглушку в фоновом потоке."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Обработчик запросов заглушки."""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        """Считает новые соединения."""
+        super().setup()
+        with self.server._lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        """Отвечает на sendMessage."""
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        content_type = self.headers.get('Content-Type', '')
+        if content_type.startswith('application/json'):
+            payload = json.loads(body)
+        else:
+            from urllib.parse import parse_qsl
+
+            payload = dict(parse_qsl(body.decode()))
+        with self.server._lock:
+            self.server.received.append(payload)
+            message_id = len(self.server.received)
+        time.sleep(self.server.latency)
+        answer = json.dumps({'ok': True, 'result': {
+            'message_id': message_id, 'date': int(time.time()),
+            'chat': {'id': payload.get('chat_id'), 'type': 'private'},
+            'text': payload.get('text'),
+        }}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(answer)))
+        self.end_headers()
+        self.wfile.write(answer)
+
+    def log_message(self, format, *args):
+        """Не пишет запросы в лог."""
+
+
+def percentile(samples, quantile):
+    """Возвращает перцентиль по методу ближайшего ранга."""
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    return ordered[max(0, -(-len(ordered) * quantile // 100) - 1)]
+
+
+def bench(bot, messages, concurrency, batch=100):
+    """Отправляет сообщения в разные чаты и возвращает (сообщений/с, p99).
+
+    Как и flush_outbox, сообщения уходят пачками по batch, каждая через
+    новый пул потоков. p99 - задержка одного sendMessage в секундах.
+    """
+    def send(index):
+        started = time.perf_counter()
+        bot.send_message(index, f'Сообщение {index}')
+        return time.perf_counter() - started
+
+    latencies = []
+    started = time.perf_counter()
+    for first in range(0, messages, batch):
+        with ThreadPoolExecutor(concurrency) as executor:
+            latencies.extend(executor.map(
+                send, range(first, min(first + batch, messages))
+            ))
+    elapsed = time.perf_counter() - started
+    return messages / elapsed, percentile(latencies, 99)
+
+
+def make_client(name, base_url):
+    """Создаёт транспорт или TeleBot, направленные на заглушку."""
+    if name == 'telebot':
+        from telebot import TeleBot, apihelper
+
+        apihelper.API_URL = base_url + 'bot{0}/{1}'
+        return TeleBot(token='0:bench', threaded=False)
+    from transport import TelegramTransport
+
+    return TelegramTransport('0:bench', base_url=base_url)
+
+
+def main(argv=None):
+    """Сравнивает клиентов Telegram на заглушке API."""
+    parser = argparse.ArgumentParser(
+        description='Пропускная способность отправки в Telegram.'
+    )
+    parser.add_argument('--messages', type=int, default=SEND_BENCH_MESSAGES)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--latency-ms', type=float,
+                        default=SEND_BENCH_LATENCY_MS)
+    parser.add_argument('--client', action='append',
+                        choices=('transport', 'telebot'))
+    args = parser.parse_args(argv)
+    for name in args.client or ('transport', 'telebot'):
+        server = StubTelegram(args.latency_ms / 1000).start()
+        try:
+            rate, p99 = bench(make_client(name, server.base_url),
+                              args.messages, args.concurrency)
+        finally:
+            server.shutdown()
+            server.server_close()
+        print(f'{name:10} {rate:8.0f} сообщений/с  p99 {p99 * 1000:6.1f} мс'
+              f'  соединений {server.connections}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
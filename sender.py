@@ -0,0 +1,272 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import homework
+import metrics
+import shutdown
+from exceptions import TelegramApiError
+from settings import env
+from state import PRIORITIES, PRIORITY_ALERT, PRIORITY_STATUS
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_MAX_ATTEMPTS = env('OUTBOX_MAX_ATTEMPTS', 5, int)
+TELEGRAM_RATE = env('TELEGRAM_RATE', 25, float)
+TELEGRAM_CHAT_INTERVAL = env('TELEGRAM_CHAT_INTERVAL', 1, float)
+SEND_CONCURRENCY = env('SEND_CONCURRENCY', 8, int)
+FLUSH_BUDGET = env('FLUSH_BUDGET', 20, float)
+RATE_LIMIT_CHATS = 10000
+OUTBOX_HIGH_WATER = env('OUTBOX_HIGH_WATER', 500, int)
+SHED_ACTIONS = ('drop', 'summarize')
+TELEGRAM_PERMANENT = (400, 403)
+DEFERRED = 'deferred'
+
+
+def parse_shed_policy(value):
+    """Разбирает политику сброса вида 'alert=summarize,info=drop'.
+
+    Статусы домашек не сбрасываются никогда.
+    """
+    policy = {}
+    for item in filter(None, value.replace(' ', '').split(',')):
+        name, _, action = item.partition('=')
+        if name not in PRIORITIES or action not in SHED_ACTIONS:
+            raise ValueError(f'Неверная политика сброса: {item}')
+        if PRIORITIES[name] == PRIORITY_STATUS:
+            raise ValueError('Статусы домашек нельзя сбрасывать.')
+        policy[PRIORITIES[name]] = action
+    return policy
+
+
+SHED_POLICY = parse_shed_policy(
+    env('SHED_POLICY', 'alert=summarize,info=drop')
+)
+PRIORITY_NAMES = {priority: name for name, priority in PRIORITIES.items()}
+
+
+class RateLimiter:
+    """Темп отправки в пределах лимитов Telegram.
+
+    Ограничивает общее число сообщений в секунду и интервал между
+    сообщениями в один чат.
+    """
+
+    def __init__(self, rate=TELEGRAM_RATE,
+                 chat_interval=TELEGRAM_CHAT_INTERVAL, clock=time.monotonic,
+                 sleep=time.sleep):
+        self.interval = 1 / rate
+        self.chat_interval = chat_interval
+        self.clock = clock
+        self.sleep = sleep
+        self._next = 0
+        self._next_chat = {}
+        self._lock = threading.Lock()
+
+    def wait(self, chat_id, deadline=None):
+        """Ждёт очереди на отправку в чат.
+
+        Возвращает False без ожидания, если очередь наступит позже
+        deadline по часам time.monotonic.
+        """
+        with self._lock:
+            now = self.clock()
+            ready = max(now, self._next, self._next_chat.get(chat_id, 0))
+            if deadline is not None and ready > deadline:
+                return False
+            self._next = ready + self.interval
+            if len(self._next_chat) >= RATE_LIMIT_CHATS:
+                self._next_chat = {chat: moment for chat, moment
+                                   in self._next_chat.items() if moment > now}
+            self._next_chat[chat_id] = ready + self.chat_interval
+        if ready > now:
+            metrics.inc('send_throttled_total')
+            self.sleep(ready - now)
+        return True
+
+    def pause(self, seconds):
+        """Откладывает все отправки на seconds, например по retry_after."""
+        with self._lock:
+            self._next = max(self._next, self.clock() + seconds)
+        metrics.inc('send_paused_total')
+
+
+LIMITER = RateLimiter()
+
+
+def shed_overload(store, high_water=OUTBOX_HIGH_WATER, policy=SHED_POLICY):
+    """Разгружает переполненную очередь за счёт низких приоритетов.
+
+    Начинает с самого низкого приоритета и останавливается, как только
+    очередь опустилась до high_water. Возвращает число удалённых
+    сообщений.
+    """
+    backlog = store.backlog()
+    total = sum(backlog.values())
+    for priority, count in backlog.items():
+        metrics.set_gauge(
+            f'outbox_backlog{{priority="{PRIORITY_NAMES[priority]}"}}', count
+        )
+    shed = 0
+    for priority in sorted(policy, reverse=True):
+        if total - shed <= high_water:
+            break
+        if policy[priority] == 'drop':
+            removed = store.drop(priority)
+        else:
+            removed = store.summarize(priority)
+        metrics.inc(f'outbox_shed_total{{priority='
+                    f'"{PRIORITY_NAMES[priority]}"}}', removed)
+        shed += removed
+    if shed:
+        logger.warning(f'Очередь переполнена ({total} сообщений), '
+                       f'сброшено {shed} сообщений низкого приоритета.')
+    return shed
+
+
+def _batches(pending, size):
+    """Делит очередь на пачки, в каждой не больше одного сообщения в чат.
+
+    Так параллельная отправка не меняет порядок сообщений внутри чата.
+    """
+    while pending:
+        batch, rest, busy = [], [], set()
+        for message in pending:
+            chat_id = message[1]
+            if len(batch) < size and chat_id not in busy:
+                batch.append(message)
+            else:
+                rest.append(message)
+            busy.add(chat_id)
+        yield batch
+        pending = rest
+
+
+def permanent(error):
+    """Проверяет, что повтор отправки не поможет.
+
+    Отказы Telegram 429, 5xx и сбои сети временные, постоянны только
+    400 и 403. Прочие исключения бота считаются постоянными.
+    """
+    if isinstance(error, TelegramApiError):
+        return error.error_code in TELEGRAM_PERMANENT
+    return True
+
+
+def _deliver(bot, message, limiter, deadline):
+    """Отправляет сообщение из очереди.
+
+    Возвращает True, False при постоянном отказе, DEFERRED при временном
+    и None, если отправка не начиналась. retry_after из ответа Telegram
+    приостанавливает весь limiter.
+    """
+    if deadline is not None and time.monotonic() >= deadline:
+        return None
+    if limiter is not None and not limiter.wait(message[1], deadline):
+        return None
+    try:
+        bot.send_message(message[1], message[2])
+    except Exception as error:
+        logger.error(f'Ошибка с отправкой сообщения: {error}')
+        retry_after = getattr(error, 'retry_after', None)
+        if retry_after and limiter is not None:
+            limiter.pause(retry_after)
+        if permanent(error):
+            return False
+        metrics.inc('outbox_deferred_total')
+        return DEFERRED
+    return True
+
+
+def _settle(store, message, delivered):
+    message_id, chat_id, _, updated, attempts = message
+    if delivered == DEFERRED:
+        return
+    if delivered:
+        store.ack(message_id)
+        if updated is None:
+            return
+        alert = metrics.NOTIFY_LATENCY.observe(time.time() - updated)
+        if alert and homework.TELEGRAM_CHAT_ID:
+            store.put(homework.TELEGRAM_CHAT_ID, alert,
+                      priority=PRIORITY_ALERT)
+    elif attempts + 1 >= OUTBOX_MAX_ATTEMPTS:
+        logger.error(f'Сообщение в чат {chat_id} удалено после '
+                     f'{OUTBOX_MAX_ATTEMPTS} неудачных попыток.')
+        store.ack(message_id)
+        metrics.inc('outbox_dropped_total')
+    else:
+        store.retry(message_id)
+
+
+def flush_outbox(bot, store, fence=None, limit=100, limiter=None,
+                 deadline=None, workers=SEND_CONCURRENCY):
+    """Отправляет сообщения из очереди и возвращает число отправленных.
+
+    Сообщения уходят по приоритету пачками по workers параллельно,
+    очередь в базе обновляется из вызывающего потока. Перед каждой
+    пачкой вызывается fence, чтобы процесс, потерявший лидерство, не
+    отправлял сообщения параллельно с новым лидером. limiter задаёт темп
+    отправки, deadline прекращает её досрочно. Временный отказ Telegram
+    не считается попыткой и прекращает отправку до следующего вызова.
+    """
+    shed_overload(store)
+    sent = 0
+    with ThreadPoolExecutor(workers) as executor:
+        for batch in _batches(store.pending(limit), workers):
+            if fence is not None:
+                fence()
+            results = list(executor.map(
+                lambda message: _deliver(bot, message, limiter, deadline),
+                batch
+            ))
+            for message, delivered in zip(batch, results):
+                if delivered is not None:
+                    _settle(store, message, delivered)
+                    sent += delivered is True
+            if None in results or DEFERRED in results:
+                break
+    metrics.inc('outbox_sent_total', sent)
+    return sent
+
+
+def flush_backlog(bot, store, fence=None, limiter=None, budget=FLUSH_BUDGET):
+    """Отправляет очередь пачками, пока она не опустеет.
+
+    Отправка прекращается через budget секунд, а после запроса остановки
+    не позже её дедлайна. Рассылка на тысячу подписчиков уходит за один
+    шаг планировщика в темпе limiter, а не по сотне сообщений за шаг.
+    Возвращает число отправленных сообщений.
+    """
+    deadline = time.monotonic() + budget
+    if shutdown.SHUTDOWN.requested:
+        deadline = min(deadline, shutdown.SHUTDOWN.deadline)
+    sent = 0
+    while time.monotonic() < deadline:
+        flushed = flush_outbox(bot, store, fence, limiter=limiter,
+                               deadline=deadline)
+        if not flushed:
+            break
+        sent += flushed
+    return sent
+
+
+def drain_outbox(bot, store, deadline, fence=None, limiter=LIMITER):
+    """Досылает очередь перед остановкой, пока не истёк deadline.
+
+    Возвращает число отправленных сообщений. Неотправленное остаётся
+    в очереди и уйдёт после перезапуска.
+    """
+    sent = 0
+    while time.monotonic() < deadline:
+        flushed = flush_outbox(bot, store, fence, limiter=limiter,
+                               deadline=deadline)
+        if not flushed:
+            break
+        sent += flushed
+    left = len(store.pending())
+    if left:
+        logger.warning(f'Не досланы до остановки {left} сообщений, '
+                       f'они уйдут после перезапуска.')
+    return sent
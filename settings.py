@@ -0,0 +1,42 @@
+import os
+from collections import namedtuple
+from functools import lru_cache
+
+ENV_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
+
+Settings = namedtuple(
+    'Settings', ('practicum_token', 'telegram_token', 'telegram_chat_id')
+)
+
+
+@lru_cache(maxsize=None)
+def load_env(path=ENV_FILE):
+    """Один раз загружает переменные из .env.
+
+    python-dotenv импортируется, только если файл .env существует, поэтому
+    на сервере с настоящими переменными окружения старт ничего не платит.
+    """
+    if not os.path.exists(path):
+        return False
+    from dotenv import load_dotenv
+
+    return load_dotenv(path)
+
+
+def env(name, default=None, cast=str):
+    """Возвращает настройку из окружения с приведением типа."""
+    load_env()
+    value = os.getenv(name)
+    if value is None or value == '':
+        return default
+    return cast(value)
+
+
+@lru_cache(maxsize=None)
+def get_settings():
+    """Разбирает обязательные настройки бота в неизменяемый объект."""
+    return Settings(
+        practicum_token=env('PRACTICUM_TOKEN'),
+        telegram_token=env('TELEGRAM_TOKEN'),
+        telegram_chat_id=env('TELEGRAM_CHAT_ID'),
+    )
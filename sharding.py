@@ -0,0 +1,331 @@
+import argparse
+import bisect
+import functools
+import hashlib
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import time
+
+import bootstrap
+import connections
+import events
+import heartbeat
+import homework
+import live_config
+import log_config
+import metrics
+import poller
+import preflight
+import sender
+import shutdown
+import tracing
+import transport
+from exceptions import FencedError
+from settings import env
+from state import StateStore, TieredStates, connect, transaction
+
+logger = logging.getLogger(__name__)
+
+COORD_DB = env('COORD_DB', 'coordination.sqlite3')
+LEASE_TTL = env('LEASE_TTL', 30, int)
+HEARTBEAT_INTERVAL = env('HEARTBEAT_INTERVAL', 10, int)
+RING_REPLICAS = 100
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id TEXT PRIMARY KEY,
+    expires REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tenant_leases (
+    tenant TEXT PRIMARY KEY,
+    worker_id TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+"""
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], 'big')
+
+
+class HashRing:
+    """Консистентное хеширование тенантов по воркерам.
+
+    При уходе воркера переезжают только его тенанты.
+    """
+
+    def __init__(self, nodes, replicas=RING_REPLICAS):
+        points = sorted(
+            (_hash(f'{node}#{index}'), node)
+            for node in nodes for index in range(replicas)
+        )
+        self._keys = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def owner(self, key):
+        """Возвращает воркера, которому принадлежит ключ."""
+        if not self._keys:
+            return None
+        index = bisect.bisect(self._keys, _hash(key)) % len(self._keys)
+        return self._nodes[index]
+
+
+class LeaseRegistry:
+    """Аренда воркеров и тенантов в общем файле SQLite."""
+
+    def __init__(self, worker_id, path=COORD_DB, ttl=LEASE_TTL):
+        self.worker_id = worker_id
+        self.ttl = ttl
+        self.renewed = None
+        self.connection = connect(path, timeout=ttl)
+        self.connection.executescript(SCHEMA)
+
+    def heartbeat(self, now=None):
+        """Продлевает аренду воркера и возвращает живых воркеров."""
+        if now is None:
+            now = time.time()
+        with transaction(self.connection):
+            self.connection.execute(
+                'INSERT OR REPLACE INTO workers VALUES (?, ?)',
+                (self.worker_id, now + self.ttl)
+            )
+            self.connection.execute(
+                'DELETE FROM workers WHERE expires < ?', (now,)
+            )
+        rows = self.connection.execute('SELECT worker_id FROM workers')
+        return sorted(worker_id for worker_id, in rows)
+
+    def claim(self, tenant_names, now=None):
+        """Захватывает аренду тенантов и возвращает удержанные.
+
+        Чужая аренда перехватывается только после её истечения, поэтому
+        два воркера не опрашивают одного тенанта одновременно.
+        """
+        if now is None:
+            now = time.time()
+        with transaction(self.connection):
+            self.connection.executemany(
+                'INSERT INTO tenant_leases VALUES (?, ?, ?) '
+                'ON CONFLICT(tenant) DO UPDATE SET '
+                'worker_id = excluded.worker_id, expires = excluded.expires '
+                'WHERE tenant_leases.worker_id = excluded.worker_id '
+                'OR tenant_leases.expires < ?',
+                [(name, self.worker_id, now + self.ttl, now)
+                 for name in tenant_names]
+            )
+            held = {name for name, in self.connection.execute(
+                'SELECT tenant FROM tenant_leases WHERE worker_id = ?',
+                (self.worker_id,)
+            )}
+            released = held - set(tenant_names)
+            self.connection.executemany(
+                'DELETE FROM tenant_leases WHERE tenant = ? '
+                'AND worker_id = ?',
+                [(name, self.worker_id) for name in released]
+            )
+        self.renewed = now
+        return held - released
+
+    def renew(self, tenant_names, now=None):
+        """Продлевает аренду воркера и его тенантов.
+
+        Годится как fence для run_tick: выбрасывает FencedError, если
+        аренда хотя бы одного тенанта истекла или перешла другому воркеру.
+        """
+        if now is None:
+            now = time.time()
+        with transaction(self.connection):
+            self.connection.execute(
+                'INSERT OR REPLACE INTO workers VALUES (?, ?)',
+                (self.worker_id, now + self.ttl)
+            )
+            renewed = self.connection.executemany(
+                'UPDATE tenant_leases SET expires = ? WHERE tenant = ? '
+                'AND worker_id = ? AND expires >= ?',
+                [(now + self.ttl, name, self.worker_id, now)
+                 for name in tenant_names]
+            ).rowcount
+        self.renewed = now
+        lost = len(tenant_names) - max(renewed, 0)
+        if lost:
+            raise FencedError(f'Воркер {self.worker_id} потерял аренду '
+                              f'{lost} тенантов.')
+
+    def fence(self, tenant_names, now=None):
+        """Проверяет аренду тенантов и продлевает её раз в полсрока.
+
+        Годится как fence для run_tick: отправка вызывает его перед каждой
+        пачкой, поэтому между продлениями выполняется только чтение, не
+        занимающее блокировку записи общего файла. claim отпускает лишние
+        аренды, так что хватает сравнить число живых аренд воркера с
+        числом его тенантов.
+        """
+        if now is None:
+            now = time.time()
+        if self.renewed is None or now - self.renewed >= self.ttl / 2:
+            self.renew(tenant_names, now)
+            return
+        held, = self.connection.execute(
+            'SELECT COUNT(*) FROM tenant_leases WHERE worker_id = ? '
+            'AND expires >= ?', (self.worker_id, now)
+        ).fetchone()
+        lost = len(tenant_names) - held
+        if lost > 0:
+            raise FencedError(f'Воркер {self.worker_id} потерял аренду '
+                              f'{lost} тенантов.')
+
+    def release(self):
+        """Освобождает аренду воркера и всех его тенантов."""
+        with transaction(self.connection):
+            self.connection.execute(
+                'DELETE FROM tenant_leases WHERE worker_id = ?',
+                (self.worker_id,)
+            )
+            self.connection.execute(
+                'DELETE FROM workers WHERE worker_id = ?', (self.worker_id,)
+            )
+
+
+def owned_tenants(registry, tenants, now=None):
+    """Определяет тенантов шарда текущего воркера."""
+    ring = HashRing(registry.heartbeat(now))
+    desired = [tenant.name for tenant in tenants
+               if ring.owner(tenant.name) == registry.worker_id]
+    held = registry.claim(desired, now)
+    return [tenant for tenant in tenants if tenant.name in held]
+
+
+def worker_file(path, worker_id):
+    """Возвращает файл выгрузки воркера: воркеры не перезаписывают друг друга.
+
+    Пустой путь означает, что выгрузка отключена.
+    """
+    if not path:
+        return path
+    root, extension = os.path.splitext(path)
+    return f'{root}-{worker_id}{extension}'
+
+
+def start_worker_watchdog():
+    """Запускает сторожа воркера без HTTP-проверки.
+
+    Зависший воркер завершается, и run_workers запускает его заново.
+    Перезапуск через execv превратил бы воркер во второго супервизора:
+    он унаследовал аргументы родительского процесса.
+    """
+    heartbeat.WATCHDOG.restart = heartbeat.exit_process
+    return heartbeat.start_watchdog(heartbeat.WATCHDOG, port=None)
+
+
+def run_worker(worker_id, path=COORD_DB):
+    """Опрашивает тенантов своего шарда, пока жив процесс.
+
+    Состояние тенантов хранится в общем StateStore, поэтому при переезде
+    в другой шард тенант продолжает опрос с сохранённого курсора. Аренда
+    тенантов продлевается и проверяется внутри шага как fence: воркер,
+    чей шаг затянулся дольше LEASE_TTL, не перезапишет состояние тенантов,
+    уже перешедших к другому воркеру.
+    """
+    log_config.setup_logging()
+    registry = LeaseRegistry(worker_id, path)
+    store = StateStore(owner=worker_id)
+    bot = transport.TelegramTransport(homework.TELEGRAM_TOKEN)
+    reloader = live_config.ConfigReloader()
+    reloader.install()
+    shutdown.SHUTDOWN.install()
+    tracing.install_profiler()
+    states = TieredStates(store)
+    event_log = events.EventLog()
+    bootstrapper = bootstrap.Bootstrapper()
+    bootstrapper.start()
+    checks = preflight.Preflight(bot)
+    checks.start()
+    connections.install_dns_cache()
+    start_worker_watchdog()
+    session = connections.get_session()
+    held = set()
+    logger.info(f'Воркер {worker_id} запущен.')
+    try:
+        while not shutdown.SHUTDOWN.requested:
+            config = reloader.refresh(states)
+            owned = owned_tenants(registry, config.tenants)
+            names = {tenant.name for tenant in owned}
+            for name in names ^ held:
+                states.discard(name)
+            held = names
+            fence = functools.partial(registry.fence, sorted(names))
+            states.fence = fence
+            try:
+                poller.run_tick(bot, store, owned, states, fence,
+                                session=session, config=config,
+                                limiter=sender.LIMITER, event_log=event_log,
+                                bootstrap=bootstrapper, preflight=checks)
+            except FencedError as error:
+                logger.warning(f'Шаг отменён: {error}')
+            heartbeat.WATCHDOG.set_ready()
+            metrics.export(worker_file(metrics.METRICS_FILE, worker_id))
+            tracing.export(worker_file(tracing.TRACE_FILE, worker_id))
+            poller.prewarm_upcoming(
+                owned, states, HEARTBEAT_INTERVAL, session=session,
+                bot_session=bot.session
+            )
+            shutdown.SHUTDOWN.wait(HEARTBEAT_INTERVAL)
+        poller.drain(bot, store, states, states.fence)
+    finally:
+        registry.release()
+
+
+def forward_signals(processes):
+    """Пересылает воркерам SIGHUP и сигналы остановки."""
+    def forward(signum, frame):
+        if signum in shutdown.STOP_SIGNALS:
+            shutdown.SHUTDOWN.request()
+        for process in processes.values():
+            if process.is_alive():
+                os.kill(process.pid, signum)
+
+    for signum in shutdown.STOP_SIGNALS + (getattr(signal, 'SIGHUP', None),):
+        if signum is not None:
+            signal.signal(signum, forward)
+
+
+def run_workers(count, path=COORD_DB):
+    """Запускает воркеров на этом хосте и перезапускает упавших.
+
+    SIGHUP и сигналы остановки пересылаются воркерам. При остановке
+    супервизор ждёт, пока воркеры дошлют очереди, но не дольше дедлайна.
+    """
+    host = socket.gethostname()
+    processes = {}
+    forward_signals(processes)
+    while not shutdown.SHUTDOWN.requested:
+        for index in range(count):
+            process = processes.get(index)
+            if process is not None and process.is_alive():
+                continue
+            if process is not None:
+                logger.error(f'Воркер {index} завершился с кодом '
+                             f'{process.exitcode}, перезапускаю.')
+            process = multiprocessing.Process(
+                target=run_worker, args=(f'{host}-{index}', path),
+                daemon=True
+            )
+            process.start()
+            processes[index] = process
+        shutdown.SHUTDOWN.wait(HEARTBEAT_INTERVAL)
+    for process in processes.values():
+        process.join(max(0, shutdown.SHUTDOWN.deadline - time.monotonic()))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Шардированный опрос тенантов.'
+    )
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--db', default=COORD_DB)
+    args = parser.parse_args()
+    log_config.setup_logging()
+    run_workers(args.workers, args.db)
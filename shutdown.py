@@ -0,0 +1,68 @@
+import logging
+import signal
+import threading
+import time
+from contextlib import contextmanager
+
+from settings import env
+
+logger = logging.getLogger(__name__)
+
+DRAIN_DEADLINE = env('DRAIN_DEADLINE', 25, float)
+STOP_SIGNALS = tuple(
+    getattr(signal, name) for name in ('SIGTERM', 'SIGINT')
+    if hasattr(signal, name)
+)
+
+
+class Shutdown:
+    """Мягкая остановка процесса с дедлайном на досылку очереди.
+
+    Сигнал только поднимает флаг: начатый шаг опроса доработает, новые
+    опросы не начнутся, а очередь досылается до дедлайна. Если сигнал
+    пришёл в простое между итерациями, процесс завершается сразу.
+    """
+
+    def __init__(self, drain_deadline=DRAIN_DEADLINE):
+        self.drain_deadline = drain_deadline
+        self.deadline = None
+        self._event = threading.Event()
+        self._idle = False
+
+    @property
+    def requested(self):
+        """Запрошена ли остановка."""
+        return self._event.is_set()
+
+    def request(self, signum=None, frame=None):
+        """Начинает остановку, годится как обработчик сигнала."""
+        if not self.requested:
+            self.deadline = time.monotonic() + self.drain_deadline
+            self._event.set()
+            logger.warning(f'Получен сигнал остановки, досылка очереди '
+                           f'не дольше {self.drain_deadline} с.')
+        if self._idle:
+            raise SystemExit(0)
+
+    def wait(self, seconds):
+        """Ждёт следующего шага и возвращает True, если пора остановиться."""
+        return self._event.wait(seconds)
+
+    @contextmanager
+    def idle(self):
+        """Отмечает простой, в котором остановка ничего не теряет."""
+        if self.requested:
+            raise SystemExit(0)
+        self._idle = True
+        try:
+            yield
+        finally:
+            self._idle = False
+
+    def install(self, signums=STOP_SIGNALS):
+        """Перехватывает сигналы остановки."""
+        for signum in signums:
+            signal.signal(signum, self.request)
+
+
+SHUTDOWN = Shutdown()
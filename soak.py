@@ -0,0 +1,320 @@
+import argparse
+import gc
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import namedtuple
+from contextlib import ExitStack
+from unittest import mock
+
+import homework
+import log_config
+import metrics
+import poller
+from settings import env
+
+SOAK_CYCLES = env('SOAK_CYCLES', 1_000_000, int)
+SOAK_WARMUP = env('SOAK_WARMUP', 1000, int)
+SOAK_SAMPLES = env('SOAK_SAMPLES', 10, int)
+SOAK_TENANTS = env('SOAK_TENANTS', 20, int)
+SOAK_RSS_BOUND_MB = env('SOAK_RSS_BOUND_MB', 16, float)
+SOAK_OBJECTS_BOUND = env('SOAK_OBJECTS_BOUND', 2000, int)
+TOP = 10
+STATUSES = ('reviewing', 'rejected', 'approved')
+
+Sample = namedtuple('Sample', ('cycle', 'rss', 'objects', 'traced'))
+Report = namedtuple('Report', ('cycles', 'rss_growth', 'objects_growth',
+                               'bytes_per_cycle', 'top'))
+
+
+class SoakFinished(Exception):
+    """Прогон набрал заданное число циклов."""
+
+
+def rss_bytes():
+    """Возвращает текущий RSS процесса в байтах."""
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        import resource
+
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Soak:
+    """Счётчик циклов прогона и замеры памяти по ходу.
+
+    tracemalloc включается до прогрева, а исходный снимок снимается после
+    warmup циклов, когда кэши, пулы и кольцевые буферы уже заполнены:
+    так их перезапись не выглядит ростом. Дальше память замеряется
+    samples раз, а после cycles циклов прогон останавливается
+    исключением SoakFinished.
+    """
+
+    def __init__(self, cycles=SOAK_CYCLES, warmup=SOAK_WARMUP,
+                 samples=SOAK_SAMPLES):
+        self.cycles = cycles
+        self.warmup = warmup
+        self.every = max(1, cycles // max(1, samples))
+        self.done = 0
+        self.samples = []
+        self.baseline = None
+
+    def start(self):
+        """Включает отслеживание выделений памяти."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if not self.warmup:
+            self._begin()
+
+    def _begin(self):
+        gc.collect()
+        self.baseline = tracemalloc.take_snapshot()
+        self._sample(0)
+
+    def cycle(self):
+        """Отмечает завершённый цикл."""
+        self.done += 1
+        measured = self.done - self.warmup
+        if measured == 0:
+            self._begin()
+        elif measured > 0 and (measured % self.every == 0
+                               or measured >= self.cycles):
+            self._sample(measured)
+        if measured >= self.cycles:
+            raise SoakFinished
+
+    def _sample(self, measured):
+        gc.collect()
+        self.samples.append(Sample(measured, rss_bytes(),
+                                   len(gc.get_objects()),
+                                   tracemalloc.get_traced_memory()[0]))
+
+    def report(self, top=TOP):
+        """Останавливает tracemalloc и возвращает итог прогона.
+
+        В top попадают места в коде, где за прогон осталось больше всего
+        живой памяти.
+        """
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<unknown>'),
+        ))
+        tracemalloc.stop()
+        first, last = self.samples[0], self.samples[-1]
+        cycles = last.cycle - first.cycle or 1
+        stats = [stat for stat in snapshot.compare_to(self.baseline, 'lineno')
+                 if stat.size_diff > 0]
+        return Report(last.cycle, last.rss - first.rss,
+                      last.objects - first.objects,
+                      (last.traced - first.traced) / cycles, stats[:top])
+
+
+class VirtualClock:
+    """Виртуальные часы: sleep мгновенно сдвигает время и отмечает цикл."""
+
+    def __init__(self, soak, start=None):
+        self.soak = soak
+        self.now = time.time() if start is None else start
+
+    def time(self):
+        """Возвращает виртуальное время."""
+        return self.now
+
+    def sleep(self, seconds):
+        """Сдвигает время вперёд, завершая цикл."""
+        self.now += seconds
+        self.soak.cycle()
+
+
+class StandInResponse:
+    """Ответ стенда API в объёме, нужном PracticumClient."""
+
+    status_code = 200
+
+    def __init__(self, data):
+        self.data = data
+
+    def json(self):
+        """Возвращает тело ответа."""
+        return self.data
+
+
+class PracticumStandIn:
+    """Стенд API Практикума в памяти процесса.
+
+    Каждый change_every-й запрос приносит новый статус домашки, каждый
+    error_every-й обрывается сетевой ошибкой.
+    """
+
+    def __init__(self, clock, change_every=10, error_every=97, homeworks=50):
+        self.clock = clock
+        self.change_every = change_every
+        self.error_every = error_every
+        self.homeworks = homeworks
+        self.requests = 0
+
+    def get(self, url, headers=None, params=None, timeout=None):
+        """Отвечает как эндпоинт статусов домашек."""
+        import requests
+
+        self.requests += 1
+        if self.requests % self.error_every == 0:
+            raise requests.ConnectionError('стенд: обрыв соединения')
+        changes = []
+        if self.requests % self.change_every == 0:
+            number = self.requests // self.change_every
+            changes.append({
+                'id': number % self.homeworks,
+                'homework_name': f'hw{number % self.homeworks}',
+                'lesson_name': 'soak',
+                'status': STATUSES[number % len(STATUSES)],
+                'date_updated': time.strftime(metrics.DATE_FORMAT,
+                                              time.gmtime(self.clock.now)),
+            })
+        return StandInResponse({'homeworks': changes,
+                                'current_date': int(self.clock.now)})
+
+
+class TelegramStandIn:
+    """Стенд Telegram: считает отправленные сообщения."""
+
+    def __init__(self, token=None, **kwargs):
+        self.sent = 0
+
+    def send_message(self, chat_id, text, **kwargs):
+        """Принимает сообщение."""
+        self.sent += 1
+
+
+def run_main(soak, clock, api=None):
+    """Гоняет цикл homework.main на стендах и виртуальных часах."""
+    import requests
+    import telebot
+
+    api = api or PracticumStandIn(clock)
+    soak.start()
+    with ExitStack() as stack:
+        for target, name, value in (
+            (homework, 'time', clock),
+            (metrics, 'time', clock),
+            (requests, 'get', api.get),
+            (telebot, 'TeleBot', TelegramStandIn),
+            (homework, 'PRACTICUM_TOKEN', homework.PRACTICUM_TOKEN or 'soak'),
+            (homework, 'TELEGRAM_TOKEN', homework.TELEGRAM_TOKEN or 'soak'),
+            (homework, 'TELEGRAM_CHAT_ID', homework.TELEGRAM_CHAT_ID or 1),
+        ):
+            stack.enter_context(mock.patch.object(target, name, value))
+        try:
+            homework.main()
+        except SoakFinished:
+            pass
+    return api
+
+
+def run_ticks(soak, clock, workdir, tenants=SOAK_TENANTS, api=None):
+    """Гоняет шаги планировщика для tenants тенантов на стендах.
+
+    Состояния держатся в TieredStates вполовину числа тенантов, чтобы
+    прогон задевал и вытеснение из кэша.
+    """
+    from events import EventLog
+    from state import StateStore, TieredStates
+    from tenants import Tenant
+
+    api = api or PracticumStandIn(clock)
+    bot = TelegramStandIn()
+    store = StateStore(os.path.join(workdir, 'state.sqlite3'))
+    states = TieredStates(store, capacity=max(1, tenants // 2))
+    event_log = EventLog(os.path.join(workdir, 'events.sqlite3'))
+    tenant_list = [Tenant(f'tenant{number}', f'token{number}', number)
+                   for number in range(tenants)]
+    soak.start()
+    try:
+        while True:
+            poller.run_tick(bot, store, tenant_list, states, now=clock.now,
+                            session=api, event_log=event_log)
+            clock.sleep(homework.RETRY_PERIOD)
+    except SoakFinished:
+        pass
+    finally:
+        store.connection.close()
+        event_log.connection.close()
+    return api
+
+
+def check_bounds(report, rss_bound_mb=SOAK_RSS_BOUND_MB,
+                 objects_bound=SOAK_OBJECTS_BOUND):
+    """Возвращает список нарушенных границ роста памяти."""
+    failures = []
+    if report.rss_growth > rss_bound_mb * 1024 * 1024:
+        failures.append(f'RSS вырос на {report.rss_growth / 2 ** 20:.1f} МБ '
+                        f'при границе {rss_bound_mb:.0f} МБ.')
+    if report.objects_growth > objects_bound:
+        failures.append(f'Живых объектов прибавилось '
+                        f'{report.objects_growth} при границе '
+                        f'{objects_bound}.')
+    return failures
+
+
+def format_report(report):
+    """Возвращает итог прогона в виде строк для вывода."""
+    lines = [
+        f'Циклов: {report.cycles}.',
+        f'Рост RSS: {report.rss_growth / 2 ** 20:.2f} МБ.',
+        f'Рост числа живых объектов: {report.objects_growth}.',
+        f'Прирост памяти за цикл: {report.bytes_per_cycle:.2f} байт.',
+        'Места с наибольшим приростом памяти:',
+    ]
+    lines.extend(f'{stat.size_diff / 1024:10.1f} КБ {stat.count_diff:+8d} '
+                 f'{stat.traceback}' for stat in report.top)
+    return lines
+
+
+def main(argv=None):
+    """Прогоняет цикл опроса на стендах и проверяет, что память не растёт."""
+    parser = argparse.ArgumentParser(
+        description='Долгий прогон бота с контролем утечек памяти.'
+    )
+    parser.add_argument('--target', choices=('main', 'tick'), default='main')
+    parser.add_argument('--cycles', type=int, default=SOAK_CYCLES)
+    parser.add_argument('--warmup', type=int, default=SOAK_WARMUP)
+    parser.add_argument('--samples', type=int, default=SOAK_SAMPLES)
+    parser.add_argument('--tenants', type=int, default=SOAK_TENANTS)
+    parser.add_argument('--rss-bound-mb', type=float,
+                        default=SOAK_RSS_BOUND_MB)
+    parser.add_argument('--objects-bound', type=int,
+                        default=SOAK_OBJECTS_BOUND)
+    parser.add_argument('--no-log', dest='log', action='store_false',
+                        help='не включать логирование в файл')
+    args = parser.parse_args(argv)
+    soak = Soak(args.cycles, args.warmup, args.samples)
+    clock = VirtualClock(soak)
+    with tempfile.TemporaryDirectory() as workdir, \
+            open(os.devnull, 'w') as devnull:
+        if args.log:
+            log_config.setup_logging(logging.DEBUG,
+                                     os.path.join(workdir, 'soak.log'),
+                                     stream=devnull)
+        try:
+            if args.target == 'main':
+                run_main(soak, clock)
+            else:
+                run_ticks(soak, clock, workdir, args.tenants)
+        finally:
+            log_config.stop_logging()
+        report = soak.report()
+    failures = check_bounds(report, args.rss_bound_mb, args.objects_bound)
+    for line in format_report(report) + failures:
+        print(line)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
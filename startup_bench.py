@@ -0,0 +1,78 @@
+import argparse
+import re
+import subprocess
+import sys
+
+from settings import env
+
+STARTUP_IMPORT_BUDGET_MS = env('STARTUP_IMPORT_BUDGET_MS', 300, float)
+FIRST_POLL_MODULES = (
+    'run_once', 'homework', 'live_config', 'poller', 'state', 'tenants',
+    'sender', 'transport', 'requests',
+)
+TOP = 10
+
+IMPORT_TIME_PATTERN = re.compile(
+    r'^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$'
+)
+
+
+def parse_importtime(output):
+    """Разбирает вывод -X importtime.
+
+    Возвращает записи (модуль, self, cumulative, уровень вложенности),
+    время в микросекундах.
+    """
+    records = []
+    for line in output.splitlines():
+        match = IMPORT_TIME_PATTERN.match(line)
+        if match:
+            own, cumulative, indent, name = match.groups()
+            records.append((name, int(own), int(cumulative), len(indent)))
+    return records
+
+
+def measure(modules):
+    """Импортирует модули в чистом интерпретаторе и возвращает записи."""
+    code = '; '.join(f'import {module}' for module in modules) or 'pass'
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        capture_output=True, text=True, check=True
+    )
+    return parse_importtime(result.stderr)
+
+
+def import_cost(modules):
+    """Возвращает стоимость импорта модулей сверх старта интерпретатора.
+
+    Результат - общее время в мс и самые дорогие модули по собственному
+    времени.
+    """
+    baseline = {name for name, *_ in measure(())}
+    records = [record for record in measure(modules)
+               if record[0] not in baseline]
+    total = sum(cumulative for _, _, cumulative, level in records
+                if level == 0)
+    heaviest = sorted(records, key=lambda record: record[1], reverse=True)
+    return total / 1000, heaviest[:TOP]
+
+
+def main(argv=None):
+    """Проверяет, что импорт до первого опроса укладывается в бюджет."""
+    parser = argparse.ArgumentParser(
+        description='Бюджет времени старта до первого опроса.'
+    )
+    parser.add_argument('--budget-ms', type=float,
+                        default=STARTUP_IMPORT_BUDGET_MS)
+    parser.add_argument('modules', nargs='*', default=FIRST_POLL_MODULES)
+    args = parser.parse_args(argv)
+    total, heaviest = import_cost(args.modules)
+    for name, own, cumulative, _ in heaviest:
+        print(f'{own / 1000:8.1f} мс {cumulative / 1000:8.1f} мс  {name}')
+    print(f'Импорт до первого опроса: {total:.1f} мс, '
+          f'бюджет {args.budget_ms:.0f} мс.')
+    return 0 if total <= args.budget_ms else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,336 @@
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+
+import metrics
+from settings import env
+
+STATE_DB = env('STATE_DB', 'state.sqlite3')
+STATE_CACHE_SIZE = env('STATE_CACHE_SIZE', 10000, int)
+
+PRIORITY_STATUS, PRIORITY_ALERT, PRIORITY_INFO = 0, 1, 2
+PRIORITIES = {
+    'status': PRIORITY_STATUS,
+    'alert': PRIORITY_ALERT,
+    'info': PRIORITY_INFO,
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tenant_state (
+    tenant TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    owner TEXT NOT NULL,
+    chat_id TEXT NOT NULL,
+    text TEXT NOT NULL,
+    created REAL NOT NULL,
+    updated REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    priority INTEGER NOT NULL DEFAULT 0,
+    folded INTEGER NOT NULL DEFAULT 0
+);
+"""
+MIGRATIONS = (
+    ('outbox', 'priority', 'INTEGER NOT NULL DEFAULT 0'),
+    ('outbox', 'folded', 'INTEGER NOT NULL DEFAULT 0'),
+)
+FOLDED_NOTE = '\nПропущено похожих сообщений: '
+
+INDEXES = """
+CREATE INDEX IF NOT EXISTS outbox_priority ON outbox (owner, priority, id);
+DROP INDEX IF EXISTS outbox_owner;
+"""
+
+
+def connect(path, timeout=30):
+    """Открывает SQLite в режиме WAL для работы нескольких процессов."""
+    connection = sqlite3.connect(path, timeout=timeout,
+                                 isolation_level=None,
+                                 check_same_thread=False)
+    connection.execute('PRAGMA journal_mode=WAL')
+    return connection
+
+
+@contextmanager
+def transaction(connection):
+    """Выполняет блок в одной транзакции с блокировкой на запись."""
+    connection.execute('BEGIN IMMEDIATE')
+    try:
+        yield connection
+    except BaseException:
+        connection.execute('ROLLBACK')
+        raise
+    connection.execute('COMMIT')
+
+
+class StateStore:
+    """Персистентное состояние опроса: курсоры, статусы и очередь отправки.
+
+    Сообщения сначала попадают в outbox и удаляются только после отправки,
+    поэтому они переживают падение процесса.
+    """
+
+    def __init__(self, path=STATE_DB, owner='default'):
+        self.owner = owner
+        self.connection = connect(path)
+        self.connection.executescript(SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        for table, column, definition in MIGRATIONS:
+            columns = {row[1] for row in self.connection.execute(
+                f'PRAGMA table_info({table})'
+            )}
+            if column not in columns:
+                self.connection.execute(
+                    f'ALTER TABLE {table} ADD COLUMN {column} {definition}'
+                )
+        self.connection.executescript(INDEXES)
+
+    def transaction(self):
+        """Открывает транзакцию на соединении хранилища."""
+        return transaction(self.connection)
+
+    def load(self, tenant):
+        """Возвращает сохранённое состояние тенанта или None."""
+        row = self.connection.execute(
+            'SELECT data FROM tenant_state WHERE tenant = ?', (tenant,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def load_schedule(self):
+        """Возвращает время следующего опроса всех тенантов."""
+        return dict(self.connection.execute(
+            "SELECT tenant, json_extract(data, '$.next_poll') "
+            'FROM tenant_state'
+        ))
+
+    def load_all(self):
+        """Возвращает состояния всех тенантов."""
+        return {tenant: json.loads(data) for tenant, data in
+                self.connection.execute('SELECT tenant, data '
+                                        'FROM tenant_state')}
+
+    def save(self, states, fence=None, messages=()):
+        """Сохраняет состояния тенантов одной транзакцией.
+
+        fence вызывается внутри транзакции и должен выбросить исключение,
+        если процесс больше не имеет права писать. messages ставятся в
+        outbox в той же транзакции: сообщения и курсоры, после которых они
+        отправлены, записываются вместе или не записываются вовсе.
+        """
+        with self.transaction():
+            if fence is not None:
+                fence()
+            self._enqueue(messages)
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO tenant_state VALUES (?, ?)',
+                [(tenant, json.dumps(state, ensure_ascii=False,
+                                     separators=(',', ':')))
+                 for tenant, state in states.items()]
+            )
+
+    def delete(self, tenant):
+        """Удаляет состояние тенанта."""
+        self.connection.execute(
+            'DELETE FROM tenant_state WHERE tenant = ?', (tenant,)
+        )
+
+    def put(self, chat_id, text, updated=None, priority=PRIORITY_STATUS):
+        """Ставит сообщение в очередь отправки.
+
+        updated - время изменения статуса для замера задержки доставки.
+        """
+        self.put_many([(chat_id, text, updated, priority)])
+
+    def put_many(self, messages, fence=None):
+        """Ставит в очередь пачку (chat_id, text, updated, priority).
+
+        Пачка пишется одной транзакцией, поэтому рассылка на сотни
+        подписчиков не делает коммит на каждое сообщение. fence, как в
+        save, вызывается внутри транзакции.
+        """
+        with self.transaction():
+            if fence is not None:
+                fence()
+            self._enqueue(messages)
+
+    def _enqueue(self, messages):
+        created = time.time()
+        self.connection.executemany(
+            'INSERT INTO outbox '
+            '(owner, chat_id, text, created, updated, priority) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            [(self.owner, str(chat_id), text, created, updated, priority)
+             for chat_id, text, updated, priority in messages]
+        )
+
+    def pending(self, limit=100):
+        """Возвращает неотправленные сообщения по приоритету и порядку.
+
+        К тексту свёрнутого сообщения дописывается число свёрнутых.
+        """
+        return self.connection.execute(
+            "SELECT id, chat_id, CASE WHEN folded THEN text || ? || folded "
+            "|| '.' ELSE text END, updated, attempts FROM outbox "
+            'WHERE owner = ? ORDER BY priority, id LIMIT ?',
+            (FOLDED_NOTE, self.owner, limit)
+        ).fetchall()
+
+    def backlog(self):
+        """Возвращает число сообщений в очереди по приоритетам."""
+        return dict(self.connection.execute(
+            'SELECT priority, COUNT(*) FROM outbox WHERE owner = ? '
+            'GROUP BY priority', (self.owner,)
+        ))
+
+    def drop(self, priority):
+        """Удаляет из очереди все сообщения приоритета, возвращает число."""
+        return self.connection.execute(
+            'DELETE FROM outbox WHERE owner = ? AND priority = ?',
+            (self.owner, priority)
+        ).rowcount
+
+    def summarize(self, priority):
+        """Сворачивает сообщения приоритета до последнего в каждом чате.
+
+        Оставшееся сообщение копит в folded число свёрнутых, включая
+        свёрнутые в него раньше, а pending выводит его один раз.
+        Возвращает число удалённых сообщений.
+        """
+        removed = 0
+        with self.transaction():
+            rows = self.connection.execute(
+                'SELECT chat_id, COUNT(*), MAX(id), SUM(folded) FROM outbox '
+                'WHERE owner = ? AND priority = ? GROUP BY chat_id '
+                'HAVING COUNT(*) > 1', (self.owner, priority)
+            ).fetchall()
+            for chat_id, count, last_id, folded in rows:
+                self.connection.execute(
+                    'UPDATE outbox SET folded = ? WHERE id = ?',
+                    (folded + count - 1, last_id)
+                )
+                self.connection.execute(
+                    'DELETE FROM outbox WHERE owner = ? AND priority = ? '
+                    'AND chat_id = ? AND id < ?',
+                    (self.owner, priority, chat_id, last_id)
+                )
+                removed += count - 1
+        return removed
+
+    def ack(self, message_id):
+        """Удаляет отправленное сообщение из очереди."""
+        self.connection.execute('DELETE FROM outbox WHERE id = ?',
+                                (message_id,))
+
+    def retry(self, message_id):
+        """Отмечает неудачную попытку отправки."""
+        self.connection.execute(
+            'UPDATE outbox SET attempts = attempts + 1 WHERE id = ?',
+            (message_id,)
+        )
+
+
+class TieredStates(MutableMapping):
+    """Состояния тенантов: горячий LRU в памяти и StateStore на диске.
+
+    В памяти держится не больше capacity состояний, вытесненные
+    записываются на диск с проверкой fence и прозрачно подгружаются при
+    обращении. Для планирования в памяти хранится только время
+    следующего опроса.
+    """
+
+    def __init__(self, store, capacity=STATE_CACHE_SIZE, fence=None):
+        self.store = store
+        self.capacity = capacity
+        self.fence = fence
+        self._hot = OrderedDict()
+        self._schedule = store.load_schedule()
+        self.hits = 0
+        self.misses = 0
+
+    def _count(self, hit):
+        if hit:
+            self.hits += 1
+            metrics.inc('state_cache_hits_total')
+        else:
+            self.misses += 1
+            metrics.inc('state_cache_misses_total')
+        metrics.set_gauge('state_cache_hit_ratio',
+                          round(self.hits / (self.hits + self.misses), 4))
+
+    def __getitem__(self, tenant):
+        if tenant in self._hot:
+            self._hot.move_to_end(tenant)
+            self._count(hit=True)
+            return self._hot[tenant]
+        self._count(hit=False)
+        state = self.store.load(tenant)
+        if state is None:
+            raise KeyError(tenant)
+        self._put(tenant, state)
+        return state
+
+    def __setitem__(self, tenant, state):
+        self._put(tenant, state)
+
+    def __delitem__(self, tenant):
+        self._schedule.pop(tenant)
+        self._hot.pop(tenant, None)
+
+    def __contains__(self, tenant):
+        if tenant in self._hot or tenant in self._schedule:
+            return True
+        try:
+            self[tenant]
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        return iter(list(self._schedule))
+
+    def __len__(self):
+        return len(self._schedule)
+
+    def _put(self, tenant, state):
+        self._hot[tenant] = state
+        self._hot.move_to_end(tenant)
+        self._schedule[tenant] = state.get('next_poll', 0)
+        while len(self._hot) > self.capacity:
+            name, evicted = self._hot.popitem(last=False)
+            self._schedule[name] = evicted.get('next_poll', 0)
+            self.store.save({name: evicted}, self.fence)
+            metrics.inc('state_cache_evictions_total')
+        metrics.set_gauge('state_cache_size', len(self._hot))
+
+    def next_poll(self, tenant):
+        """Возвращает время следующего опроса без загрузки состояния."""
+        if tenant in self._hot:
+            return self._hot[tenant].get('next_poll', 0)
+        return self._schedule.get(tenant)
+
+    def discard(self, tenant):
+        """Забывает закэшированное состояние, следующий доступ - с диска."""
+        self._hot.pop(tenant, None)
+        self._schedule.pop(tenant, None)
+
+    def reload(self):
+        """Перечитывает горячие состояния и расписание с диска."""
+        self._schedule = self.store.load_schedule()
+        for tenant in list(self._hot):
+            state = self.store.load(tenant)
+            if state is None:
+                del self._hot[tenant]
+            else:
+                self._hot[tenant] = state
+
+    def flush(self, fence=None):
+        """Записывает все горячие состояния на диск."""
+        if self._hot:
+            self.store.save(dict(self._hot), fence)
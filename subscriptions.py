@@ -0,0 +1,42 @@
+from collections import namedtuple
+
+Subscription = namedtuple(
+    'Subscription', ('chat_id', 'statuses', 'projects'), defaults=(None, None)
+)
+
+
+def parse_subscriptions(items):
+    """Разбирает подписчиков тенанта из конфигурации.
+
+    Пустой или отсутствующий фильтр пропускает все события.
+    """
+    return tuple(
+        Subscription(item['chat_id'],
+                     frozenset(item.get('statuses') or ()) or None,
+                     frozenset(item.get('projects') or ()) or None)
+        for item in items
+    )
+
+
+def matches(subscription, homework):
+    """Проверяет, подходит ли событие под фильтры подписки."""
+    if (subscription.statuses is not None
+            and homework.get('status') not in subscription.statuses):
+        return False
+    if subscription.projects is None:
+        return True
+    return bool(subscription.projects & {homework.get('homework_name'),
+                                         homework.get('lesson_name')})
+
+
+def recipients(tenant, homework):
+    """Возвращает чаты, которым нужно отправить событие по домашке.
+
+    Владелец токена получает все события, подписчики - по своим
+    фильтрам, каждый чат не больше одного раза.
+    """
+    chats = {tenant.chat_id: None}
+    for subscription in tenant.subscribers:
+        if matches(subscription, homework):
+            chats.setdefault(subscription.chat_id)
+    return list(chats)
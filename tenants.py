@@ -0,0 +1,34 @@
+import json
+from collections import namedtuple
+
+import homework
+from settings import env
+from subscriptions import parse_subscriptions
+
+TENANTS_FILE = env('TENANTS_FILE')
+
+Tenant = namedtuple('Tenant',
+                    ('name', 'token', 'chat_id', 'subscribers', 'push'),
+                    defaults=((), False))
+
+
+def load_tenants(path=TENANTS_FILE):
+    """Загружает список тенантов из JSON-файла.
+
+    Без файла единственным тенантом считается аккаунт из переменных
+    окружения. Ключ subscribers задаёт дополнительные чаты с фильтрами
+    statuses и projects, push: true - получение статусов через push.
+    """
+    if not path:
+        return [Tenant('default', homework.PRACTICUM_TOKEN,
+                       homework.TELEGRAM_CHAT_ID)]
+    with open(path, encoding='UTF-8') as file:
+        data = json.load(file)
+    tenants = [Tenant(item['name'], item['token'], item['chat_id'],
+                      parse_subscriptions(item.get('subscribers', ())),
+                      bool(item.get('push', False)))
+               for item in data]
+    names = [tenant.name for tenant in tenants]
+    if len(names) != len(set(names)):
+        raise ValueError(f'В файле {path} повторяются имена тенантов.')
+    return tenants
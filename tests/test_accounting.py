@@ -0,0 +1,49 @@
+import accounting
+import metrics
+import poller
+import practicum
+from state import StateStore
+from tenants import Tenant
+from tests.test_poller import FakeBot
+
+HOMEWORK = {'homework_name': 'hw1', 'status': 'approved',
+            'date_updated': '2024-01-02T00:00:00Z'}
+
+
+def test_report_keeps_top_tenants_and_resets_window():
+    now = [0]
+    usage = accounting.TenantUsage(interval=60, top=2, clock=lambda: now[0])
+    for tenant, calls in (('a', 1), ('b', 5), ('c', 3)):
+        usage.record(tenant, calls=calls, bytes=calls * 100)
+    usage.record('c', errors=2)
+    assert usage.top('calls') == [('b', 5), ('c', 3)]
+    assert usage.top('errors', 5) == [('c', 2)]
+    assert not usage.maybe_report()
+    now[0] = 60
+    assert usage.maybe_report()
+    rendered = metrics.render()
+    assert 'tenant_usage{tenant="b",resource="calls"} 5' in rendered
+    assert 'tenant_usage_share{tenant="b",resource="calls"} 0.556' in rendered
+    assert 'tenant="a",resource="calls"' not in rendered
+    assert usage.top('calls') == []
+    usage.record('a', calls=1)
+    assert usage.report() == ['calls (1): a 1 (100%)']
+    assert 'tenant="b"' not in metrics.render()
+
+
+def test_polls_are_charged_to_their_tenants(tmp_path, monkeypatch):
+    usage = accounting.TenantUsage()
+    monkeypatch.setattr(accounting, 'USAGE', usage)
+    backend = practicum.MemoryBackend(clock=lambda: 1704153700)
+    backend.register('token', HOMEWORK)
+    tenants = [Tenant('good', 'token', 1), Tenant('broken', 'revoked', 2)]
+    states = {tenant.name: poller.new_state(1704153600)
+              for tenant in tenants}
+    poller.run_tick(FakeBot(), StateStore(str(tmp_path / 'state.sqlite3')),
+                    tenants, states, now=1704153600, session=backend)
+    assert usage.top('calls') == [('good', 1), ('broken', 1)]
+    assert usage.top('errors') == [('broken', 1)]
+    assert [tenant for tenant, _ in usage.top('bytes')] == ['good',
+                                                            'broken']
+    assert usage.top('messages') == [('good', 1), ('broken', 1)]
+    assert usage.top('cpu_seconds')[0][1] > 0
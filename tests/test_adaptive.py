@@ -0,0 +1,124 @@
+import threading
+import time
+
+import pytest
+
+import bootstrap
+import metrics
+import practicum
+import preflight
+from adaptive import AdaptiveLimiter
+from tenants import Tenant
+from tests.test_poller import FakeBot
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def request(self, seconds):
+        def func():
+            self.now += seconds
+            return seconds
+        return func
+
+
+def test_limit_grows_while_latency_stays_near_baseline():
+    clock = Clock()
+    limiter = AdaptiveLimiter('grow', initial=1, maximum=3, clock=clock)
+    for _ in range(20):
+        limiter.call(clock.request(0.01))
+    assert limiter.limit == 2.0
+    assert limiter.baseline == pytest.approx(0.01)
+    limiter.limit = 2.5
+    limiter.in_flight = 1
+    limiter.call(clock.request(0.01))
+    assert limiter.limit == pytest.approx(2.9)
+    assert 'grow_concurrency_limit 2.9' in metrics.render()
+
+
+def test_limit_is_cut_once_per_latency_when_api_slows_down():
+    clock = Clock()
+    limiter = AdaptiveLimiter('slow', initial=10, slack=0, clock=clock)
+    limiter.call(clock.request(0.1))
+    for _ in range(3):
+        limiter.in_flight += 1
+        limiter._release(1.0, False)
+    assert limiter.limit == pytest.approx(7)
+    assert limiter.latency > limiter.baseline * limiter.tolerance
+    clock.now += 10
+    limiter.call(clock.request(1.0))
+    assert limiter.limit == pytest.approx(4.9)
+    rendered = metrics.render()
+    assert 'slow_latency_baseline_seconds 0.1' in rendered
+    assert 'slow_concurrency_decreases_total 2' in rendered
+
+
+def test_errors_and_overload_responses_cut_the_limit():
+    clock = Clock()
+    limiter = AdaptiveLimiter('errors', initial=8, minimum=2, clock=clock)
+
+    def fail():
+        raise ConnectionError('down')
+
+    with pytest.raises(ConnectionError):
+        limiter.call(fail)
+    assert limiter.limit == pytest.approx(5.6)
+    clock.now += 1
+    limiter.call(clock.request(0.01), overloaded=lambda result: True)
+    clock.now += 1
+    limiter.call(clock.request(0.01), overloaded=lambda result: True)
+    assert limiter.current == 2
+    assert limiter.in_flight == 0
+
+
+def test_in_flight_requests_never_exceed_the_limit():
+    limiter = AdaptiveLimiter('gate', initial=2, maximum=2)
+    active, peak, lock = [0], [0], threading.Lock()
+
+    def request():
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+
+    threads = [threading.Thread(target=limiter.call, args=(request,))
+               for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak[0] == 2
+
+
+def test_client_reports_server_errors_to_its_limiter():
+    backend = practicum.MemoryBackend()
+    backend.register('token')
+    backend.fail('token', 503)
+    limiter = AdaptiveLimiter('client', initial=4)
+    client = practicum.PracticumClient('token', backend, limiter=limiter)
+    assert isinstance(client.homework_statuses_many([('token', 0)])[0],
+                      Exception)
+    assert limiter.limit == pytest.approx(2.8)
+
+
+def test_bootstrap_and_preflight_have_their_own_limiters(monkeypatch):
+    shared = AdaptiveLimiter('shared')
+    monkeypatch.setattr(practicum, 'LIMITER', shared)
+    backend = practicum.MemoryBackend()
+    backend.register('token')
+    tenant = Tenant('new', 'token', 1)
+    bootstrapper = bootstrap.Bootstrapper(rate=1000, session=backend)
+    bootstrapper.schedule([tenant], {})
+    bootstrapper.fetch(bootstrapper._tasks.get_nowait())
+    checks = preflight.Preflight(FakeBot(), session=backend)
+    checks.check_tenant(tenant)
+    assert backend.calls == 2
+    assert shared.latency is None
+    assert bootstrapper.concurrency.latency is not None
+    assert checks.concurrency.latency is not None
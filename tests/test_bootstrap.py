@@ -0,0 +1,109 @@
+import bootstrap
+import poller
+import preflight
+from events import EventLog
+from state import PRIORITY_INFO, StateStore, TieredStates
+from tenants import Tenant
+from tests.test_poller import FakeBot, FakeResponse
+
+OLD = Tenant('old', 'old-token', 1)
+NEW = Tenant('new', 'new-token', 2)
+HISTORY = [
+    {'homework_name': 'hw1', 'status': 'approved',
+     'date_updated': '2024-01-03T00:00:00Z'},
+    {'homework_name': 'hw1', 'status': 'reviewing',
+     'date_updated': '2024-01-02T00:00:00Z'},
+    {'homework_name': 'hw2', 'status': 'rejected',
+     'date_updated': '2024-01-01T00:00:00Z'},
+]
+
+
+class FakeSession:
+    def __init__(self):
+        self.calls = []
+
+    def get(self, url, headers, params, **kwargs):
+        self.calls.append((headers['Authorization'], params['from_date']))
+        if params['from_date'] == 0:
+            return FakeResponse({'homeworks': HISTORY,
+                                 'current_date': 1704300000})
+        return FakeResponse({'homeworks': [], 'current_date': 2000})
+
+
+def run(tmp_path, announce):
+    session = FakeSession()
+    store = StateStore(str(tmp_path / 'state.sqlite3'))
+    log = EventLog(str(tmp_path / 'events.sqlite3'))
+    bootstrapper = bootstrap.Bootstrapper(rate=1000, announce=announce,
+                                          session=session)
+    states = {OLD.name: poller.new_state(1000)}
+    poller.run_tick(FakeBot(), store, [OLD, NEW], states, now=1000,
+                    session=session, event_log=log, bootstrap=bootstrapper)
+    assert session.calls == [('OAuth old-token', 1000 - 300)]
+    assert states[NEW.name]['bootstrap']
+    bootstrapper.fetch(bootstrapper._tasks.get_nowait())
+    return session, store, log, bootstrapper, states
+
+
+def test_history_is_loaded_silently_before_polling(tmp_path):
+    session, store, log, bootstrapper, states = run(tmp_path, False)
+    bot = FakeBot()
+    poller.run_tick(bot, store, [OLD, NEW], states, now=1001,
+                    session=session, event_log=log, bootstrap=bootstrapper)
+    assert bot.sent == []
+    state = store.load(NEW.name)
+    assert state['timestamp'] == 1704300000
+    assert 'bootstrap' not in state and state['next_poll'] == 0
+    assert [status for status, _ in log.history('new', 'hw1')] == [
+        'reviewing', 'approved']
+    poller.run_tick(bot, store, [OLD, NEW], states, now=1002,
+                    session=session, bootstrap=bootstrapper)
+    assert session.calls[-1] == ('OAuth new-token', 1704300000 - 300)
+
+
+def test_only_latest_change_per_homework_is_announced(tmp_path):
+    session, store, log, bootstrapper, states = run(tmp_path, True)
+    polled = bootstrapper.apply(states, store)
+    assert list(polled) == [NEW.name]
+    assert store.backlog() == {PRIORITY_INFO: 2}
+    texts = [text for _, _, text, _, _ in store.pending()]
+    assert 'hw1' in texts[0] and 'ревьюеру всё понравилось' in texts[0]
+    assert 'hw2' in texts[1]
+
+
+def test_removed_tenant_history_is_dropped(tmp_path):
+    session, store, log, bootstrapper, states = run(tmp_path, False)
+    tiered = TieredStates(store)
+    tiered[OLD.name] = states[OLD.name]
+    poller.run_tick(FakeBot(), store, [OLD], tiered, now=1001,
+                    session=session, bootstrap=bootstrapper)
+    assert NEW.name not in bootstrapper._submitted
+    bootstrapper.schedule([OLD, NEW], tiered)
+    bootstrapper.schedule([OLD], tiered)
+    bootstrapper.fetch(bootstrapper._tasks.get_nowait())
+    assert len(session.calls) == 2
+
+
+def test_history_does_not_release_quarantined_tenant(tmp_path):
+    session, store, log, bootstrapper, states = run(tmp_path, False)
+    states[NEW.name].update(quarantine='401',
+                            next_poll=preflight.QUARANTINED)
+    bootstrapper.apply(states, store)
+    state = states[NEW.name]
+    assert 'bootstrap' not in state and state['quarantine'] == '401'
+    assert state['next_poll'] == preflight.QUARANTINED
+
+
+def test_history_without_integer_date_is_retried(tmp_path, monkeypatch):
+    session, store, log, bootstrapper, states = run(tmp_path, False)
+    bootstrapper.apply(states, store)
+    broken = Tenant('broken', 'broken-token', 3)
+    states[broken.name] = bootstrap.pending_state()
+    monkeypatch.setattr(session, 'get', lambda *args, **kwargs: FakeResponse(
+        {'homeworks': HISTORY, 'current_date': '2024-01-04'}))
+    bootstrapper.schedule([broken], states)
+    bootstrapper.fetch(bootstrapper._tasks.get_nowait())
+    assert bootstrapper.apply(states, store) == {}
+    assert states[broken.name]['bootstrap']
+    bootstrapper.schedule([broken], states)
+    assert bootstrapper._tasks.qsize() == 1
@@ -0,0 +1,69 @@
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+import connections
+import poller
+from tenants import Tenant
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = HTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_port}/'
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_dns_cache_serves_fresh_and_stale_answers(monkeypatch):
+    answers = [[('answer',)]]
+
+    def resolve(host, port):
+        if not answers:
+            raise socket.gaierror('down')
+        return answers.pop()
+
+    now = [0.0]
+    monkeypatch.setattr(connections.time, 'monotonic', lambda: now[0])
+    cache = connections.DNSCache(resolve, ttl=10, stale_ttl=100)
+    assert cache.getaddrinfo('host', 443) == [('answer',)]
+    assert cache.getaddrinfo('host', 443) == [('answer',)]
+    now[0] = 50
+    assert cache.getaddrinfo('host', 443) == [('answer',)]
+    now[0] = 200
+    with pytest.raises(socket.gaierror):
+        cache.getaddrinfo('host', 443)
+
+
+def test_prewarm_opens_reusable_connections(server):
+    import requests
+
+    session = requests.Session()
+    assert connections.prewarm(session, server, count=2) == 2
+    assert connections.prewarm(session, server, count=2) == 0
+    assert session.get(server).status_code == 200
+
+
+def test_prewarm_upcoming_only_when_batch_is_near(monkeypatch):
+    calls = []
+    monkeypatch.setattr(connections, 'prewarm',
+                        lambda session, url, count=1: calls.append(count) or 1)
+    tenants = [Tenant('a', 't', 1), Tenant('b', 't', 2)]
+    states = {'a': {'next_poll': 1010}, 'b': {'next_poll': 5000}}
+    poller.prewarm_upcoming(tenants, states, 10, now=1000, session=object())
+    assert calls == [1]
+    poller.prewarm_upcoming(tenants, states, 10, now=100, session=object())
+    assert calls == [1]
@@ -0,0 +1,44 @@
+from cursor import ClockSkew, Cursor, change_key
+
+CHANGE = {'id': 1, 'homework_name': 'hw', 'status': 'reviewing',
+          'date_updated': '1970-01-01T00:16:40Z'}
+
+
+def test_seen_keys_expire_with_the_window():
+    position = Cursor(900, overlap=100)
+    position.advance(1050, [CHANGE])
+    assert position.fresh([CHANGE]) == []
+    state = {}
+    position.dump(state)
+    position = Cursor.load(state)
+    assert position.seen == {change_key(CHANGE): 1000}
+    position.advance(1000 + position.overlap, [])
+    assert position.seen == {change_key(CHANGE): 1000}
+    position.advance(1001 + position.overlap, [])
+    assert position.seen == {}
+
+
+def test_seen_set_is_bounded():
+    position = Cursor(0, overlap=10 ** 6, limit=3)
+    position.advance(100, [dict(CHANGE, id=index) for index in range(10)])
+    assert len(position.seen) == 3
+
+
+def test_cursor_follows_server_time_and_skew_is_measured():
+    position = Cursor(5000)
+    position.advance(4000, [])
+    assert position.timestamp == 4000
+    position.advance('bad', [])
+    assert position.timestamp == 4000
+    skew = ClockSkew()
+    skew.observe(1030, local_time=1000)
+    assert skew.offset == 30
+
+
+def test_window_never_starts_before_floor():
+    position = Cursor(1000, overlap=300, floor=1000)
+    assert position.from_date == 1000
+    position.advance(1100, [])
+    assert position.from_date == 1000
+    position.advance(1500, [])
+    assert position.from_date == 1200
@@ -0,0 +1,74 @@
+import time
+
+import pytest
+
+import poller
+from events import EventLog
+from state import StateStore
+from tests.test_poller import TENANT, FakeBot, api  # noqa: F401
+
+
+@pytest.fixture
+def log(tmp_path):
+    return EventLog(str(tmp_path / 'events.sqlite3'))
+
+
+def test_transitions_feed_history_durations_and_counts(log):
+    assert log.append([
+        ('a', 'hw1', 'api', 'reviewing', 100),
+        ('a', 'hw1', 'api', 'rejected', 400),
+        ('a', 'hw1', 'api', 'reviewing', 500),
+        ('a', 'hw1', 'api', 'approved', 600),
+        ('b', 'hw2', 'bot', 'rejected', 50),
+    ]) == 5
+    assert log.append([('a', 'hw1', 'api', 'rejected', 400)]) == 0
+    assert log.history('a', 'hw1') == [
+        ('reviewing', 100), ('rejected', 400), ('reviewing', 500),
+        ('approved', 600)]
+    assert log.time_in_status('a', 'hw1') == 400
+    assert log.percentiles(quantiles=(50, 100)) == {50: 100, 100: 300}
+    assert log.counts_by_project() == {'api': 1, 'bot': 1}
+    assert log.counts_by_project(tenant='a') == {'api': 1}
+    assert log.percentiles('unknown') == {50: 0, 95: 0, 99: 0}
+
+
+def test_queries_stay_fast_on_large_log(log):
+    log.append([
+        (f't{index % 20}', f'hw{index}', f'p{index % 15}', status,
+         index * 10 + offset)
+        for index in range(3000)
+        for status, offset in (('reviewing', 0), ('rejected', 3),
+                               ('approved', 7))
+    ])
+    started = time.perf_counter()
+    assert log.percentiles()[50] == 3
+    assert sum(log.counts_by_project().values()) == 3000
+    assert log.time_in_status('t7', 'hw7') == 3
+    assert time.perf_counter() - started < 0.05
+
+
+def test_percentiles_read_histogram_not_spans(log, tmp_path):
+    log.append([('t', 'hw', 'p', 'reviewing', 0)])
+    log.connection.execute(
+        'WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n '
+        'WHERE i < 100000) INSERT INTO spans '
+        'SELECT 1, i % 5000, i, 0 FROM n'
+    )
+    started = time.perf_counter()
+    assert log.percentiles(quantiles=(1, 50, 100)) == {
+        1: 49, 50: 2400, 100: 4900}
+    assert time.perf_counter() - started < 0.01
+    log.connection.execute('DELETE FROM span_histogram')
+    reopened = EventLog(str(tmp_path / 'events.sqlite3'))
+    assert reopened.percentiles(quantiles=(50,)) == {50: 2400}
+
+
+def test_run_tick_records_status_events(api, log, tmp_path):
+    _, data = api
+    data['homeworks'] = [{'homework_name': 'hw', 'lesson_name': 'api',
+                          'status': 'reviewing',
+                          'date_updated': '2024-01-01T00:00:00Z'}]
+    store = StateStore(str(tmp_path / 'state.sqlite3'))
+    poller.run_tick(FakeBot(), store, [TENANT], {}, now=1000,
+                    event_log=log)
+    assert log.history('student', 'hw') == [('reviewing', 1704067200)]
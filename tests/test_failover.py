@@ -0,0 +1,88 @@
+import time
+
+import pytest
+import requests
+
+import homework
+import poller
+from exceptions import FencedError
+from failover import OUTBOX_OWNER, Leadership, announce
+from state import PRIORITY_INFO, StateStore, connect, transaction
+from tests.test_poller import TENANT, FakeBot, FakeResponse
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'state.sqlite3')
+
+
+def test_standby_takes_over_after_lease_expires(db_path):
+    primary = Leadership(connect(db_path), 'primary', ttl=15)
+    standby = Leadership(connect(db_path), 'standby', ttl=15)
+    assert primary.acquire(now=100)
+    assert not standby.acquire(now=110)
+    assert primary.acquire(now=112)
+    assert not standby.acquire(now=120)
+    assert standby.acquire(now=128)
+    assert standby.epoch == primary.epoch + 1
+
+
+def test_old_leader_is_fenced(db_path):
+    primary = Leadership(connect(db_path), 'primary', ttl=15)
+    standby = Leadership(connect(db_path), 'standby', ttl=15)
+    primary.acquire(now=100)
+    primary.check(now=101)
+    standby.acquire(now=200)
+    with pytest.raises(FencedError):
+        primary.check(now=201)
+    assert not primary.acquire(now=202)
+
+
+def test_release_hands_over_immediately(db_path):
+    primary = Leadership(connect(db_path), 'primary', ttl=15)
+    standby = Leadership(connect(db_path), 'standby', ttl=15)
+    primary.acquire(now=100)
+    primary.release()
+    assert standby.acquire(now=101)
+
+
+def test_renew_extends_lease_inside_a_transaction(db_path):
+    connection = connect(db_path)
+    primary = Leadership(connection, 'primary', ttl=15)
+    standby = Leadership(connect(db_path), 'standby', ttl=15)
+    primary.acquire(now=100)
+    with transaction(connection):
+        primary.renew(now=110)
+    assert not standby.acquire(now=120)
+    assert standby.acquire(now=126)
+    with pytest.raises(FencedError):
+        primary.renew(now=127)
+    assert primary.epoch is None
+
+
+def test_slow_tick_of_fenced_leader_leaves_nothing_behind(db_path,
+                                                          monkeypatch):
+    store = StateStore(db_path, owner=OUTBOX_OWNER)
+    primary = Leadership(store.connection, 'primary', ttl=15)
+    standby = Leadership(connect(db_path), 'standby', ttl=15)
+    primary.acquire()
+    states = {TENANT.name: poller.new_state(1000)}
+
+    def slow_request(*args, **kwargs):
+        standby.acquire(now=time.time() + 60)
+        return FakeResponse({'homeworks': [
+            {'homework_name': 'hw', 'status': 'approved'}
+        ], 'current_date': 2000})
+
+    monkeypatch.setattr(requests, 'get', slow_request)
+    with pytest.raises(FencedError):
+        poller.run_tick(FakeBot(), store, [TENANT], states, primary.renew)
+    assert store.pending() == []
+    assert store.load(TENANT.name) is None
+
+
+def test_new_leader_announces_start_at_info_priority(db_path, monkeypatch):
+    monkeypatch.setattr(homework, 'TELEGRAM_CHAT_ID', '7')
+    store = StateStore(db_path, owner=OUTBOX_OWNER)
+    announce(store, 'primary')
+    assert store.backlog() == {PRIORITY_INFO: 1}
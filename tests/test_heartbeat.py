@@ -0,0 +1,76 @@
+import json
+import urllib.error
+import urllib.request
+
+import heartbeat
+
+
+def make_watchdog(restarts):
+    return heartbeat.Watchdog(stage_timeout=10, restart_timeout=60,
+                              loop_timeout=600,
+                              restart=lambda: restarts.append(True))
+
+
+def test_stuck_stage_warns_then_restarts(monkeypatch, caplog):
+    now = [0.0]
+    monkeypatch.setattr(heartbeat.time, 'monotonic', lambda: now[0])
+    restarts = []
+    watchdog = make_watchdog(restarts)
+    watchdog.on_span('start', 'get_api_answer')
+    watchdog.on_span('start', 'http')
+    assert watchdog.check(now=5)['stuck'] == []
+    status = watchdog.check(now=20)
+    assert status['live']
+    assert status['stuck'] == [{'stage': 'http', 'seconds': 20}]
+    assert 'Этап http' in caplog.text
+    assert not restarts
+    assert not watchdog.check(now=61)['live']
+    assert restarts
+
+
+def test_finished_stages_are_forgotten():
+    watchdog = make_watchdog([])
+    watchdog.on_span('start', 'tick')
+    watchdog.on_span('end', 'tick')
+    assert watchdog._stages == {}
+
+
+def test_loop_without_activity_is_not_live(monkeypatch):
+    restarts = []
+    watchdog = make_watchdog(restarts)
+    watchdog.set_ready()
+    status = watchdog.check(now=watchdog.last_activity + 601)
+    assert status == {'live': False, 'ready': False, 'stuck': []}
+    assert restarts
+
+
+def test_health_endpoint_returns_cached_status():
+    watchdog = make_watchdog([])
+    server = heartbeat.serve_health(watchdog, '127.0.0.1', 0)
+    url = f'http://127.0.0.1:{server.server_port}'
+    try:
+        with urllib.request.urlopen(f'{url}/live') as response:
+            assert json.load(response)['live'] is True
+        try:
+            urllib.request.urlopen(f'{url}/ready')
+        except urllib.error.HTTPError as error:
+            assert error.code == 503
+        else:
+            raise AssertionError('/ready должен вернуть 503')
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_busy_health_port_does_not_stop_watchdog(monkeypatch, caplog):
+    monkeypatch.setattr(heartbeat.tracing, 'add_listener', lambda _: None)
+    first, second = make_watchdog([]), make_watchdog([])
+    second.run = lambda: None
+    server = heartbeat.serve_health(first, '127.0.0.1', 0)
+    try:
+        assert heartbeat.start_watchdog(second, server.server_port,
+                                        '127.0.0.1') is None
+        assert 'Не удалось запустить проверку здоровья' in caplog.text
+    finally:
+        server.shutdown()
+        server.server_close()
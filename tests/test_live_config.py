@@ -0,0 +1,90 @@
+import json
+
+import pytest
+
+import homework
+import live_config
+import poller
+from state import StateStore, TieredStates
+from tenants import Tenant
+from tests.test_poller import FakeOutbox, api  # noqa: F401
+
+
+@pytest.fixture
+def files(tmp_path):
+    config_path = tmp_path / 'config.json'
+    tenants_path = tmp_path / 'tenants.json'
+    config_path.write_text(json.dumps({'retry_period': 60}))
+    tenants_path.write_text(json.dumps([
+        {'name': 'a', 'token': 'ta', 'chat_id': 1},
+        {'name': 'b', 'token': 'tb', 'chat_id': 2},
+    ]))
+    return config_path, tenants_path
+
+
+def make_reloader(files):
+    config_path, tenants_path = files
+    return live_config.ConfigReloader(
+        lambda: live_config.load_config(config_path, tenants_path),
+        paths=files, interval=0
+    )
+
+
+def test_load_config_merges_verdicts_over_defaults(files):
+    config_path, tenants_path = files
+    config_path.write_text(json.dumps({'verdicts': {'approved': 'Принято'}}))
+    config = live_config.load_config(config_path, tenants_path)
+    assert config.retry_period == homework.RETRY_PERIOD
+    assert config.verdicts['approved'] == 'Принято'
+    assert config.verdicts['rejected'] == homework.HOMEWORK_VERDICTS[
+        'rejected']
+    assert [tenant.name for tenant in config.tenants] == ['a', 'b']
+
+
+def test_diff_tenants():
+    old = [Tenant('a', 't', 1), Tenant('b', 't', 2)]
+    new = [Tenant('b', 'new', 2), Tenant('c', 't', 3)]
+    assert live_config.diff_tenants(old, new) == (['c'], ['a'], ['b'])
+
+
+def test_file_change_swaps_config_and_keeps_removed_state(files, tmp_path):
+    config_path, tenants_path = files
+    store = StateStore(tmp_path / 'state.sqlite3')
+    states = TieredStates(store)
+    reloader = make_reloader(files)
+    states['a'] = poller.new_state(1000)
+    store.save({'a': states['a']})
+    before = reloader.current
+    tenants_path.write_text(json.dumps([
+        {'name': 'b', 'token': 'tb', 'chat_id': 2},
+        {'name': 'c', 'token': 'tc', 'chat_id': 3},
+    ]))
+    config = reloader.refresh(states)
+    assert config is not before
+    assert [tenant.name for tenant in config.tenants] == ['b', 'c']
+    assert 'a' not in states._hot
+    assert store.load('a')['timestamp'] == 1000
+    assert reloader.refresh(states) is config
+
+
+def test_broken_config_keeps_previous(files):
+    config_path, _ = files
+    reloader = make_reloader(files)
+    before = reloader.current
+    config_path.write_text('{')
+    assert reloader.refresh() is before
+    config_path.write_text(json.dumps({'retry_period': 30}))
+    reloader.request()
+    assert reloader.refresh().retry_period == 30
+
+
+def test_poll_tenant_uses_config_texts_and_period(api, files):
+    calls, data = api
+    data['homeworks'] = [{'homework_name': 'hw', 'status': 'approved'}]
+    config = live_config.Config((), 60, {'approved': 'Принято'})
+    outbox, state = FakeOutbox(), poller.new_state(1000)
+    poller.poll_tenant(outbox, Tenant('a', 't', 1), state, now=1000,
+                       config=config)
+    assert outbox.sent == [(1, 'Изменился статус проверки работы "hw".'
+                               'Принято')]
+    assert state['next_poll'] == 1060
@@ -0,0 +1,54 @@
+import json
+import logging
+import queue
+
+import log_config
+
+
+def make_record(message, level=logging.DEBUG):
+    return logging.LogRecord('test', level, __file__, 1, message, None, None)
+
+
+def test_sampling_filter_drops_repeats_and_counts_them(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(log_config.time, 'monotonic', lambda: now[0])
+    sampling = log_config.SamplingFilter(interval=60, burst=1)
+    assert sampling.filter(make_record('no changes'))
+    assert not sampling.filter(make_record('no changes'))
+    assert not sampling.filter(make_record('no changes'))
+    assert sampling.filter(make_record('other'))
+    assert sampling.filter(make_record('error', logging.ERROR))
+    assert sampling.filter(make_record('error', logging.ERROR))
+    now[0] = 61.0
+    record = make_record('no changes')
+    assert sampling.filter(record)
+    assert record.getMessage() == 'no changes (повторов: 2)'
+
+
+def test_json_formatter_includes_tenant():
+    record = make_record('hello')
+    with log_config.tenant_context('tenant-1'):
+        log_config.ContextFilter().filter(record)
+    data = json.loads(log_config.JsonFormatter().format(record))
+    assert data['message'] == 'hello'
+    assert data['tenant'] == 'tenant-1'
+
+
+def test_queue_handler_never_blocks_when_full():
+    handler = log_config.NonBlockingQueueHandler(queue.Queue(1))
+    handler.emit(make_record('first'))
+    handler.emit(make_record('second'))
+    assert handler.queue.qsize() == 1
+
+
+def test_file_handler_rotates_by_size(tmp_path):
+    path = tmp_path / 'main.log'
+    handler = log_config.SizedTimedRotatingFileHandler(
+        str(path), max_bytes=100, when='midnight', backupCount=5
+    )
+    for _ in range(10):
+        handler.emit(make_record('x' * 40))
+    handler.close()
+    rotated = [name for name in tmp_path.iterdir() if name != path]
+    assert len(rotated) >= 3
+    assert path.stat().st_size <= 100
@@ -0,0 +1,42 @@
+import metrics
+
+
+def test_percentiles_nearest_rank():
+    tracker = metrics.LatencyTracker('test_latency', slo=1000)
+    for seconds in range(1, 101):
+        tracker.observe(seconds)
+    assert tracker.percentile(50) == 50
+    assert tracker.percentile(95) == 95
+    assert tracker.percentile(99) == 99
+
+
+def test_window_is_bounded():
+    tracker = metrics.LatencyTracker('test_window', window=10)
+    for seconds in range(100):
+        tracker.observe(seconds)
+    assert len(tracker.samples) == 10
+    assert tracker.percentile(50) == 94
+
+
+def test_slo_alert_is_edge_triggered():
+    tracker = metrics.LatencyTracker('test_slo', slo=10)
+    assert tracker.observe(5) is None
+    assert tracker.observe(50) is not None
+    assert tracker.observe(60) is None
+    assert 'test_slo_slo_breaches_total 1' in metrics.render()
+
+
+def test_observe_homework_uses_date_updated():
+    tracker = metrics.LatencyTracker('test_homework', slo=1000)
+    homework = {'date_updated': '2021-04-11T10:31:09Z'}
+    now = metrics.parse_date(homework['date_updated']) + 42
+    tracker.observe_homework(homework, now=now)
+    assert tracker.percentile(50) == 42
+    assert tracker.observe_homework({}) is None
+
+
+def test_export_writes_file(tmp_path):
+    path = tmp_path / 'metrics.prom'
+    metrics.inc('test_export_total')
+    metrics.export(str(path))
+    assert 'test_export_total 1' in path.read_text(encoding='UTF-8')
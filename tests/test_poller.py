@@ -0,0 +1,134 @@
+from http import HTTPStatus
+
+import pytest
+import requests
+
+import cursor
+import metrics
+import poller
+from state import StateStore
+from tenants import Tenant
+
+TENANT = Tenant('student', 'token', 42)
+
+
+class FakeResponse:
+    status_code = HTTPStatus.OK
+
+    def __init__(self, data):
+        self.data = data
+
+    def json(self):
+        return self.data
+
+
+class FakeOutbox:
+    def __init__(self):
+        self.sent = []
+
+    def put(self, chat_id, text, updated=None, priority=0):
+        self.sent.append((chat_id, text))
+
+    def put_many(self, messages, fence=None):
+        for message in messages:
+            self.put(*message)
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    def send_message(self, chat_id, text):
+        self.sent.append((chat_id, text))
+
+
+@pytest.fixture
+def notify_latency(monkeypatch):
+    # Домашки в тестах обновлены годы назад: без бесконечной нормы первое
+    # же уведомление добавило бы в bot.sent оповещение о нарушении SLO.
+    tracker = metrics.LatencyTracker('notify_latency', slo=float('inf'))
+    monkeypatch.setattr(metrics, 'NOTIFY_LATENCY', tracker)
+    return tracker
+
+
+@pytest.fixture
+def api(monkeypatch):
+    calls = []
+    data = {'homeworks': [], 'current_date': 2000}
+
+    def fake_get(url, headers, params, **kwargs):
+        calls.append((headers, params))
+        return FakeResponse(data)
+
+    monkeypatch.setattr(requests, 'get', fake_get)
+    return calls, data
+
+
+def test_poll_tenant_queues_status_for_tenant_chat(api):
+    calls, data = api
+    data['homeworks'] = [{'homework_name': 'hw', 'status': 'approved'}]
+    outbox, state = FakeOutbox(), poller.new_state(1000)
+    poller.poll_tenant(outbox, TENANT, state, now=1000)
+    assert calls == [({'Authorization': 'OAuth token'},
+                      {'from_date': 1000 - cursor.CURSOR_OVERLAP})]
+    assert outbox.sent[0][0] == 42
+    assert 'hw' in outbox.sent[0][1]
+    assert state['timestamp'] == 2000
+    assert state['next_poll'] == 1000 + poller.homework.RETRY_PERIOD
+
+
+def test_poll_tenant_reports_same_error_once(api):
+    _, data = api
+    data.pop('homeworks')
+    outbox, state = FakeOutbox(), poller.new_state(1000)
+    poller.poll_tenant(outbox, TENANT, state, now=1000)
+    poller.poll_tenant(outbox, TENANT, state, now=2000)
+    assert len(outbox.sent) == 1
+    assert state['timestamp'] == 1000
+
+
+def test_poll_due_skips_tenants_not_due(api):
+    calls, _ = api
+    states = {}
+    assert list(poller.poll_due(FakeOutbox(), [TENANT], states,
+                                now=1000)) == ['student']
+    assert not poller.poll_due(FakeOutbox(), [TENANT], states, now=1001)
+    assert len(calls) == 1
+
+
+def test_run_tick_persists_state_and_flushes_outbox(api, tmp_path):
+    _, data = api
+    data['homeworks'] = [{'homework_name': 'hw', 'status': 'reviewing'}]
+    store = StateStore(str(tmp_path / 'state.sqlite3'))
+    bot = FakeBot()
+    assert poller.run_tick(bot, store, [TENANT], {}, now=1000) == ['student']
+    assert store.load('student')['timestamp'] == 2000
+    assert [chat_id for chat_id, _ in bot.sent] == ['42']
+    assert store.pending() == []
+
+
+def test_poll_due_polls_tenants_concurrently(api):
+    calls, data = api
+    data['homeworks'] = [{'homework_name': 'hw', 'status': 'approved'}]
+    tenants = [Tenant(f't{index}', f'token{index}', index)
+               for index in range(20)]
+    outbox, states = FakeOutbox(), {}
+    polled = poller.poll_due(outbox, tenants, states, now=1000, workers=4)
+    assert len(polled) == 20
+    assert len(calls) == 20
+    assert sorted(chat_id for chat_id, _ in outbox.sent) == list(range(20))
+
+
+def test_overlapping_window_does_not_resend_seen_changes(api):
+    calls, data = api
+    change = {'id': 7, 'homework_name': 'hw', 'status': 'approved',
+              'date_updated': '1970-01-01T00:33:10Z'}
+    data['homeworks'] = [change]
+    outbox, state = FakeOutbox(), poller.new_state(1000)
+    poller.poll_tenant(outbox, TENANT, state, now=1000)
+    poller.poll_tenant(outbox, TENANT, state, now=1600)
+    assert calls[1][1] == {'from_date': 2000 - cursor.CURSOR_OVERLAP}
+    assert len(outbox.sent) == 1
+    data['homeworks'] = [dict(change, status='rejected')]
+    poller.poll_tenant(outbox, TENANT, state, now=2200)
+    assert len(outbox.sent) == 2
@@ -0,0 +1,84 @@
+import threading
+import time
+
+import pytest
+import requests
+
+import homework
+import poller
+import practicum
+from exceptions import ApiAccessError
+from state import StateStore
+from tenants import Tenant
+from tests.test_poller import (FakeBot, FakeResponse,  # noqa: F401
+                               notify_latency)
+
+HOMEWORK = {'homework_name': 'hw1', 'status': 'approved',
+            'date_updated': '2024-01-02T00:00:00Z'}
+UPDATED = 1704153600
+
+
+class SlowSession:
+    def __init__(self):
+        self.threads = set()
+
+    def get(self, url, headers, params, timeout):
+        self.threads.add(threading.current_thread().name)
+        time.sleep(0.05)
+        if headers['Authorization'] == 'OAuth down':
+            raise requests.ConnectionError('down')
+        return FakeResponse({'homeworks': [], 'current_date': params[
+            'from_date']})
+
+
+def test_get_api_answer_uses_the_swappable_backend(monkeypatch):
+    backend = practicum.MemoryBackend(clock=lambda: UPDATED + 10)
+    backend.register('token', HOMEWORK)
+    monkeypatch.setattr(practicum, 'BACKEND', backend)
+    monkeypatch.setattr(homework, 'PRACTICUM_TOKEN', 'token')
+    assert homework.get_api_answer(UPDATED) == {
+        'homeworks': [HOMEWORK], 'current_date': UPDATED + 10}
+    assert homework.get_api_answer(UPDATED + 1)['homeworks'] == []
+    assert backend.calls == 2
+
+
+def test_memory_backend_refuses_unknown_and_failing_tokens():
+    backend = practicum.MemoryBackend()
+    backend.register('token')
+    client = practicum.PracticumClient('other', backend)
+    with pytest.raises(requests.HTTPError) as error:
+        client.homework_statuses(0)
+    assert error.value.response.status_code == 401
+    backend.fail('token', 503)
+    result = client.homework_statuses_many([('token', 0)])[0]
+    assert isinstance(result, requests.HTTPError)
+    assert result.response.status_code == 503
+    backend.fail('token')
+    assert client.homework_statuses_many([('token', 0)])[0]['homeworks'] == []
+
+
+def test_concurrent_backend_keeps_order_and_errors():
+    session = SlowSession()
+    client = practicum.PracticumClient(
+        'token', practicum.ConcurrentBackend(session, workers=8)
+    )
+    queries = [('token', number) for number in range(7)] + [('down', 7)]
+    started = time.monotonic()
+    results = client.homework_statuses_many(queries)
+    assert time.monotonic() - started < 0.3
+    assert len(session.threads) > 1
+    assert [result['current_date'] for result in results[:7]] == list(
+        range(7))
+    assert isinstance(results[7], ApiAccessError)
+
+
+def test_scheduler_runs_against_memory_backend(tmp_path, notify_latency):
+    backend = practicum.MemoryBackend(clock=lambda: UPDATED + 10)
+    backend.register('token', HOMEWORK)
+    bot = FakeBot()
+    store = StateStore(str(tmp_path / 'state.sqlite3'))
+    states = {'one': poller.new_state(UPDATED)}
+    poller.run_tick(bot, store, [Tenant('one', 'token', 5)], states,
+                    now=UPDATED, session=backend)
+    assert bot.sent == [('5', homework.parse_status(HOMEWORK))]
+    assert states['one']['timestamp'] == UPDATED + 10
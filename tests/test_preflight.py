@@ -0,0 +1,115 @@
+import requests
+
+import homework
+import poller
+import preflight
+from exceptions import TelegramApiError
+from state import StateStore
+from tenants import Tenant
+from tests.test_poller import FakeBot, FakeResponse
+
+GOOD = Tenant('good', 'good-token', 1)
+REVOKED = Tenant('revoked', 'revoked-token', 2)
+BLOCKED = Tenant('blocked', 'blocked-token', 3)
+
+
+class RefusedResponse:
+    status_code = 401
+
+    def raise_for_status(self):
+        raise requests.HTTPError('401 Unauthorized', response=self)
+
+
+class FakeSession:
+    def __init__(self):
+        self.calls = []
+        self.revoked = {'OAuth revoked-token'}
+
+    def get(self, url, headers, params, **kwargs):
+        self.calls.append(headers['Authorization'])
+        if headers['Authorization'] in self.revoked:
+            return RefusedResponse()
+        return FakeResponse({'homeworks': [], 'current_date': 2000})
+
+
+class CheckingBot(FakeBot):
+    def __init__(self):
+        super().__init__()
+        self.blocked = {BLOCKED.chat_id}
+        self.down = False
+
+    def get_chat(self, chat_id):
+        if self.down:
+            raise TelegramApiError('Telegram недоступен: Timeout')
+        if chat_id in self.blocked:
+            raise TelegramApiError(
+                'Telegram ответил 403: Forbidden: bot was blocked by the user',
+                error_code=403
+            )
+        return {'id': chat_id}
+
+
+def run_checks(checks):
+    while not checks._tasks.empty():
+        checks.check_tenant(checks._tasks.get_nowait())
+
+
+def test_broken_tenants_are_quarantined_and_not_polled(tmp_path,
+                                                       monkeypatch):
+    monkeypatch.setattr(homework, 'TELEGRAM_CHAT_ID', 'admin')
+    session, bot = FakeSession(), CheckingBot()
+    now = [1000]
+    checks = preflight.Preflight(bot, session, interval=60,
+                                 clock=lambda: now[0])
+    store = StateStore(str(tmp_path / 'state.sqlite3'))
+    tenants = [GOOD, REVOKED, BLOCKED]
+    states = {}
+    poller.run_tick(bot, store, tenants, states, now=1000, session=session,
+                    preflight=checks)
+    run_checks(checks)
+    session.calls.clear()
+    poller.run_tick(bot, store, tenants, states, now=2000, session=session,
+                    preflight=checks)
+    assert session.calls == ['OAuth good-token']
+    assert states['revoked']['next_poll'] == preflight.QUARANTINED
+    assert '401' in store.load('revoked')['quarantine']
+    assert 'blocked' in store.load('blocked')['quarantine']
+    alerts = [text for chat_id, text in bot.sent if chat_id == 'admin']
+    assert len(alerts) == 2
+
+    checks.schedule(tenants, now=1000 + 59)
+    assert checks._tasks.empty()
+    checks.schedule(tenants, now=1000 + 60)
+    assert [tenant.name for tenant in checks._tasks.queue] == ['good']
+
+
+def test_quarantine_backs_off_and_releases_repaired_tenant():
+    session, bot = FakeSession(), CheckingBot()
+    now = [0]
+    checks = preflight.Preflight(bot, session, clock=lambda: now[0])
+    states = {BLOCKED.name: poller.new_state(0)}
+    outbox = poller.MessageBuffer()
+    for strikes in (1, 2):
+        checks.schedule([BLOCKED], now=now[0])
+        run_checks(checks)
+        assert checks.apply(states, outbox)
+        assert checks._expires('blocked') == now[0] + (
+            preflight.QUARANTINE_PERIOD * strikes)
+        now[0] = checks._expires('blocked')
+    bot.blocked.clear()
+    checks.schedule([BLOCKED], now=now[0])
+    run_checks(checks)
+    checks.apply(states, outbox)
+    assert 'quarantine' not in states['blocked']
+    assert states['blocked']['next_poll'] == 0
+
+
+def test_transient_failures_do_not_quarantine():
+    session, bot = FakeSession(), CheckingBot()
+    bot.down = True
+    checks = preflight.Preflight(bot, session)
+    assert checks.check(BLOCKED) is None
+    bot.down = False
+    bot.blocked.clear()
+    assert checks.check(GOOD) is None
+    assert preflight.quarantine_period(20) == preflight.QUARANTINE_MAX
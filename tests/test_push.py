@@ -0,0 +1,127 @@
+import json
+import socket
+import urllib.error
+import urllib.request
+
+import pytest
+
+import homework
+import poller
+import practicum
+import push
+from state import StateStore
+from tenants import Tenant
+from tests.test_poller import FakeBot, notify_latency  # noqa: F401
+
+HOMEWORK = {'homework_name': 'hw1', 'status': 'approved',
+            'date_updated': '2024-01-02T00:00:00Z'}
+UPDATED = 1704153600
+PUSHED = Tenant('pushed', 'token', 5, push=True)
+
+
+def post(url, payload, token=None):
+    request = urllib.request.Request(url, json.dumps(payload).encode(),
+                                     method='POST')
+    if token is not None:
+        request.add_header('Authorization', f'Bearer {token}')
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status
+    except urllib.error.HTTPError as error:
+        return error.code
+
+
+def test_endpoint_validates_events_and_token():
+    ingest = push.Ingest(token='secret', size=1)
+    ingest.update([PUSHED, Tenant('polled', 'other', 6)])
+    server = push.serve_push(ingest, '127.0.0.1', 0)
+    url = f'http://127.0.0.1:{server.server_port}/push'
+    try:
+        assert post(f'{url}/pushed', HOMEWORK) == 401
+        assert post(f'{url}/polled', HOMEWORK, 'secret') == 404
+        assert post(f'{url}/pushed', {'homeworks': 'hw1'}, 'secret') == 400
+        assert post(f'{url}/pushed', [dict(HOMEWORK, status='lost')],
+                    'secret') == 400
+        undated = dict(HOMEWORK)
+        del undated['date_updated']
+        assert post(f'{url}/pushed', undated, 'secret') == 400
+        assert post(f'{url}/pushed', {'homeworks': [HOMEWORK],
+                                      'current_date': UPDATED},
+                    'secret') == 202
+        assert post(f'{url}/pushed', HOMEWORK, 'secret') == 503
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_pushed_status_is_sent_once_and_reconciled_later(tmp_path,
+                                                        notify_latency):
+    backend = practicum.MemoryBackend(clock=lambda: UPDATED + 10)
+    backend.register('token')
+    bot = FakeBot()
+    store = StateStore(str(tmp_path / 'state.sqlite3'))
+    states = {'pushed': poller.new_state(UPDATED - 60)}
+    ingest = push.Ingest(reconcile=3600)
+    ingest.update([PUSHED])
+    assert ingest.submit('pushed', HOMEWORK) == 202
+    assert ingest.submit('pushed', HOMEWORK) == 202
+    poller.run_tick(bot, store, [PUSHED], states, now=UPDATED,
+                    session=backend, ingest=ingest)
+    assert bot.sent == [('5', homework.parse_status(HOMEWORK))]
+    assert states['pushed']['timestamp'] == UPDATED + 10
+    assert states['pushed']['next_poll'] == UPDATED + 3600
+    assert backend.calls == 1
+
+    backend.register('token', HOMEWORK)
+    poller.run_tick(bot, store, [PUSHED], states, now=UPDATED + 600,
+                    session=backend, ingest=ingest)
+    assert backend.calls == 1
+    poller.run_tick(bot, store, [PUSHED], states, now=UPDATED + 3600,
+                    session=backend, ingest=ingest)
+    assert backend.calls == 2
+    assert bot.sent == [('5', homework.parse_status(HOMEWORK))]
+
+
+def test_pushes_for_bootstrapping_tenants_are_dropped():
+    ingest = push.Ingest()
+    ingest.update([PUSHED])
+    ingest.submit('pushed', HOMEWORK)
+    state = dict(poller.new_state(UPDATED), bootstrap=True)
+    outbox = poller.MessageBuffer()
+    assert ingest.apply({'pushed': state}, outbox) == {}
+    assert outbox.messages == []
+
+
+@pytest.fixture
+def started_push():
+    ingest = push.start_push([PUSHED, Tenant('polled', 'other', 6)], port=0)
+    yield ingest
+    ingest.close()
+
+
+def test_push_is_accepted_before_the_first_tick(started_push):
+    ingest = started_push
+    assert list(ingest.tenants) == ['pushed']
+    assert ingest.submit('pushed', HOMEWORK) == 202
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def test_push_moves_to_the_new_leader_after_takeover():
+    port = free_port()
+    old = push.follow_leader(None, True, [PUSHED], port)
+    assert push.follow_leader(None, False, [PUSHED], port) is None
+    assert push.follow_leader(None, True, [PUSHED], port) is None
+    assert push.follow_leader(old, False, [PUSHED], port) is None
+    new = push.follow_leader(None, True, [PUSHED], port)
+    try:
+        assert post(f'http://127.0.0.1:{port}/push/pushed', HOMEWORK) == 202
+        assert new.apply({'pushed': poller.new_state(UPDATED)},
+                         poller.MessageBuffer()) != {}
+        assert push.follow_leader(new, True, [PUSHED], port) is new
+    finally:
+        new.close()
@@ -0,0 +1,40 @@
+import connections
+import run_once
+import sender
+import transport
+from state import StateStore
+
+
+class FakeBot:
+    sent = []
+
+    def __init__(self, token=None):
+        pass
+
+    def send_message(self, chat_id, text):
+        FakeBot.sent.append((chat_id, text))
+
+
+def test_run_once_polls_persists_and_exits(monkeypatch, tmp_path):
+    from tests.test_poller import FakeResponse
+
+    class FakeSession:
+        def get(self, *args, **kwargs):
+            return FakeResponse(data)
+
+    data = {'homeworks': [{'homework_name': 'hw', 'status': 'approved'}],
+            'current_date': 2000}
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(connections, 'get_session', FakeSession)
+    monkeypatch.setattr(transport, 'TelegramTransport', FakeBot)
+    waits = []
+    limiter = sender.RateLimiter()
+    monkeypatch.setattr(limiter, 'wait',
+                        lambda chat_id, deadline=None: waits.append(chat_id)
+                        or True)
+    monkeypatch.setattr(sender, 'LIMITER', limiter)
+    assert run_once.run_once() == ['default']
+    assert len(FakeBot.sent) == 1
+    assert len(waits) == 1
+    assert StateStore().load('default')['timestamp'] == 2000
+    assert run_once.run_once() == []
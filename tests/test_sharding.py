@@ -0,0 +1,101 @@
+import pytest
+
+import heartbeat
+import log_config
+import sharding
+from exceptions import FencedError
+from tenants import Tenant
+
+
+def test_ring_moves_only_tenants_of_removed_worker():
+    keys = [f'tenant-{index}' for index in range(1000)]
+    before = sharding.HashRing(['w0', 'w1', 'w2', 'w3'])
+    after = sharding.HashRing(['w0', 'w1', 'w3'])
+    moved = [key for key in keys if before.owner(key) != after.owner(key)]
+    assert moved
+    assert all(before.owner(key) == 'w2' for key in moved)
+    counts = [sum(before.owner(key) == node for key in keys)
+              for node in ('w0', 'w1', 'w2', 'w3')]
+    assert min(counts) > 150
+
+
+def test_lease_is_exclusive_until_expired(tmp_path):
+    path = str(tmp_path / 'coord.sqlite3')
+    first = sharding.LeaseRegistry('w0', path, ttl=30)
+    second = sharding.LeaseRegistry('w1', path, ttl=30)
+    assert first.claim(['a', 'b'], now=100) == {'a', 'b'}
+    assert second.claim(['b'], now=110) == set()
+    assert second.claim(['b'], now=131) == {'b'}
+    assert first.claim(['a', 'b'], now=132) == {'a'}
+
+
+def test_shards_are_disjoint_and_rebalanced(tmp_path):
+    path = str(tmp_path / 'coord.sqlite3')
+    tenants = [Tenant(f't{index}', 'token', 1) for index in range(50)]
+    first = sharding.LeaseRegistry('w0', path, ttl=30)
+    second = sharding.LeaseRegistry('w1', path, ttl=30)
+    first.heartbeat(now=100)
+    second.heartbeat(now=100)
+    owned_first = sharding.owned_tenants(first, tenants, now=100)
+    owned_second = sharding.owned_tenants(second, tenants, now=100)
+    assert set(owned_first).isdisjoint(owned_second)
+    assert len(owned_first) + len(owned_second) == len(tenants)
+    assert len(sharding.owned_tenants(first, tenants, now=200)) == 50
+
+
+def test_renew_extends_tenant_leases_and_fences_lost_ones(tmp_path):
+    path = str(tmp_path / 'coord.sqlite3')
+    first = sharding.LeaseRegistry('w0', path, ttl=30)
+    second = sharding.LeaseRegistry('w1', path, ttl=30)
+    first.claim(['a', 'b'], now=100)
+    first.renew(['a', 'b'], now=125)
+    assert second.claim(['a'], now=140) == set()
+    assert second.claim(['a'], now=156) == {'a'}
+    with pytest.raises(FencedError):
+        first.renew(['a', 'b'], now=157)
+
+
+def lease_expiry(registry, name):
+    return registry.connection.execute(
+        'SELECT expires FROM tenant_leases WHERE tenant = ?', (name,)
+    ).fetchone()[0]
+
+
+def test_fence_only_checks_leases_until_half_ttl(tmp_path):
+    path = str(tmp_path / 'coord.sqlite3')
+    first = sharding.LeaseRegistry('w0', path, ttl=30)
+    first.claim(['a', 'b'], now=100)
+    first.fence(['a', 'b'], now=110)
+    assert lease_expiry(first, 'a') == 130
+    first.fence(['a', 'b'], now=115)
+    assert lease_expiry(first, 'a') == 145
+    first.connection.execute(
+        "UPDATE tenant_leases SET worker_id = 'w1' WHERE tenant = 'a'"
+    )
+    first.connection.commit()
+    with pytest.raises(FencedError):
+        first.fence(['a', 'b'], now=120)
+
+
+def test_stuck_worker_exits_instead_of_reexec(monkeypatch):
+    calls = []
+    monkeypatch.setattr(heartbeat, 'WATCHDOG', heartbeat.Watchdog(
+        stage_timeout=10, restart_timeout=60, loop_timeout=600
+    ))
+    monkeypatch.setattr(heartbeat, 'start_watchdog',
+                        lambda watchdog, port: None)
+    monkeypatch.setattr(log_config, 'stop_logging', lambda: None)
+    monkeypatch.setattr(heartbeat.os, 'execv',
+                        lambda *args: calls.append('execv'))
+    monkeypatch.setattr(heartbeat.os, '_exit',
+                        lambda code: calls.append(('exit', code)))
+    sharding.start_worker_watchdog()
+    watchdog = heartbeat.WATCHDOG
+    watchdog.check(now=watchdog.last_activity + 601)
+    assert calls == [('exit', 1)]
+
+
+def test_workers_export_to_their_own_files():
+    assert sharding.worker_file('/var/lib/bot/metrics.prom', 'w1') == (
+        '/var/lib/bot/metrics-w1.prom')
+    assert sharding.worker_file(None, 'w1') is None
@@ -0,0 +1,81 @@
+import time
+
+import pytest
+
+import poller
+import sender
+import shutdown
+from state import StateStore
+from tests.test_poller import TENANT, FakeBot, FakeOutbox, api  # noqa: F401
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_limiter_spaces_messages_per_chat_and_overall():
+    clock = FakeClock()
+    limiter = sender.RateLimiter(rate=10, chat_interval=1, clock=clock,
+                                 sleep=clock.sleep)
+    assert limiter.wait(1)
+    assert limiter.wait(2)
+    assert clock.now == pytest.approx(100.1)
+    assert limiter.wait(1)
+    assert clock.now == pytest.approx(101)
+    assert not limiter.wait(1, deadline=101.5)
+    assert clock.now == pytest.approx(101)
+
+
+def test_drain_stops_at_deadline_and_keeps_the_rest(tmp_path):
+    store = StateStore(str(tmp_path / 'state.sqlite3'))
+    for text in ('first', 'second', 'third'):
+        store.put(1, text)
+    limiter = sender.RateLimiter(chat_interval=60)
+    bot = FakeBot()
+    assert sender.drain_outbox(bot, store, time.monotonic() + 1,
+                               limiter=limiter) == 1
+    assert bot.sent == [('1', 'first')]
+    assert [text for _, _, text, _, _ in store.pending()] == [
+        'second', 'third']
+
+
+def test_backlog_flush_stops_at_shutdown_deadline(tmp_path, monkeypatch):
+    stop = shutdown.Shutdown(drain_deadline=0)
+    monkeypatch.setattr(shutdown, 'SHUTDOWN', stop)
+    store = StateStore(str(tmp_path / 'state.sqlite3'))
+    store.put(1, 'first')
+    stop.request()
+    bot = FakeBot()
+    assert sender.flush_backlog(bot, store, budget=60) == 0
+    assert bot.sent == []
+    assert len(store.pending()) == 1
+
+
+def test_no_new_polls_after_shutdown_request(api, monkeypatch):
+    calls, _ = api
+    stop = shutdown.Shutdown()
+    monkeypatch.setattr(shutdown, 'SHUTDOWN', stop)
+    states = {}
+    stop.request()
+    polled = poller.poll_due(FakeOutbox(), [TENANT], states, now=1000)
+    assert calls == []
+    assert polled['student']['next_poll'] == 0
+
+
+def test_signal_while_idle_exits_at_once():
+    stop = shutdown.Shutdown(drain_deadline=5)
+    with stop.idle():
+        with pytest.raises(SystemExit):
+            stop.request()
+    assert stop.requested
+    assert stop.wait(0)
+    with pytest.raises(SystemExit):
+        with stop.idle():
+            pass
@@ -0,0 +1,42 @@
+import soak
+
+
+class LeakyPracticum(soak.PracticumStandIn):
+    def __init__(self, clock):
+        super().__init__(clock)
+        self.history = []
+
+    def get(self, *args, **kwargs):
+        response = super().get(*args, **kwargs)
+        self.history.append(dict(response.data))
+        return response
+
+
+def test_main_loop_keeps_memory_flat(capsys):
+    assert soak.main(['--cycles', '200', '--warmup', '50', '--samples', '2',
+                      '--no-log']) == 0
+    output = capsys.readouterr().out
+    assert 'Циклов: 200.' in output
+    assert 'границе' not in output
+
+
+def test_leak_is_reported_with_its_call_site():
+    run = soak.Soak(cycles=200, warmup=20, samples=4)
+    clock = soak.VirtualClock(run, start=1_700_000_000)
+    api = soak.run_main(run, clock, LeakyPracticum(clock))
+    report = run.report()
+    assert api.requests == 220
+    assert len(run.samples) == 5
+    failures = soak.check_bounds(report, objects_bound=100)
+    assert failures and 'объектов' in failures[0]
+    assert __file__ in str(report.top[0].traceback)
+
+
+def test_scheduler_ticks_run_on_virtual_clock(tmp_path):
+    run = soak.Soak(cycles=10, warmup=5, samples=2)
+    clock = soak.VirtualClock(run, start=1_700_000_000)
+    api = soak.run_ticks(run, clock, str(tmp_path), tenants=4)
+    report = run.report()
+    assert api.requests == 4 * 15
+    assert report.cycles == 10
+    assert clock.now == 1_700_000_000 + 15 * soak.homework.RETRY_PERIOD
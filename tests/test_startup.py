@@ -0,0 +1,31 @@
+import subprocess
+import sys
+
+import startup_bench
+
+SAMPLE = """import time: self [us] | cumulative | imported package
+import time:       100 |        100 |   _io
+import time:       300 |        400 | homework
+import time:        50 |         50 | settings
+"""
+
+
+def test_parse_importtime():
+    records = startup_bench.parse_importtime(SAMPLE)
+    assert records == [('_io', 100, 100, 2), ('homework', 300, 400, 0),
+                       ('settings', 50, 50, 0)]
+
+
+def test_homework_import_does_not_load_heavy_dependencies():
+    code = ('import sys, homework; '
+            'print(sorted({"requests", "telebot", "dotenv"} '
+            '& set(sys.modules)))')
+    result = subprocess.run([sys.executable, '-c', code],
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == '[]'
+
+
+def test_budget_is_enforced(capsys):
+    assert startup_bench.main(['--budget-ms', '100000', 'settings']) == 0
+    assert startup_bench.main(['--budget-ms', '0', 'homework']) == 1
+    assert 'бюджет' in capsys.readouterr().out
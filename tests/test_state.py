@@ -0,0 +1,176 @@
+import pytest
+
+import sender
+from exceptions import FencedError, TelegramApiError
+from state import (PRIORITY_ALERT, PRIORITY_INFO, PRIORITY_STATUS,
+                   StateStore, TieredStates, connect)
+
+
+class FailingBot:
+    def send_message(self, chat_id, text):
+        raise RuntimeError('blocked')
+
+
+class ThrottledBot:
+    def __init__(self, error_code=429, retry_after=7):
+        self.error = TelegramApiError('limited', retry_after, error_code)
+        self.sent = []
+
+    def send_message(self, chat_id, text):
+        if self.error is not None:
+            raise self.error
+        self.sent.append((chat_id, text))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return StateStore(str(tmp_path / 'state.sqlite3'), owner='w0')
+
+
+def test_state_roundtrip(store):
+    store.save({'a': {'timestamp': 1}, 'b': {'timestamp': 2}})
+    assert store.load('a') == {'timestamp': 1}
+    assert store.load('missing') is None
+    assert set(store.load_all()) == {'a', 'b'}
+
+
+def test_fenced_save_is_rolled_back(store):
+    def fence():
+        raise FencedError('fenced')
+
+    with pytest.raises(FencedError):
+        store.save({'a': {'timestamp': 1}}, fence)
+    assert store.load('a') is None
+    with pytest.raises(FencedError):
+        store.put_many([(1, 'status', None, PRIORITY_STATUS)], fence)
+    assert store.pending() == []
+    states = TieredStates(store, capacity=1, fence=fence)
+    states['a'] = {'timestamp': 1}
+    with pytest.raises(FencedError):
+        states['b'] = {'timestamp': 2}
+    assert store.load('a') is None
+
+
+def test_outbox_keeps_message_until_sent(store):
+    store.put(1, 'hello')
+    assert sender.flush_outbox(FailingBot(), store) == 0
+    assert len(store.pending()) == 1
+    assert store.pending()[0][-1] == 1
+
+
+def test_rate_limit_pauses_sending_without_spending_attempts(store):
+    store.put(1, 'hello')
+    store.put(2, 'world')
+    now, slept = [100.0], []
+
+    def sleep(seconds):
+        slept.append(seconds)
+        now[0] += seconds
+
+    limiter = sender.RateLimiter(rate=1000, clock=lambda: now[0],
+                                 sleep=sleep)
+    bot = ThrottledBot()
+    for _ in range(sender.OUTBOX_MAX_ATTEMPTS + 1):
+        assert sender.flush_outbox(bot, store, limiter=limiter, workers=1) == 0
+    assert [row[-1] for row in store.pending()] == [0, 0]
+    assert slept[0] == pytest.approx(7)
+    bot.error = None
+    assert sender.flush_outbox(bot, store, limiter=limiter) == 2
+
+
+def test_permanent_telegram_errors_spend_attempts(store):
+    store.put(1, 'hello')
+    sender.flush_outbox(ThrottledBot(403, None), store)
+    assert store.pending()[0][-1] == 1
+
+
+def test_outbox_drops_message_after_max_attempts(store, monkeypatch):
+    monkeypatch.setattr(sender, 'OUTBOX_MAX_ATTEMPTS', 2)
+    store.put(1, 'hello')
+    sender.flush_outbox(FailingBot(), store)
+    sender.flush_outbox(FailingBot(), store)
+    assert store.pending() == []
+
+
+def test_outbox_is_per_owner(store, tmp_path):
+    other = StateStore(str(tmp_path / 'state.sqlite3'), owner='w1')
+    other.put(1, 'hello')
+    assert store.pending() == []
+
+
+def test_tiered_states_evicts_to_disk_and_reloads(store):
+    states = TieredStates(store, capacity=2)
+    for name in ('a', 'b', 'c'):
+        states[name] = {'timestamp': 1, 'next_poll': 10}
+    assert len(states._hot) == 2
+    assert store.load('a') == {'timestamp': 1, 'next_poll': 10}
+    assert states.next_poll('a') == 10
+    states['a']['timestamp'] = 2
+    assert 'a' in states._hot and 'b' not in states._hot
+    assert store.load('b') is not None
+    assert len(states) == 3
+
+
+def test_tiered_states_knows_disk_tenants_on_start(store):
+    store.save({'a': {'timestamp': 5, 'next_poll': 100}})
+    states = TieredStates(store, capacity=10)
+    assert 'a' in states
+    assert states.next_poll('a') == 100
+    assert not states._hot
+    assert states['a']['timestamp'] == 5
+    assert 'missing' not in states
+
+
+def test_tiered_states_discard_rereads_disk(store):
+    states = TieredStates(store, capacity=10)
+    states['a'] = {'timestamp': 1, 'next_poll': 0}
+    store.save({'a': {'timestamp': 7, 'next_poll': 0}})
+    states.discard('a')
+    assert states['a']['timestamp'] == 7
+
+
+def test_pending_is_ordered_by_priority(store):
+    store.put(1, 'info', priority=PRIORITY_INFO)
+    store.put(1, 'alert', priority=PRIORITY_ALERT)
+    store.put(1, 'status')
+    assert [text for _, _, text, _, _ in store.pending()] == [
+        'status', 'alert', 'info']
+
+
+def test_overload_sheds_low_priorities_first(store):
+    store.put_many([(1, f'alert {index}', None, PRIORITY_ALERT)
+                    for index in range(3)])
+    store.put_many([(2, 'info', None, PRIORITY_INFO)] * 3)
+    store.put_many([(1, 'status', None, PRIORITY_STATUS)] * 3)
+    policy = sender.parse_shed_policy('alert=summarize, info=drop')
+    assert sender.shed_overload(store, high_water=6, policy=policy) == 3
+    assert store.backlog() == {PRIORITY_STATUS: 3, PRIORITY_ALERT: 3}
+    assert sender.shed_overload(store, high_water=4, policy=policy) == 2
+    texts = [text for _, _, text, _, _ in store.pending()]
+    assert texts == ['status'] * 3 + [
+        'alert 2\nПропущено похожих сообщений: 2.']
+    store.put_many([(1, 'alert 3', None, PRIORITY_ALERT)] * 2)
+    assert store.summarize(PRIORITY_ALERT) == 2
+    assert store.pending()[-1][2] == (
+        'alert 3\nПропущено похожих сообщений: 4.')
+
+
+def test_status_messages_cannot_be_shed():
+    with pytest.raises(ValueError):
+        sender.parse_shed_policy('status=drop')
+
+
+def test_old_outbox_gets_priority_column(tmp_path):
+    path = str(tmp_path / 'old.sqlite3')
+    connection = connect(path)
+    connection.executescript(
+        'CREATE TABLE outbox (id INTEGER PRIMARY KEY AUTOINCREMENT, '
+        'owner TEXT NOT NULL, chat_id TEXT NOT NULL, text TEXT NOT NULL, '
+        'created REAL NOT NULL, updated REAL, '
+        'attempts INTEGER NOT NULL DEFAULT 0);'
+        "INSERT INTO outbox (owner, chat_id, text, created) "
+        "VALUES ('default', '1', 'queued', 0);"
+    )
+    store = StateStore(path)
+    store.put(1, 'info', priority=PRIORITY_INFO)
+    assert store.backlog() == {PRIORITY_STATUS: 1, PRIORITY_INFO: 1}
@@ -0,0 +1,98 @@
+import json
+import threading
+import time
+
+import poller
+import sender
+from state import StateStore
+from subscriptions import Subscription, parse_subscriptions, recipients
+from tenants import Tenant, load_tenants
+from tests.test_poller import FakeOutbox, api  # noqa: F401
+
+HOMEWORK = {'homework_name': 'user__hw_api.zip', 'lesson_name': 'hw_api',
+            'status': 'approved'}
+
+
+class SlowBot:
+    def __init__(self, delay=0.01):
+        self.delay = delay
+        self.sent = []
+        self.lock = threading.Lock()
+
+    def send_message(self, chat_id, text):
+        time.sleep(self.delay)
+        with self.lock:
+            self.sent.append((chat_id, text))
+
+
+def test_recipients_apply_filters_and_skip_duplicates():
+    tenant = Tenant('a', 't', 1, parse_subscriptions([
+        {'chat_id': 2},
+        {'chat_id': 3, 'statuses': ['rejected']},
+        {'chat_id': 4, 'projects': ['hw_api'], 'statuses': ['approved']},
+        {'chat_id': 5, 'projects': ['hw_bot']},
+        {'chat_id': 1},
+    ]))
+    assert recipients(tenant, HOMEWORK) == [1, 2, 4]
+
+
+def test_load_tenants_reads_subscribers(tmp_path):
+    path = tmp_path / 'tenants.json'
+    path.write_text(json.dumps([{
+        'name': 'a', 'token': 't', 'chat_id': 1,
+        'subscribers': [{'chat_id': 2, 'statuses': ['approved']}],
+    }]))
+    tenant, = load_tenants(str(path))
+    assert tenant.subscribers == (
+        Subscription(2, frozenset({'approved'})),
+    )
+
+
+def test_status_is_fanned_out_but_errors_go_to_owner(api):
+    calls, data = api
+    tenant = Tenant('a', 't', 1, tuple(Subscription(chat_id)
+                                       for chat_id in range(2, 5)))
+    data['homeworks'] = [HOMEWORK]
+    outbox = FakeOutbox()
+    poller.poll_tenant(outbox, tenant, poller.new_state(1000), now=1000)
+    assert [chat_id for chat_id, _ in outbox.sent] == [1, 2, 3, 4]
+    assert len({text for _, text in outbox.sent}) == 1
+    del data['current_date']
+    outbox = FakeOutbox()
+    poller.poll_tenant(outbox, tenant, poller.new_state(1000), now=1000)
+    assert [chat_id for chat_id, _ in outbox.sent] == [1]
+
+
+def test_fan_out_is_sent_in_parallel(tmp_path):
+    store = StateStore(str(tmp_path / 'state.sqlite3'))
+    store.put_many([(chat_id, 'event', None, 0) for chat_id in range(200)])
+    bot = SlowBot()
+    limiter = sender.RateLimiter(rate=10000)
+    started = time.monotonic()
+    assert sender.flush_outbox(bot, store, limit=200, limiter=limiter,
+                               workers=20) == 200
+    assert time.monotonic() - started < 200 * bot.delay / 4
+    assert store.pending() == []
+
+
+def test_parallel_send_keeps_order_within_chat(tmp_path):
+    store = StateStore(str(tmp_path / 'state.sqlite3'))
+    store.put_many([(chat_id, f'{chat_id}-{index}', None, 0)
+                    for index in range(3) for chat_id in range(4)])
+    bot = SlowBot(delay=0)
+    sender.flush_outbox(bot, store, workers=4)
+    for chat_id in map(str, range(4)):
+        assert [text for chat, text in bot.sent if chat == chat_id] == [
+            f'{chat_id}-{index}' for index in range(3)]
+
+
+def test_fan_out_backlog_is_flushed_within_one_tick(tmp_path):
+    store = StateStore(str(tmp_path / 'state.sqlite3'))
+    store.put_many([(chat_id, 'event', None, 0) for chat_id in range(350)])
+    bot = SlowBot(delay=0)
+    poller.run_tick(bot, store, [], {}, limiter=sender.RateLimiter(
+        rate=10000))
+    assert len(bot.sent) == 350
+    assert store.pending() == []
+    store.put_many([(chat_id, 'event', None, 0) for chat_id in range(3)])
+    assert sender.flush_backlog(bot, store, budget=0) == 0
@@ -0,0 +1,51 @@
+import json
+import threading
+import time
+
+import tracing
+
+
+def test_span_records_trace_event(tmp_path):
+    path = tmp_path / 'trace.json'
+    with tracing.span('stage', tenant='t1'):
+        pass
+    tracing.export(str(path))
+    lines = path.read_text(encoding='UTF-8').splitlines()
+    assert lines[0] == '['
+    events = [json.loads(line.rstrip(',')) for line in lines[1:]]
+    event = events[-1]
+    assert event['name'] == 'stage'
+    assert event['ph'] == 'X'
+    assert event['args'] == {'tenant': 't1'}
+
+
+def test_traced_keeps_signature_and_notifies_listeners():
+    calls = []
+    tracing.add_listener(lambda event, name: calls.append((event, name)))
+
+    @tracing.traced
+    def stage(value):
+        """Этап."""
+        return value * 2
+
+    assert stage(2) == 4
+    assert stage.__doc__ == 'Этап.'
+    assert ('start', 'stage') in calls and ('end', 'stage') in calls
+    tracing._listeners.clear()
+
+
+def test_profiler_samples_running_thread():
+    stop = threading.Event()
+
+    def busy_worker():
+        while not stop.is_set():
+            time.monotonic()
+
+    worker = threading.Thread(target=busy_worker)
+    worker.start()
+    profiler = tracing.SamplingProfiler(interval=0.001)
+    samples = profiler.sample(worker.ident, 0.05)
+    stop.set()
+    worker.join()
+    assert samples
+    assert any('busy_worker' in stack for stack in samples)
@@ -0,0 +1,72 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+import homework
+import send_bench
+from exceptions import TelegramApiError
+from transport import TelegramTransport
+
+
+class LimitedHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        answer = json.dumps({
+            'ok': False, 'error_code': 429,
+            'description': 'Too Many Requests',
+            'parameters': {'retry_after': 7},
+        }).encode()
+        self.send_response(429)
+        self.send_header('Content-Length', str(len(answer)))
+        self.end_headers()
+        self.wfile.write(answer)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub():
+    server = send_bench.StubTelegram(latency=0).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_transport_sends_over_shared_connections(stub):
+    bot = TelegramTransport('1:secret', base_url=stub.base_url, pool_size=4)
+    rate, p99 = send_bench.bench(bot, messages=40, concurrency=4, batch=20)
+    assert rate > 0 and p99 >= 0
+    assert len(stub.received) == 40
+    assert stub.connections <= 4
+    result = bot.send_message(7, 'Привет', parse_mode='HTML')
+    assert result['chat']['id'] == 7
+    assert stub.received[-1] == {'chat_id': 7, 'text': 'Привет',
+                                 'parse_mode': 'HTML'}
+
+
+def test_transport_reports_api_refusal_with_retry_after():
+    server = HTTPServer(('127.0.0.1', 0), LimitedHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    bot = TelegramTransport(
+        '1:secret', base_url=f'http://127.0.0.1:{server.server_port}/'
+    )
+    try:
+        with pytest.raises(TelegramApiError) as error:
+            bot.send_message(1, 'text')
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert error.value.retry_after == 7
+    assert error.value.error_code == 429
+    assert '429' in str(error.value)
+
+
+def test_network_error_does_not_leak_token(caplog):
+    bot = TelegramTransport('1:secret', base_url='http://127.0.0.1:9/',
+                            timeout=(0.5, 0.5))
+    assert homework.send_to_chat(bot, 1, 'text') is False
+    assert 'secret' not in caplog.text
+    assert 'Telegram недоступен' in caplog.text
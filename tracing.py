@@ -0,0 +1,170 @@
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from functools import wraps
+
+import metrics
+from settings import env
+
+logger = logging.getLogger(__name__)
+
+TRACE_FILE = env('TRACE_FILE')
+TRACE_BUFFER = env('TRACE_BUFFER', 10000, int)
+PROFILE_SECONDS = env('PROFILE_SECONDS', 30, int)
+PROFILE_INTERVAL = env('PROFILE_INTERVAL', 0.005, float)
+PROFILE_DIR = env('PROFILE_DIR', '.')
+
+_events = deque(maxlen=TRACE_BUFFER)
+_listeners = []
+
+
+def add_listener(listener):
+    """Подписывает обработчик на начало и конец каждого спана."""
+    _listeners.append(listener)
+
+
+def _notify(event, name):
+    for listener in _listeners:
+        listener(event, name)
+
+
+@contextmanager
+def span(name, **attrs):
+    """Замеряет этап цикла и сохраняет его в формате Trace Event."""
+    _notify('start', name)
+    start_ts = time.time_ns() // 1000
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        _events.append({
+            'name': name,
+            'ph': 'X',
+            'ts': start_ts,
+            'dur': int(duration * 1_000_000),
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            'args': attrs,
+        })
+        metrics.set_gauge(f'span_duration_seconds{{span="{name}"}}',
+                          round(duration, 6))
+        _notify('end', name)
+
+
+def traced(func):
+    """Оборачивает функцию в спан с её именем."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with span(func.__name__):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def export(path=TRACE_FILE):
+    """Дописывает накопленные спаны в файл для chrome://tracing."""
+    if not path:
+        _events.clear()
+        return
+    events = []
+    while _events:
+        events.append(_events.popleft())
+    if not events:
+        return
+    try:
+        is_new = not os.path.exists(path) or not os.path.getsize(path)
+        with open(path, 'a', encoding='UTF-8') as file:
+            if is_new:
+                file.write('[\n')
+            for event in events:
+                file.write(json.dumps(event, ensure_ascii=False) + ',\n')
+    except OSError as err:
+        logger.error(f'Не удалось выгрузить трассировку в {path}: {err}')
+
+
+def _frame_stack(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        filename = os.path.basename(code.co_filename)
+        stack.append(f'{code.co_name} ({filename})')
+        frame = frame.f_back
+    return ';'.join(reversed(stack))
+
+
+class SamplingProfiler:
+    """Сэмплирующий профилировщик живого процесса в формате folded stacks.
+
+    Результат пригоден для flamegraph.pl и speedscope.
+    """
+
+    def __init__(self, duration=PROFILE_SECONDS, interval=PROFILE_INTERVAL,
+                 directory=PROFILE_DIR):
+        self.duration = duration
+        self.interval = interval
+        self.directory = directory
+        self._thread = None
+
+    @property
+    def running(self):
+        """Идёт ли сейчас съём профиля."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, thread_id=None):
+        """Запускает съём профиля в фоновом потоке."""
+        if self.running:
+            logger.warning('Профилирование уже запущено.')
+            return None
+        if thread_id is None:
+            thread_id = threading.main_thread().ident
+        path = os.path.join(
+            self.directory,
+            f'profile-{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}.folded'
+        )
+        self._thread = threading.Thread(
+            target=self._run, args=(thread_id, path),
+            name='sampling-profiler', daemon=True
+        )
+        self._thread.start()
+        logger.info(f'Профилирование на {self.duration} с запущено.')
+        return path
+
+    def sample(self, thread_id, duration):
+        """Собирает стеки потока и возвращает счётчик сэмплов."""
+        samples = Counter()
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            frame = sys._current_frames().get(thread_id)
+            if frame is not None:
+                samples[_frame_stack(frame)] += 1
+            del frame
+            time.sleep(self.interval)
+        return samples
+
+    def _run(self, thread_id, path):
+        samples = self.sample(thread_id, self.duration)
+        try:
+            with open(path, 'w', encoding='UTF-8') as file:
+                for stack, count in samples.most_common():
+                    file.write(f'{stack} {count}\n')
+        except OSError as err:
+            logger.error(f'Не удалось сохранить профиль {path}: {err}')
+            return
+        logger.info(f'Профиль сохранён в {path}.')
+
+
+PROFILER = SamplingProfiler()
+
+
+def install_profiler(signum=getattr(signal, 'SIGUSR1', None)):
+    """Включает съём профиля по сигналу без перезапуска процесса."""
+    if signum is None:
+        logger.warning('Сигнал для профилирования недоступен.')
+        return
+    signal.signal(signum, lambda signum, frame: PROFILER.start())
@@ -0,0 +1,75 @@
+import connections
+import metrics
+import tracing
+from exceptions import TelegramApiError
+from settings import env
+
+TELEGRAM_POOL = env('TELEGRAM_POOL', 32, int)
+SEND_CONNECT_TIMEOUT = env('SEND_CONNECT_TIMEOUT', 5, float)
+SEND_READ_TIMEOUT = env('SEND_READ_TIMEOUT', 10, float)
+
+
+class TelegramTransport:
+    """Отправка sendMessage через пул постоянных соединений.
+
+    Повторяет сигнатуру TeleBot.send_message, поэтому подходит как bot
+    для send_message и send_to_chat. Объект потокобезопасен: параллельные
+    отправки в разные чаты идут по разным соединениям пула, а таймауты
+    на соединение и ответ заданы явно.
+    """
+
+    def __init__(self, token, base_url=connections.TELEGRAM_API,
+                 pool_size=TELEGRAM_POOL,
+                 timeout=(SEND_CONNECT_TIMEOUT, SEND_READ_TIMEOUT)):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self._network_errors = requests.exceptions.RequestException
+        self.base_url = f'{base_url}bot{token}/'
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size,
+                              pool_block=True)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _call(self, method, payload, span):
+        try:
+            with tracing.span(span):
+                response = self.session.post(self.base_url + method,
+                                             json=payload,
+                                             timeout=self.timeout)
+        except self._network_errors as error:
+            metrics.inc('telegram_errors_total')
+            raise TelegramApiError(
+                f'Telegram недоступен: {type(error).__name__}'
+            ) from None
+        try:
+            data = response.json()
+        except ValueError:
+            data = {}
+        if response.status_code == 200 and data.get('ok'):
+            return data['result']
+        metrics.inc('telegram_errors_total')
+        raise TelegramApiError(
+            f'Telegram ответил {response.status_code}: '
+            f'{data.get("description", response.reason)}',
+            (data.get('parameters') or {}).get('retry_after'),
+            response.status_code
+        )
+
+    def send_message(self, chat_id, text, **kwargs):
+        """Отправляет сообщение и возвращает его описание от Telegram.
+
+        Сбой сети или отказ API превращается в TelegramApiError без URL
+        запроса, чтобы токен бота не попал в лог.
+        """
+        result = self._call('sendMessage',
+                            dict(kwargs, chat_id=chat_id, text=text),
+                            'telegram_send')
+        metrics.inc('telegram_sent_total')
+        return result
+
+    def get_chat(self, chat_id):
+        """Возвращает описание чата, если бот может в него писать."""
+        return self._call('getChat', {'chat_id': chat_id}, 'telegram_chat')